@@ -5,5 +5,5 @@ class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
 
-
-
+    def ready(self):
+        from . import signals  # noqa: F401
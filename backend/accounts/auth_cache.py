@@ -0,0 +1,61 @@
+"""
+Short-lived cache of the authenticated principal for JWT requests.
+
+SingleSessionJWTAuthentication previously loaded the full user row on every
+request. The fields needed for authentication and permission checks are cached
+for AUTH_PRINCIPAL_CACHE_TTL seconds; the user is rebuilt from them with the
+remaining fields deferred (loaded on first access, and left untouched by
+save()). Entries are dropped whenever the user is saved or deleted, and on
+login/logout.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+logger = logging.getLogger(__name__)
+
+PRINCIPAL_TTL = getattr(settings, 'AUTH_PRINCIPAL_CACHE_TTL', 60)
+
+# has_free_access is derived from registration_number / staff_id; created_at and
+# profile_picture cover UserSerializer(request.user) without deferred loads, and
+# updated_at keeps auto_now working when a profile update saves the principal.
+PRINCIPAL_FIELDS = (
+    'id', 'email', 'name', 'role', 'is_active', 'is_staff', 'is_superuser',
+    'session_token', 'registration_number', 'staff_id', 'created_at', 'updated_at', 'profile_picture',
+)
+
+
+def _cache_key(user_id):
+    return f"auth:principal:{user_id}"
+
+
+def get_principal(user_id):
+    """The user with PRINCIPAL_FIELDS loaded, from cache when possible. Raises User.DoesNotExist."""
+    from .models import User
+
+    # from_db() expects values in concrete field order
+    field_names = [f.attname for f in User._meta.concrete_fields if f.attname in PRINCIPAL_FIELDS]
+    key = _cache_key(user_id)
+    try:
+        values = cache.get(key)
+    except Exception:
+        logger.warning(f"Failed to read cached principal for user {user_id}", exc_info=True)
+        values = None
+
+    if values is None:
+        values = User.objects.filter(pk=user_id).values_list(*field_names).get()
+        try:
+            cache.set(key, values, PRINCIPAL_TTL)
+        except Exception:
+            logger.warning(f"Failed to cache principal for user {user_id}", exc_info=True)
+
+    return User.from_db(DEFAULT_DB_ALIAS, field_names, values)
+
+
+def invalidate_principal(user_id):
+    try:
+        cache.delete(_cache_key(user_id))
+    except Exception:
+        logger.warning(f"Failed to invalidate cached principal for user {user_id}", exc_info=True)
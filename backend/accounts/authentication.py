@@ -1,12 +1,20 @@
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework.exceptions import AuthenticationFailed
 
+from .auth_cache import get_principal
+
 class SingleSessionJWTAuthentication(JWTAuthentication):
     """
     Custom JWT Authentication that enforces single session per user.
     """
     def get_user(self, validated_token):
-        user = super().get_user(validated_token)
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Revocation compares the password hash, which is not cached.
+            user = super().get_user(validated_token)
+        else:
+            user = self._get_cached_user(validated_token)
         
         # Check if session_token in token matches user's current session_token
         token_session = validated_token.get('session_token')
@@ -21,3 +29,19 @@ class SingleSessionJWTAuthentication(JWTAuthentication):
                 raise AuthenticationFailed('This session has expired. You are logged in on another device.', code='token_not_valid')
             
         return user
+
+    def _get_cached_user(self, validated_token):
+        """Same checks as JWTAuthentication.get_user, backed by the principal cache."""
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        try:
+            user = get_principal(user_id)
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return user
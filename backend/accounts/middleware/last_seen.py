@@ -1,6 +1,7 @@
-from django.utils import timezone
 from django.contrib.auth.models import AnonymousUser
 
+from accounts.presence import mark_seen
+
 class UpdateLastSeenMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
@@ -8,8 +9,8 @@ class UpdateLastSeenMiddleware:
     def __call__(self, request):
         response = self.get_response(request)
 
+        # Coalesced and persisted in the background by accounts.presence
         if request.user and not isinstance(request.user, AnonymousUser):
-            request.user.last_seen = timezone.now()
-            request.user.save(update_fields=['last_seen'])
+            mark_seen(request.user)
 
         return response
@@ -0,0 +1,143 @@
+"""
+User presence (last_seen / is_online) without a write per request.
+
+Each process records a user at most once per LAST_SEEN_COALESCE_SECONDS: the
+timestamp goes to the shared cache (read by the admin user list) and into a
+pending map that a background thread persists to User.last_seen every
+LAST_SEEN_FLUSH_INTERVAL seconds with one UPDATE.
+"""
+import atexit
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+COALESCE_SECONDS = getattr(settings, 'LAST_SEEN_COALESCE_SECONDS', 60)
+FLUSH_INTERVAL = getattr(settings, 'LAST_SEEN_FLUSH_INTERVAL', 30)
+ONLINE_WINDOW = timedelta(minutes=5)
+
+_LOCAL_LIMIT = 10000
+
+_lock = threading.Lock()
+_recent = {}    # user_id -> last time this process recorded the user
+_pending = {}   # user_id -> last_seen not yet written to the database
+_flusher = None
+
+
+def _cache_key(user_id):
+    return f"presence:user:{user_id}"
+
+
+def mark_seen(user):
+    """Record activity for an authenticated user; cheap when called on every request."""
+    now = timezone.now()
+    with _lock:
+        last = _recent.get(user.pk)
+        if last is not None and now - last < timedelta(seconds=COALESCE_SECONDS):
+            return
+        if len(_recent) >= _LOCAL_LIMIT:
+            cutoff = now - timedelta(seconds=COALESCE_SECONDS)
+            for user_id in [uid for uid, seen in _recent.items() if seen < cutoff]:
+                del _recent[user_id]
+        _recent[user.pk] = now
+        _pending[user.pk] = now
+
+    _ensure_flusher()
+    try:
+        cache.set(_cache_key(user.pk), now, int(ONLINE_WINDOW.total_seconds()) * 2)
+    except Exception:
+        logger.warning(f"Failed to cache presence for user {user.pk}", exc_info=True)
+
+
+def apply_presence(users):
+    """Set last_seen on loaded users to the newer of the stored and cached value (in memory only)."""
+    users = list(users)
+    try:
+        cached = cache.get_many([_cache_key(user.pk) for user in users])
+    except Exception:
+        logger.warning("Failed to read cached presence", exc_info=True)
+        cached = {}
+    for user in users:
+        seen = cached.get(_cache_key(user.pk))
+        if seen is not None and (user.last_seen is None or seen > user.last_seen):
+            user.last_seen = seen
+        user._presence_applied = True
+    return users
+
+
+def current_last_seen(user):
+    """last_seen including the cached presence; looked up once per instance."""
+    if not getattr(user, '_presence_applied', False):
+        apply_presence([user])
+    return user.last_seen
+
+
+def is_online(last_seen):
+    return last_seen is not None and timezone.now() - last_seen < ONLINE_WINDOW
+
+
+def flush():
+    """Persist pending last_seen values. Returns the number of users updated."""
+    from .models import User
+
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+    if not pending:
+        return 0
+
+    values_sql = ", ".join(["(%s::uuid, %s::timestamptz)"] * len(pending))
+    params = [value for item in pending.items() for value in item]
+    try:
+        with connection.cursor() as cursor:
+            # GREATEST: another process may already have written a newer value.
+            cursor.execute(
+                f"UPDATE {User._meta.db_table} AS u "
+                "SET last_seen = GREATEST(COALESCE(u.last_seen, v.seen), v.seen) "
+                f"FROM (VALUES {values_sql}) AS v(id, seen) "
+                "WHERE u.id = v.id",
+                params,
+            )
+    except Exception:
+        with _lock:
+            for user_id, seen in pending.items():
+                if user_id not in _pending or _pending[user_id] < seen:
+                    _pending[user_id] = seen
+        raise
+    return len(pending)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception:
+            logger.warning("last_seen flush failed; will retry", exc_info=True)
+        finally:
+            connection.close()
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is not None:
+        return
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name='last-seen-flusher', daemon=True)
+            _flusher.start()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        flush()
+    except Exception:
+        logger.warning("Final last_seen flush failed", exc_info=True)
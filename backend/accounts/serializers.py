@@ -2,9 +2,8 @@
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from .models import User 
+from .presence import apply_presence, current_last_seen, is_online
 from django.db import models
-from django.utils import timezone
-from datetime import timedelta
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -157,6 +156,7 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         import uuid
         new_session_token = str(uuid.uuid4())
         self.user.session_token = new_session_token
+        # post_save also drops the cached principal, so older tokens fail immediately
         self.user.save(update_fields=['session_token'])
         
         # Regenerate tokens to include the new session_token
@@ -173,6 +173,14 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
             }
         }
 
+class PresenceListSerializer(serializers.ListSerializer):
+    """Overlays the cached presence on a whole page of users with one cache read."""
+
+    def to_representation(self, data):
+        users = data.all() if isinstance(data, models.Manager) else data
+        return super().to_representation(apply_presence(users))
+
+
 class AdminUserListSerializer(serializers.ModelSerializer):
     """Serializer for Admin to view user list with online status"""
     is_online = serializers.SerializerMethodField()
@@ -183,12 +191,16 @@ class AdminUserListSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'name', 'email', 'role', 'last_seen', 'is_online', 'profile_picture', 'user_type', 'created_at']
+        list_serializer_class = PresenceListSerializer
+
+    def to_representation(self, instance):
+        # last_seen is persisted lazily; serialize the fresher cached presence.
+        current_last_seen(instance)
+        return super().to_representation(instance)
 
     def get_is_online(self, obj):
-        if obj.last_seen:
-            # User is online if last_seen is within the last 5 minutes
-            return timezone.now() - obj.last_seen < timedelta(minutes=5)
-        return False
+        # User is online if last_seen is within the last 5 minutes
+        return is_online(current_last_seen(obj))
 
     def get_profile_picture(self, obj):
         if obj.profile_picture:
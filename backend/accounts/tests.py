@@ -0,0 +1,101 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+
+from . import presence
+from .models import User
+from .serializers import AdminUserListSerializer
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'accounts-tests'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class PresenceTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        presence._recent.clear()
+        presence._pending.clear()
+        patcher = mock.patch.object(presence, '_ensure_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User(email='reader@example.com', name='Reader')
+
+    def test_mark_seen_records_once_per_window(self):
+        presence.mark_seen(self.user)
+        first = presence._pending[self.user.pk]
+        presence._pending.clear()
+
+        presence.mark_seen(self.user)
+
+        self.assertEqual(presence._pending, {})
+        self.assertEqual(cache.get(presence._cache_key(self.user.pk)), first)
+
+    def test_mark_seen_records_again_after_window(self):
+        presence.mark_seen(self.user)
+        presence._recent[self.user.pk] -= timedelta(seconds=presence.COALESCE_SECONDS + 1)
+        presence._pending.clear()
+
+        presence.mark_seen(self.user)
+
+        self.assertIn(self.user.pk, presence._pending)
+
+    def test_apply_presence_keeps_newer_value(self):
+        stored = timezone.now()
+        cached = stored + timedelta(seconds=30)
+        cache.set(presence._cache_key(self.user.pk), cached)
+
+        self.user.last_seen = stored
+        presence.apply_presence([self.user])
+        self.assertEqual(self.user.last_seen, cached)
+
+        other = User(email='other@example.com', name='Other', last_seen=stored)
+        cache.set(presence._cache_key(other.pk), stored - timedelta(minutes=1))
+        presence.apply_presence([other])
+        self.assertEqual(other.last_seen, stored)
+
+    def test_flush_writes_pending_in_one_statement(self):
+        presence.mark_seen(self.user)
+        other = User(email='other@example.com', name='Other')
+        presence.mark_seen(other)
+
+        with mock.patch.object(presence, 'connection') as connection:
+            cursor = connection.cursor.return_value.__enter__.return_value
+            self.assertEqual(presence.flush(), 2)
+
+        cursor.execute.assert_called_once()
+        sql, params = cursor.execute.call_args.args
+        self.assertIn('GREATEST', sql)
+        self.assertEqual(len(params), 4)
+        self.assertEqual(presence._pending, {})
+
+    def test_failed_flush_keeps_pending(self):
+        presence.mark_seen(self.user)
+        seen = presence._pending[self.user.pk]
+
+        with mock.patch.object(presence, 'connection') as connection:
+            connection.cursor.return_value.__enter__.return_value.execute.side_effect = RuntimeError
+            with self.assertRaises(RuntimeError):
+                presence.flush()
+
+        self.assertEqual(presence._pending, {self.user.pk: seen})
+
+    def test_admin_serializer_uses_cached_presence(self):
+        self.user.last_seen = timezone.now() - timedelta(hours=1)
+        cache.set(presence._cache_key(self.user.pk), timezone.now())
+
+        data = AdminUserListSerializer(self.user).data
+
+        self.assertTrue(data['is_online'])
+
+    def test_admin_list_serializer_reads_cache_once(self):
+        users = [User(email=f'user{i}@example.com', name=f'User {i}') for i in range(3)]
+        cache.set(presence._cache_key(users[1].pk), timezone.now())
+
+        with mock.patch.object(presence.cache, 'get_many', wraps=cache.get_many) as get_many:
+            data = AdminUserListSerializer(users, many=True).data
+
+        get_many.assert_called_once()
+        self.assertEqual([row['is_online'] for row in data], [False, True, False])
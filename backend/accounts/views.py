@@ -15,6 +15,8 @@ import logging
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from .serializers import AdminUserListSerializer
+from .auth_cache import invalidate_principal
+from elibrary.pagination import OptionalKeysetPagination
 
 # Email & Settings imports
 from django.core.mail import send_mail
@@ -107,6 +109,8 @@ def me(request):
 @permission_classes([IsAuthenticated])
 def logout(request):
     """Logout user (blacklist refresh token)"""
+    # Drop the cached principal (accounts.auth_cache); saves invalidate it via signals.
+    invalidate_principal(request.user.pk)
     try:
         refresh_token = request.data.get('refresh_token')
         if refresh_token:
@@ -150,7 +154,8 @@ class AdminUserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all().order_by('role', 'name')
     serializer_class = AdminUserListSerializer
     permission_classes = [IsAdminRole]
-    pagination_class = None  # Disable pagination to return plain array
+    # Plain array as before; ?cursor= pages through large user lists by (role, name)
+    pagination_class = OptionalKeysetPagination
     http_method_names = ['get', 'patch', 'delete', 'head', 'options']
 
     def get_queryset(self):
@@ -0,0 +1,168 @@
+"""
+Buffered analytics event pipeline.
+
+Search queries and book views are appended to an in-process queue and written
+by a background thread with bulk_create, so request latency no longer includes
+analytics INSERTs. The queue is bounded: when it is full new events are
+dropped and counted. It is flushed when it reaches ANALYTICS_BATCH_SIZE events
+or every ANALYTICS_FLUSH_INTERVAL seconds, and drained on interpreter exit.
+"""
+import atexit
+import logging
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = getattr(settings, 'ANALYTICS_FLUSH_INTERVAL', 5)
+BATCH_SIZE = getattr(settings, 'ANALYTICS_BATCH_SIZE', 200)
+MAX_PENDING = getattr(settings, 'ANALYTICS_MAX_PENDING', 10000)
+
+SEARCH = 'search'
+BOOK_VIEW = 'book_view'
+
+
+class EventQueue:
+    def __init__(self, batch_size=BATCH_SIZE, max_pending=MAX_PENDING, flush_interval=FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self._events = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopped = False
+        self.stats = {'enqueued': 0, 'written': 0, 'dropped': 0, 'failed': 0}
+
+    def put(self, event):
+        with self._cond:
+            if self._stopped or len(self._events) >= self.max_pending:
+                self.stats['dropped'] += 1
+                return False
+            self._events.append(event)
+            self.stats['enqueued'] += 1
+            if len(self._events) >= self.batch_size:
+                self._cond.notify()
+        self._ensure_thread()
+        return True
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='analytics-flusher', daemon=True)
+                self._thread.start()
+
+    def _take(self):
+        with self._cond:
+            count = min(len(self._events), self.batch_size)
+            return [self._events.popleft() for _ in range(count)]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if len(self._events) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+            try:
+                self.flush()
+            finally:
+                connection.close()
+
+    def flush(self):
+        """Write every queued event. Returns the number of events written."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = self._take()
+                if not batch:
+                    return written
+                try:
+                    count = _write_batch(batch)
+                except Exception:
+                    self.stats['failed'] += len(batch)
+                    logger.warning(f"Dropped {len(batch)} analytics events after a failed write", exc_info=True)
+                    continue
+                self.stats['written'] += count
+                written += count
+
+    def drain(self):
+        """Stop accepting events and write whatever is still queued."""
+        with self._cond:
+            self._stopped = True
+        self.flush()
+
+    def pending(self):
+        with self._cond:
+            return len(self._events)
+
+
+def _write_batch(batch):
+    from .models import BookView, SearchQuery
+
+    searches = [
+        SearchQuery(user_id=user_id, query=query, searched_at=at)
+        for kind, user_id, query, at, _ in batch if kind == SEARCH
+    ]
+
+    views = []
+    existing = set()
+    first_only = {(user_id, book_id) for kind, user_id, book_id, at, once in batch if kind == BOOK_VIEW and once}
+    if first_only:
+        # "Record first view only" events: skip pairs already stored, in one query.
+        existing = set(
+            BookView.objects.filter(
+                user_id__in={user_id for user_id, _ in first_only},
+                book_id__in={book_id for _, book_id in first_only},
+            ).values_list('user_id', 'book_id')
+        )
+    seen = set()
+    for kind, user_id, book_id, at, once in batch:
+        if kind != BOOK_VIEW:
+            continue
+        if once:
+            if (user_id, book_id) in existing or (user_id, book_id) in seen:
+                continue
+            seen.add((user_id, book_id))
+        views.append(BookView(user_id=user_id, book_id=book_id, viewed_at=at))
+
+    # One transaction, so a failed batch leaves nothing behind to duplicate on retry
+    with transaction.atomic():
+        if searches:
+            SearchQuery.objects.bulk_create(searches)
+        if views:
+            BookView.objects.bulk_create(views)
+    return len(searches) + len(views)
+
+
+_queue = EventQueue()
+
+
+def record_search(user, query):
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    _queue.put((SEARCH, user_id, query[:255], timezone.now(), False))
+
+
+def record_book_view(user, book_id, first_only=False):
+    """Queue a BookView; with first_only, skip it if the user already viewed the book."""
+    _queue.put((BOOK_VIEW, user.pk, book_id, timezone.now(), first_only))
+
+
+def flush_events():
+    return _queue.flush()
+
+
+def event_queue_stats():
+    return {**_queue.stats, 'pending': _queue.pending()}
+
+
+@atexit.register
+def _drain_on_exit():
+    try:
+        _queue.drain()
+    except Exception:
+        logger.warning(f"Analytics drain on shutdown failed; stats: {event_queue_stats()}", exc_info=True)
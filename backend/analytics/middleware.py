@@ -1,6 +1,6 @@
 from django.utils.deprecation import MiddlewareMixin
 
-from .models import SearchQuery
+from .events import record_search
 
 
 class AnalyticsMiddleware(MiddlewareMixin):
@@ -23,9 +23,7 @@ class AnalyticsMiddleware(MiddlewareMixin):
             query = request.GET.get('search') or request.GET.get('query') or ''
             query = query.strip()
             if query:
-                SearchQuery.objects.create(
-                    user=request.user if getattr(request, 'user', None) and request.user.is_authenticated else None,
-                    query=query
-                )
+                # Queued; written in batches by analytics.events
+                record_search(getattr(request, 'user', None), query)
         
         return None
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:25
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bookview',
+            name='viewed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='searchquery',
+            name='searched_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
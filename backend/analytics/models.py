@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 
 # Get the custom User model (assuming it's in the accounts app)
@@ -22,7 +23,9 @@ class BookView(models.Model):
         related_name='views',
         verbose_name='Book'
     )
-    viewed_at = models.DateTimeField(auto_now_add=True)
+    # Default rather than auto_now_add so buffered events keep their original time
+    # (see analytics.events).
+    viewed_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         verbose_name = "Book View"
@@ -45,7 +48,7 @@ class SearchQuery(models.Model):
         related_name='search_queries'
     )
     query = models.CharField(max_length=255, help_text="The actual search term.")
-    searched_at = models.DateTimeField(auto_now_add=True)
+    searched_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         verbose_name = "Search Query"
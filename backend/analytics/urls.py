@@ -3,5 +3,6 @@ from . import views
 
 urlpatterns = [
     path('admin/overview/', views.admin_analytics_overview, name='admin-analytics-overview'),
+    path('admin/system/', views.admin_system_stats, name='admin-system-stats'),
     path('user/stats/', views.user_reading_stats, name='user-reading-stats'),
 ]
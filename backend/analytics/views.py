@@ -2,6 +2,7 @@ from collections import Counter
 import itertools
 from datetime import timedelta
 
+from django.conf import settings
 from django.db.models import Count, Sum
 from django.db.models.functions import ExtractHour
 from django.utils import timezone
@@ -10,10 +11,15 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from .events import event_queue_stats
 from .models import BookView, SearchQuery
 from .serializers import AdminAnalyticsSerializer, UserReadingStatsSerializer
+from catalog.embedding_cache import embedding_cache_stats
+from catalog.file_cache import stats as book_file_cache_stats
 from catalog.models import Book, Category, BookLike
-from reading.models import ReadingProgress, ReadingSession
+from reading import stats as reading_stats
+from reading.models import ReadingProgress
+from elibrary.db.backends.postgresql.base import connection_stats
 
 
 def get_period_date_range(period: str):
@@ -293,85 +299,27 @@ def user_reading_stats(request):
             updated_at__year=timezone.now().year
         ).count()
 
-        # Reading streak
-        current_streak = 0
-        longest_streak = 0
+        # Reading streak (daily rollup)
         today = timezone.now().date()
-        
-        # Get reading sessions dates (distinct)
-        # Optimize: distinct dates only
-        session_dates = list(ReadingSession.objects.filter(
-            user_id=user_pk
-        ).values_list('started_at__date', flat=True).distinct().order_by('-started_at__date'))
-        
-        if session_dates:
-            # Dates are already sorted desc
-            latest_date = session_dates[0]
-            
-            # Current streak checks
-            if latest_date == today or latest_date == today - timedelta(days=1):
-                current_streak = 1
-                streak_date = latest_date
-                
-                for i in range(1, len(session_dates)):
-                    prev_date = session_dates[i]
-                    if (streak_date - prev_date).days == 1:
-                        current_streak += 1
-                        streak_date = prev_date
-                    else:
-                        break
-            
-            # Longest streak calculation
-            temp_streak = 1
-            longest_streak = 1
-            # Sort ascending for longest streak logic
-            sorted_dates = sorted(session_dates)
-            for i in range(1, len(sorted_dates)):
-                if (sorted_dates[i] - sorted_dates[i-1]).days == 1:
-                    temp_streak += 1
-                else:
-                    longest_streak = max(longest_streak, temp_streak)
-                    temp_streak = 1
-            longest_streak = max(longest_streak, temp_streak)
+        current_streak, longest_streak = reading_stats.reading_streaks(request.user, today)
 
         # Favorite categories
-        # Enhance: Could be optimized with aggregation but ManyToMany makes it tricky without annotation
-        # Keep python logic for now as it's not the main bottleneck (limited by user's books)
-        category_counts = Counter()
-        for progress in progress_data.filter(completed=True):
-            if progress.book:
-                for category in progress.book.categories.all():
-                    category_counts[category.name] += 1
-        
-        favorite_categories = category_counts.most_common(5)
+        favorite_categories = reading_stats.category_counts(progress_data.filter(completed=True), limit=5)
         favorite_category_name = favorite_categories[0][0] if favorite_categories else None
         
         # Reading goal progress (assuming 12 books per year)
         reading_goal_progress = min(books_read_this_year / 12 * 100, 100)
 
-        # Pages daily activity (Last 14 days) - OPTIMIZED
-        # Single query instead of 14
+        # Pages daily activity (Last 14 days) from the daily rollup
         activity_start = today - timedelta(days=13) # Go back 13 days + today = 14
-        
-        from django.db.models.functions import TruncDate
-        daily_pages = ReadingSession.objects.filter(
-            user_id=user_pk,
-            started_at__date__gte=activity_start
-        ).annotate(
-            day=TruncDate('started_at')
-        ).values('day').annotate(
-            total_pages=Sum('pages_read')
-        ).order_by('day')
-        
-        # Convert to map
-        pages_map = {item['day']: item['total_pages'] for item in daily_pages if item['day']}
+        days = reading_stats.daily_totals(request.user, activity_start)
         
         pages_daily_activity = []
         for i in range(14):
             date = today - timedelta(days=i)
             pages_daily_activity.append({
                 'date': date.strftime('%Y-%m-%d'),
-                'pages': pages_map.get(date, 0)
+                'pages': days[date]['pages'] if date in days else 0
             })
         pages_daily_activity.reverse()
 
@@ -401,4 +349,20 @@ def user_reading_stats(request):
         return Response(
             {'error': 'Failed to fetch reading statistics', 'detail': str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def admin_system_stats(request):
+    """Per-process database connection, analytics queue and book file cache counters"""
+    if request.user.role != 'ADMIN':
+        return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+
+    return Response({
+        'db_pool_mode': settings.DB_POOL_MODE,
+        'database': connection_stats(),
+        'analytics_events': event_queue_stats(),
+        'book_file_cache': book_file_cache_stats(),
+        'query_embedding_cache': embedding_cache_stats(),
+    })
@@ -12,3 +12,6 @@ python manage.py collectstatic --no-input
 
 # Run migrations
 python manage.py migrate
+
+# Record hashes for vectors embedded before hashes were tracked (no API calls)
+python manage.py generate_embeddings --adopt-existing
@@ -5,6 +5,8 @@ import requests
 import PIL.Image
 from io import BytesIO
 
+from . import file_cache
+
 # This tells Python to search for the .env file automatically
 load_dotenv(find_dotenv())
 
@@ -20,6 +22,23 @@ if not GEMINI_KEY:
 client = genai.Client(api_key=GEMINI_KEY)
 
 
+# Gemini accepts up to 100 texts per embed_content request.
+EMBEDDING_BATCH_LIMIT = 100
+
+
+def _fit_dimensions(values) -> list[float]:
+    if len(values) == EMBEDDING_DIMENSIONS:
+        return values
+
+    # Safety fallback in case provider ignores output_dimensionality.
+    if len(values) > EMBEDDING_DIMENSIONS:
+        return values[:EMBEDDING_DIMENSIONS]
+
+    raise ValueError(
+        f"Embedding dimension too small: expected at least {EMBEDDING_DIMENSIONS}, got {len(values)}"
+    )
+
+
 def get_embedding(text: str) -> list[float]:
     """
     Generate an embedding vector for the given text using Gemini's embedding model.
@@ -39,28 +58,49 @@ def get_embedding(text: str) -> list[float]:
     if not result.embeddings:
         raise ValueError("Embedding API returned no embeddings.")
 
-    values = result.embeddings[0].values
-    if len(values) == EMBEDDING_DIMENSIONS:
-        return values
+    return _fit_dimensions(result.embeddings[0].values)
 
-    # Safety fallback in case provider ignores output_dimensionality.
-    if len(values) > EMBEDDING_DIMENSIONS:
-        return values[:EMBEDDING_DIMENSIONS]
 
-    raise ValueError(
-        f"Embedding dimension too small: expected at least {EMBEDDING_DIMENSIONS}, got {len(values)}"
+def get_embeddings(texts: list[str]) -> list[list[float]]:
+    """
+    Generate embeddings for several texts in a single API call.
+    
+    Args:
+        texts: Up to EMBEDDING_BATCH_LIMIT texts
+        
+    Returns:
+        One vector per input text, in the same order
+    """
+    if len(texts) > EMBEDDING_BATCH_LIMIT:
+        raise ValueError(f"At most {EMBEDDING_BATCH_LIMIT} texts can be embedded per request, got {len(texts)}")
+
+    result = client.models.embed_content(
+        model=EMBEDDING_MODEL,
+        contents=list(texts),
+        config={"output_dimensionality": EMBEDDING_DIMENSIONS},
     )
 
+    if not result.embeddings or len(result.embeddings) != len(texts):
+        raise ValueError(
+            f"Embedding API returned {len(result.embeddings or [])} embeddings for {len(texts)} texts."
+        )
+
+    return [_fit_dimensions(embedding.values) for embedding in result.embeddings]
+
 def analyze_cover_with_vision(image_url):
     """
     Takes a Cloudinary URL, sends it to Gemini Vision, 
     and returns a structured description.
     """
-    # 1. Download the image from Cloudinary
+    # 1. Download the image from Cloudinary (through the local file cache when possible)
     try:
-        response = requests.get(image_url, timeout=20)
-        response.raise_for_status()
-        img = PIL.Image.open(BytesIO(response.content))
+        cached = file_cache.url_path(image_url)
+        if cached:
+            img = PIL.Image.open(cached)
+        else:
+            response = requests.get(image_url, timeout=20)
+            response.raise_for_status()
+            img = PIL.Image.open(BytesIO(response.content))
     except Exception as e:
         return f"Error loading image: {str(e)}"
 
@@ -0,0 +1,119 @@
+"""
+Response caching for the book catalog (list pages and book details).
+
+Cached payloads are stamped with a catalog generation number that is bumped
+whenever a Book, Author or Category is written (see catalog.signals), so a
+write invalidates every cached page at once without tracking keys. Book saves
+that only touch columns no payload depends on (embeddings, the persisted search
+columns, AI pipeline notes) keep the generation: Book.from_db remembers the
+PAYLOAD_ATTNAMES values and Book.save records which of them changed. Keys are
+built from the canonical (sorted) query string, so equivalent requests share
+an entry across processes. Cached payloads never contain per-user fields;
+those are merged in per request (catalog.personalization).
+"""
+import copy
+import hashlib
+import logging
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+BOOK_LIST_CACHE_TTL = getattr(settings, 'BOOK_LIST_CACHE_TTL', 60 * 5)
+
+_GENERATION_KEY = 'catalog:generation'
+
+# Book columns that cached list/detail payloads show, filter or order by, or search over.
+# updated_at is left out on purpose: auto_now changes it on every save.
+PAYLOAD_ATTNAMES = frozenset({
+    'title', 'author_id', 'description', 'isbn', 'language', 'year', 'pages', 'cover_image', 'file',
+    'file_type', 'cloudinary_public_id', 'file_url', 'is_published', 'view_count', 'like_count',
+    'bookmark_count', 'tags', 'ai_summary', 'ai_tags', 'tags_text', 'created_at',
+})
+
+
+def _fresh_generation():
+    # Time-based so an evicted counter never restarts at a value older entries used.
+    return time.time_ns() // 1000
+
+
+def catalog_generation():
+    try:
+        generation = cache.get(_GENERATION_KEY)
+        if generation is None:
+            cache.add(_GENERATION_KEY, _fresh_generation(), None)
+            generation = cache.get(_GENERATION_KEY)
+        return generation
+    except Exception:
+        logger.warning("Failed to read catalog generation", exc_info=True)
+        return None
+
+
+def bump_catalog_generation():
+    try:
+        cache.incr(_GENERATION_KEY)
+    except ValueError:
+        cache.set(_GENERATION_KEY, _fresh_generation(), None)
+    except Exception:
+        logger.warning("Failed to bump catalog generation", exc_info=True)
+
+
+def remember_loaded_values(book):
+    """Snapshot the PAYLOAD_ATTNAMES values a Book instance currently holds."""
+    book._loaded_values = {
+        name: copy.deepcopy(value) for name, value in book.__dict__.items() if name in PAYLOAD_ATTNAMES
+    }
+
+
+def changed_attnames(book):
+    """PAYLOAD_ATTNAMES whose value differs from the snapshot, or None when there is no snapshot."""
+    loaded = getattr(book, '_loaded_values', None)
+    if loaded is None:
+        return None
+    return {
+        name for name in PAYLOAD_ATTNAMES
+        # Deferred fields are never in __dict__ unless assigned
+        if name in book.__dict__ and (name not in loaded or book.__dict__[name] != loaded[name])
+    }
+
+
+def save_touches(book, attnames, created=False, update_fields=None):
+    """Whether the Book save being signalled may have changed any of `attnames` (post_save receivers)."""
+    if created:
+        return True
+    if update_fields is not None:
+        saved = {book._meta.get_field(name).attname for name in update_fields}
+        if not saved & attnames:
+            return False
+    changed = getattr(book, '_saved_changes', None)
+    return changed is None or bool(changed & attnames)
+
+
+def canonical_query(query_params, ignore=()):
+    """Query string with keys and values sorted, so parameter order does not matter."""
+    items = sorted(
+        (key, value)
+        for key in query_params
+        if key not in ignore
+        for value in query_params.getlist(key)
+    )
+    return urlencode(items)
+
+
+def book_list_cache_key(query_params):
+    """Cache key for a book list page, or None when the generation is unavailable."""
+    generation = catalog_generation()
+    if generation is None:
+        return None
+    digest = hashlib.sha1(canonical_query(query_params).encode('utf-8')).hexdigest()
+    return f"books:list:g{generation}:{digest}"
+
+
+def book_detail_cache_key(book_id):
+    generation = catalog_generation()
+    if generation is None:
+        return None
+    return f"books:detail:g{generation}:{book_id}"
@@ -0,0 +1,267 @@
+"""
+Write-behind buffer for Book.view_count / like_count / bookmark_count.
+
+Hot paths (detail views, like/bookmark toggles) only increment a per-book hash
+in Redis (or an in-process dict when Redis is unavailable). A background
+flusher periodically drains the accumulated deltas and applies them to
+Postgres in one `UPDATE ... FROM (VALUES ...)` statement, so popular books no
+longer take a row lock per request. Reads add pending deltas on top of the
+stored values to stay fresh.
+
+Cached list and detail payloads keep the counters they were built with, so
+each flush also records the rows' new stored values in the cache for as long
+as such a payload can live. `apply_pending_data` prefers those over the
+payload's values; otherwise a flush would move the drained deltas out of the
+overlay while the payload still showed the old totals.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from elibrary.redis_client import get_redis
+
+from .caching import BOOK_LIST_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+COUNTER_FIELDS = ('view_count', 'like_count', 'bookmark_count')
+FLUSH_INTERVAL = getattr(settings, 'COUNTER_FLUSH_INTERVAL', 10)
+FLUSH_BATCH_SIZE = 500
+
+_REDIS_KEY = 'elibrary:counters:book:{}'
+_REDIS_DIRTY = 'elibrary:counters:dirty'
+
+# Outlives any cached payload built before the flush that wrote the value
+STORED_TTL = BOOK_LIST_CACHE_TTL + 60
+
+
+class LocalCounterStore:
+    """In-process store used in development (LocMemCache)."""
+
+    def __init__(self):
+        self._deltas = {}
+        self._lock = threading.Lock()
+
+    def incr(self, book_id, field, delta):
+        with self._lock:
+            fields = self._deltas.setdefault(book_id, {})
+            fields[field] = fields.get(field, 0) + delta
+
+    def pending(self, book_ids):
+        with self._lock:
+            return {book_id: dict(self._deltas[book_id]) for book_id in book_ids if book_id in self._deltas}
+
+    def drain(self, limit):
+        with self._lock:
+            book_ids = list(self._deltas)[:limit]
+            return {book_id: self._deltas.pop(book_id) for book_id in book_ids}
+
+
+class RedisCounterStore:
+    """Redis hashes per book plus a set of books with unflushed deltas."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def incr(self, book_id, field, delta):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hincrby(_REDIS_KEY.format(book_id), field, delta)
+        pipe.sadd(_REDIS_DIRTY, book_id)
+        pipe.execute()
+
+    def pending(self, book_ids):
+        book_ids = list(book_ids)
+        if not book_ids:
+            return {}
+        pipe = self.client.pipeline(transaction=False)
+        for book_id in book_ids:
+            pipe.hgetall(_REDIS_KEY.format(book_id))
+        return {
+            book_id: {k.decode(): int(v) for k, v in values.items()}
+            for book_id, values in zip(book_ids, pipe.execute())
+            if values
+        }
+
+    def drain(self, limit):
+        book_ids = [int(member) for member in self.client.spop(_REDIS_DIRTY, limit) or []]
+        if not book_ids:
+            return {}
+        # HGETALL + DEL in one MULTI per key: an increment either lands before the
+        # DEL (and is drained now) or recreates the key and re-marks it dirty.
+        pipe = self.client.pipeline(transaction=True)
+        for book_id in book_ids:
+            pipe.hgetall(_REDIS_KEY.format(book_id))
+            pipe.delete(_REDIS_KEY.format(book_id))
+        results = pipe.execute()
+        return {
+            book_id: {k.decode(): int(v) for k, v in values.items()}
+            for book_id, values in zip(book_ids, results[::2])
+            if values
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+_flusher = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                client = get_redis()
+                _store = RedisCounterStore(client) if client is not None else LocalCounterStore()
+    return _store
+
+
+def incr(book_id, field, delta=1):
+    """Buffer a counter change; never touches Postgres."""
+    if field not in COUNTER_FIELDS:
+        raise ValueError(f"Unknown counter field: {field}")
+    _ensure_flusher()
+    try:
+        get_store().incr(book_id, field, delta)
+    except Exception:
+        # Counters are best-effort; a broken buffer must not fail the request.
+        logger.warning(f"Failed to buffer {field} for book {book_id}", exc_info=True)
+
+
+def pending(book_ids):
+    """Unflushed deltas for the given books: {book_id: {field: delta}}."""
+    try:
+        return get_store().pending(book_ids)
+    except Exception:
+        logger.warning("Failed to read pending counters", exc_info=True)
+        return {}
+
+
+def apply_pending(books):
+    """Add pending deltas to the counter attributes of already loaded books (in memory only)."""
+    deltas = pending([book.pk for book in books])
+    for book in books:
+        for field, delta in deltas.get(book.pk, {}).items():
+            setattr(book, field, max(getattr(book, field) + delta, 0))
+    return books
+
+
+def _stored_key(book_id):
+    return f"counters:stored:v1:{book_id}"
+
+
+def flushed_values(book_ids):
+    """Stored counters written by recent flushes: {book_id: {field: value}}."""
+    keys = {book_id: _stored_key(book_id) for book_id in book_ids}
+    try:
+        cached = cache.get_many(list(keys.values()))
+    except Exception:
+        logger.warning("Failed to read flushed counters", exc_info=True)
+        return {}
+    return {book_id: dict(zip(COUNTER_FIELDS, cached[key])) for book_id, key in keys.items() if key in cached}
+
+
+def apply_pending_data(items):
+    """
+    Copies of serialized books (dicts with 'id') with live counters: the value
+    stored by the latest flush (or the payload's own) plus pending deltas.
+    """
+    book_ids = [item['id'] for item in items]
+    stored = flushed_values(book_ids)
+    deltas = pending(book_ids)
+    result = []
+    for item in items:
+        book_id = item['id']
+        if book_id not in stored and book_id not in deltas:
+            result.append(item)
+            continue
+        values = {field: value for field, value in stored.get(book_id, {}).items() if field in item}
+        for field, delta in deltas.get(book_id, {}).items():
+            if field in item:
+                values[field] = max(values.get(field, item[field]) + delta, 0)
+        result.append({**item, **values})
+    return result
+
+
+def current(book_id, field, stored_value):
+    """Stored value plus any pending delta, never below zero."""
+    return max(stored_value + pending([book_id]).get(book_id, {}).get(field, 0), 0)
+
+
+def _apply(deltas):
+    rows = [
+        (book_id, fields.get('view_count', 0), fields.get('like_count', 0), fields.get('bookmark_count', 0))
+        for book_id, fields in deltas.items()
+    ]
+    values_sql = ", ".join(["(%s, %s, %s, %s)"] * len(rows))
+    params = [value for row in rows for value in row]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE catalog_book AS b SET "
+            "view_count = GREATEST(b.view_count + v.view_delta, 0), "
+            "like_count = GREATEST(b.like_count + v.like_delta, 0), "
+            "bookmark_count = GREATEST(b.bookmark_count + v.bookmark_delta, 0) "
+            f"FROM (VALUES {values_sql}) AS v(id, view_delta, like_delta, bookmark_delta) "
+            "WHERE b.id = v.id "
+            "RETURNING b.id, b.view_count, b.like_count, b.bookmark_count",
+            params,
+        )
+        stored = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+    try:
+        cache.set_many({_stored_key(book_id): values for book_id, values in stored.items()}, STORED_TTL)
+    except Exception:
+        logger.warning("Failed to cache flushed counters", exc_info=True)
+
+
+def flush():
+    """Drain buffered deltas into Postgres. Returns the number of books updated."""
+    store = get_store()
+    flushed = 0
+    while True:
+        deltas = store.drain(FLUSH_BATCH_SIZE)
+        if not deltas:
+            return flushed
+        try:
+            _apply(deltas)
+        except Exception:
+            # Put the deltas back so the next flush retries them.
+            for book_id, fields in deltas.items():
+                for field, delta in fields.items():
+                    store.incr(book_id, field, delta)
+            raise
+        flushed += len(deltas)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception:
+            logger.warning("Counter flush failed; will retry", exc_info=True)
+        finally:
+            connection.close()
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is not None:
+        return
+    with _store_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name='counter-flusher', daemon=True)
+            _flusher.start()
+
+
+@atexit.register
+def _flush_on_exit():
+    # Only the in-process store loses data on shutdown; Redis keeps it for the next flush.
+    if isinstance(_store, LocalCounterStore):
+        try:
+            flush()
+        except Exception:
+            logger.warning("Final counter flush failed", exc_info=True)
@@ -0,0 +1,116 @@
+"""
+Two-tier cache for search-query embeddings.
+
+Search requests embed the user's query through Gemini, which dominates request
+latency, and popular queries repeat constantly. Vectors are cached:
+
+1. in an in-process LRU (per worker, no I/O), then
+2. in the Django cache (Redis in production), shared by all workers.
+
+Keys combine the normalized query text with the embedding model and dimension,
+so changing either invalidates old entries. Vectors are stored as packed
+float32 bytes (what pgvector stores anyway) instead of JSON lists.
+"""
+import hashlib
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .ai_utils import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL, get_embedding
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL = getattr(settings, 'EMBEDDING_CACHE_TTL', 60 * 60 * 24 * 7)
+LOCAL_CACHE_SIZE = getattr(settings, 'EMBEDDING_CACHE_LOCAL_SIZE', 512)
+
+_local = OrderedDict()
+_lock = threading.Lock()
+_stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+
+def normalize_query(text):
+    return " ".join((text or "").split()).casefold()
+
+
+def _cache_key(normalized):
+    digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+    return f"embq:{EMBEDDING_MODEL}:{EMBEDDING_DIMENSIONS}:{digest}"
+
+
+def _pack(vector):
+    return array('f', vector).tobytes()
+
+
+def _unpack(payload):
+    values = array('f')
+    values.frombytes(payload)
+    return values.tolist()
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def _remember_local(key, payload):
+    with _lock:
+        _local[key] = payload
+        _local.move_to_end(key)
+        while len(_local) > LOCAL_CACHE_SIZE:
+            _local.popitem(last=False)
+
+
+def get_query_embedding(text):
+    """Embedding for a search query, served from cache when possible."""
+    normalized = normalize_query(text)
+    key = _cache_key(normalized)
+
+    with _lock:
+        payload = _local.get(key)
+        if payload is not None:
+            _local.move_to_end(key)
+            _stats['local_hits'] += 1
+            return _unpack(payload)
+
+    try:
+        payload = cache.get(key)
+    except Exception:
+        logger.warning("Embedding cache read failed; calling the embedding API.", exc_info=True)
+        payload = None
+
+    if payload is not None:
+        _count('shared_hits')
+        _remember_local(key, payload)
+        return _unpack(payload)
+
+    _count('misses')
+    vector = get_embedding(normalized)
+    payload = _pack(vector)
+    _remember_local(key, payload)
+    try:
+        cache.set(key, payload, CACHE_TTL)
+    except Exception:
+        logger.warning("Embedding cache write failed.", exc_info=True)
+    return _unpack(payload)
+
+
+def is_cached(text):
+    """True if the query's embedding is already in the shared cache."""
+    try:
+        return cache.get(_cache_key(normalize_query(text))) is not None
+    except Exception:
+        return False
+
+
+def embedding_cache_stats():
+    """Per-process hit/miss counters."""
+    with _lock:
+        stats = dict(_stats)
+        stats['local_size'] = len(_local)
+    lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+    stats['hit_ratio'] = round((stats['local_hits'] + stats['shared_hits']) / lookups, 4) if lookups else 0.0
+    return stats
@@ -0,0 +1,98 @@
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# Single background worker for re-embedding books after admin edits. Lost jobs
+# (e.g. a worker restart) are picked up by `generate_embeddings --changed`.
+_reembed_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='reembed')
+
+
+def build_embedding_text(book):
+    """Text sent to the embedding model for a book (expects author/categories loaded or loadable)."""
+    parts = [
+        f"Title: {book.title or ''}",
+        f"Author: {book.author.name if book.author else ''}",
+        f"Description: {book.description or ''}",
+    ]
+
+    # categories are usually prefetched; .all() avoids a per-book EXISTS query
+    category_names = [c.name for c in book.categories.all() if c.name]
+    if category_names:
+        parts.append("Categories: " + ", ".join(category_names))
+
+    if isinstance(book.tags, list) and book.tags:
+        parts.append("Tags: " + ", ".join(str(tag) for tag in book.tags if str(tag).strip()))
+
+    if book.ai_summary:
+        parts.append(f"AI Summary: {book.ai_summary}")
+
+    if isinstance(book.ai_tags, list) and book.ai_tags:
+        parts.append("AI Tags: " + ", ".join(str(tag) for tag in book.ai_tags if str(tag).strip()))
+
+    # Keep only non-empty segments to avoid noisy separators.
+    return "\n".join(part for part in parts if part.split(":", 1)[-1].strip())
+
+
+def embedding_text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def embedding_is_stale(book, text_hash=None):
+    """True if the stored vector was not built from the current text, model and dimension."""
+    from .ai_utils import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL
+
+    if text_hash is None:
+        text_hash = embedding_text_hash(build_embedding_text(book))
+    return (
+        book.embedding_vector is None
+        or book.embedding_hash != text_hash
+        or book.embedding_model != EMBEDDING_MODEL
+        or book.embedding_dimensions != EMBEDDING_DIMENSIONS
+    )
+
+
+def embedding_fields(vector, text_hash):
+    """Field values to store alongside a freshly computed vector."""
+    from .ai_utils import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL
+
+    return {
+        'embedding_vector': vector,
+        'embedding_hash': text_hash,
+        'embedding_model': EMBEDDING_MODEL,
+        'embedding_dimensions': EMBEDDING_DIMENSIONS,
+    }
+
+
+def reembed_book(book_id):
+    """Recompute one book's embedding if its text changed since the last run."""
+    from .ai_utils import get_embedding
+    from .models import Book
+
+    close_old_connections()
+    try:
+        book = Book.objects.select_related('author').prefetch_related('categories').filter(pk=book_id).first()
+        if book is None or not book.is_published:
+            return
+
+        text = build_embedding_text(book)
+        text_hash = embedding_text_hash(text)
+        if not embedding_is_stale(book, text_hash):
+            return
+
+        # queryset.update: no post_save, the search index does not depend on the vector
+        Book.objects.filter(pk=book_id).update(**embedding_fields(get_embedding(text), text_hash))
+    except Exception:
+        logger.warning(f"Background re-embed failed for book {book_id}", exc_info=True)
+    finally:
+        connection.close()
+
+
+def enqueue_reembed_if_changed(book):
+    """Schedule a background re-embed after commit when the book's embedding text changed."""
+    if not book.is_published or not embedding_is_stale(book):
+        return
+    transaction.on_commit(lambda: _reembed_executor.submit(reembed_book, book.pk))
@@ -0,0 +1,224 @@
+"""
+Size-bounded on-disk LRU cache for Cloudinary-hosted book assets, such as the
+cover images the vision pipeline reads (catalog.ai_utils).
+
+Files are keyed by Cloudinary public_id plus version (a re-upload gets a new
+version, so stale copies are never served) and stored under
+BOOK_FILE_CACHE_DIR, shared by all worker processes on the host. A miss
+downloads into a temporary file and renames it into place, so readers only
+ever see complete files. Concurrent misses for the same file wait for a single
+download: a per-key lock within the process and an flock across processes.
+
+Recency is the file mtime, refreshed on every hit; after each fill the oldest
+files are removed until the directory fits BOOK_FILE_CACHE_MAX_BYTES. Removing
+a file another request is still reading is safe, since open handles keep
+their data. Lock files are never removed: a process waiting on one would
+otherwise hold an flock nobody else can see.
+"""
+import fcntl
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter, Retry
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = getattr(settings, 'BOOK_FILE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'elibrary-book-files'))
+MAX_BYTES = getattr(settings, 'BOOK_FILE_CACHE_MAX_BYTES', 2 * 1024 ** 3)
+DOWNLOAD_TIMEOUT = getattr(settings, 'BOOK_FILE_CACHE_DOWNLOAD_TIMEOUT', 60)
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+STALE_PART_SECONDS = 60 * 60  # leftovers of interrupted downloads
+
+# Shared HTTP session for Cloudinary downloads with retry on transient failures
+cloudinary_session = requests.Session()
+retry_config = Retry(
+    total=3,
+    backoff_factor=1,
+    allowed_methods=frozenset(['GET']),
+    status_forcelist=[500, 502, 503, 504],
+    raise_on_status=False,
+)
+cloudinary_session.mount('https://', HTTPAdapter(max_retries=retry_config))
+
+_VERSION_SEGMENT = re.compile(r'v\d+')
+_EXTENSION = re.compile(r'\.[a-z0-9]{1,8}')
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'downloaded_bytes': 0, 'evictions': 0, 'evicted_bytes': 0}
+
+_flights_lock = threading.Lock()
+_flights = {}   # cache file name -> [lock, waiters]
+
+
+def _count(**deltas):
+    with _stats_lock:
+        for key, delta in deltas.items():
+            _stats[key] += delta
+
+
+def stats():
+    with _stats_lock:
+        data = dict(_stats)
+    lookups = data['hits'] + data['misses']
+    data['hit_ratio'] = round(data['hits'] / lookups, 4) if lookups else None
+    data['enabled'] = MAX_BYTES > 0
+    return data
+
+
+def parse_cloudinary_url(url):
+    """(public_id, version) from a Cloudinary delivery URL, or None for other URLs."""
+    parsed = urlparse(url or '')
+    if 'cloudinary' not in parsed.netloc:
+        return None
+    # /<cloud>/<resource_type>/<type>/[s--signature--/][transformations/][v<version>/]<public_id>
+    segments = parsed.path.lstrip('/').split('/')[3:]
+    for i, segment in enumerate(segments):
+        if _VERSION_SEGMENT.fullmatch(segment):
+            return '/'.join(segments[i + 1:]), segment[1:]
+    if segments and segments[0].startswith('s--'):
+        segments = segments[1:]
+    return '/'.join(segments), None
+
+
+def _cache_name(public_id, version):
+    digest = hashlib.sha256(f"{public_id}@{version or ''}".encode()).hexdigest()
+    ext = os.path.splitext(public_id)[1].lower()
+    if not _EXTENSION.fullmatch(ext):
+        ext = ''
+    return f"{digest}{ext}"
+
+
+@contextmanager
+def _single_flight(name):
+    with _flights_lock:
+        flight = _flights.setdefault(name, [threading.Lock(), 0])
+        flight[1] += 1
+    try:
+        with flight[0]:
+            yield
+    finally:
+        with _flights_lock:
+            flight[1] -= 1
+            if not flight[1]:
+                del _flights[name]
+
+
+@contextmanager
+def _file_lock(path):
+    with open(path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _touch(path):
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _download(url, path):
+    fd, part_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as part, cloudinary_session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                part.write(chunk)
+            part.flush()
+            os.fsync(part.fileno())
+            size = part.tell()
+        os.replace(part_path, path)
+    except BaseException:
+        try:
+            os.unlink(part_path)
+        except FileNotFoundError:
+            pass
+        raise
+    _count(downloaded_bytes=size)
+
+
+def _evict(keep):
+    """Remove least recently used files until the cache fits MAX_BYTES."""
+    files = []
+    total = 0
+    now = time.time()
+    with os.scandir(CACHE_DIR) as entries:
+        for entry in entries:
+            try:
+                info = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith('.part'):
+                if now - info.st_mtime > STALE_PART_SECONDS:
+                    _remove(entry.path)
+                continue
+            if entry.name.endswith('.lock') or not entry.is_file():
+                continue
+            files.append((info.st_mtime, info.st_size, entry.path))
+            total += info.st_size
+
+    for _, size, path in sorted(files):
+        if total <= MAX_BYTES:
+            break
+        if path == keep:
+            continue
+        if _remove(path):
+            total -= size
+            _count(evictions=1, evicted_bytes=size)
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def cached_path(public_id, version, url):
+    """Local path of the file, downloading it from `url` on a miss."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    name = _cache_name(public_id, version)
+    path = os.path.join(CACHE_DIR, name)
+    if _touch(path):
+        _count(hits=1)
+        return path
+
+    with _single_flight(name), _file_lock(f"{path}.lock"):
+        if _touch(path):
+            # Filled by a concurrent request while we waited
+            _count(hits=1, coalesced=1)
+            return path
+        _count(misses=1)
+        _download(url, path)
+
+    try:
+        _evict(keep=path)
+    except Exception:
+        logger.warning("Book file cache eviction failed", exc_info=True)
+    return path
+
+
+def url_path(url):
+    """Local path for a Cloudinary delivery URL, or None for other URLs or when caching is off."""
+    if MAX_BYTES <= 0:
+        return None
+    parsed = parse_cloudinary_url(url)
+    if parsed is None:
+        return None
+    public_id, version = parsed
+    return cached_path(public_id, version, url)
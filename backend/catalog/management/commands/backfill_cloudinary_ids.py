@@ -1,7 +1,10 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 
+from catalog import signed_urls
+from catalog.caching import bump_catalog_generation
 from catalog.models import Book
+from catalog.snapshots import invalidate_snapshots
 
 
 class Command(BaseCommand):
@@ -11,7 +14,7 @@ class Command(BaseCommand):
     )
 
     def handle(self, *args, **options):
-        updated = 0
+        updated_ids = []
         for book in Book.objects.all():
             if not book.file:
                 continue
@@ -32,7 +35,13 @@ class Command(BaseCommand):
             if update_kwargs:
                 update_kwargs['updated_at'] = timezone.now()
                 Book.objects.filter(pk=book.pk).update(**update_kwargs)
-                updated += 1
+                updated_ids.append(book.pk)
 
-        self.stdout.write(self.style.SUCCESS(f"Backfilled {updated} book(s)."))
+        if updated_ids:
+            # update() skips the post_save signals that drop cached file info and payloads
+            signed_urls.invalidate_books(updated_ids)
+            invalidate_snapshots(updated_ids)
+            bump_catalog_generation()
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {len(updated_ids)} book(s)."))
 
@@ -0,0 +1,79 @@
+import datetime
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from catalog.models import Book
+from catalog.serializers import BookListSerializer
+from elibrary.renderers import ORJSONRenderer
+
+
+class Command(BaseCommand):
+    help = "Compares DRF's JSONRenderer with the orjson renderer on a page of BookListSerializer output"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=20, help='Books per rendered page.')
+        parser.add_argument('--iterations', type=int, default=2000, help='Renders per renderer.')
+        parser.add_argument(
+            '--synthetic',
+            action='store_true',
+            help='Render generated books shaped like BookListSerializer output instead of reading the database.'
+        )
+
+    def _synthetic_page(self, page_size):
+        now = timezone.now()
+        categories = [
+            {'id': i, 'name': f'Category {i}', 'slug': f'category-{i}', 'description': 'Lorem ipsum dolor sit amet.',
+             'created_at': (now - datetime.timedelta(days=i)).isoformat()}
+            for i in range(3)
+        ]
+        return [
+            {
+                'id': i, 'title': f'Book title {i}', 'author': f'Author {i % 7}',
+                'description': 'A moderately long description of the book. ' * 8,
+                'isbn': f'978-0-00-{i:06d}-0', 'language': 'English', 'year': 2000 + i % 25, 'pages': 320,
+                'cover_image': f'https://res.cloudinary.com/demo/image/upload/v1/books/covers/cover_{i}.jpg',
+                'file': f'https://res.cloudinary.com/demo/raw/upload/v1/books/files/book_{i}.pdf',
+                'file_type': 'pdf', 'is_published': True,
+                'view_count': i * 37, 'like_count': i * 3, 'bookmark_count': i,
+                'tags': ['fiction', 'classic', f'tag-{i}'], 'categories': categories,
+                'is_liked': False, 'is_bookmarked': False, 'reading_progress': None,
+                'created_at': (now - datetime.timedelta(hours=i)).isoformat(),
+            }
+            for i in range(page_size)
+        ]
+
+    def _database_page(self, page_size):
+        books = (
+            Book.objects.filter(is_published=True)
+            .select_related('author')
+            .prefetch_related('categories')
+            .order_by('-created_at')[:page_size]
+        )
+        return BookListSerializer(books, many=True, context={'personalize': False}).data
+
+    def handle(self, *args, **options):
+        page_size = options['page_size']
+        iterations = options['iterations']
+
+        results = self._synthetic_page(page_size) if options['synthetic'] else self._database_page(page_size)
+        data = {'count': len(results), 'next': None, 'previous': None, 'results': results}
+
+        drf_renderer, orjson_renderer = JSONRenderer(), ORJSONRenderer()
+        if orjson_renderer.render(data) != drf_renderer.render(data):
+            self.stdout.write(self.style.WARNING('Renderers produced different bytes for this page.'))
+
+        size = len(orjson_renderer.render(data))
+        self.stdout.write(f"Rendering a page of {len(results)} books ({size} bytes), {iterations} iterations each:")
+
+        timings = {}
+        for name, renderer in (('JSONRenderer', drf_renderer), ('ORJSONRenderer', orjson_renderer)):
+            seconds = min(timeit.repeat(lambda: renderer.render(data), number=iterations, repeat=3))
+            timings[name] = seconds / iterations * 1e6
+            self.stdout.write(f"  {name:<15} {timings[name]:8.1f} µs/page")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"orjson is {timings['JSONRenderer'] / timings['ORJSONRenderer']:.1f}x faster"
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from catalog import counters
+
+
+class Command(BaseCommand):
+    help = 'Writes buffered book view/like/bookmark counter deltas to the database'
+
+    def handle(self, *args, **options):
+        flushed = counters.flush()
+        self.stdout.write(self.style.SUCCESS(f"Flushed counters for {flushed} books."))
@@ -1,83 +1,270 @@
 # catalog/management/commands/generate_embeddings.py
-from django.core.management.base import BaseCommand
+import json
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand, CommandError
 from catalog.models import Book
-from catalog.ai_utils import get_embedding
+from catalog.ai_utils import EMBEDDING_BATCH_LIMIT, get_embeddings
+from catalog.embeddings import build_embedding_text, embedding_fields, embedding_is_stale, embedding_text_hash
 
 
 class Command(BaseCommand):
     help = 'Generates embedding vectors for all books using Gemini AI'
 
+    # Retries for rate limits (429) and transient server errors (5xx)
+    max_retries = 6
+    backoff_base_seconds = 2
+    backoff_max_seconds = 60
+
+    embedding_update_fields = ['embedding_vector', 'embedding_hash', 'embedding_model', 'embedding_dimensions']
+
     def add_arguments(self, parser):
         parser.add_argument(
             '--all',
             action='store_true',
             help='Regenerate embeddings for all published books, including books that already have vectors.'
         )
+        parser.add_argument(
+            '--changed',
+            action='store_true',
+            help='Re-embed only books whose embedding text, model or dimension changed since their last embedding.'
+        )
+        parser.add_argument(
+            '--adopt-existing',
+            action='store_true',
+            help=(
+                'Record the text hash, model and dimensions for books embedded before they were tracked, '
+                'without calling the API. Without this, --changed and the first admin save re-embed every such book.'
+            )
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help=f'Texts per embedding API call (max {EMBEDDING_BATCH_LIMIT}).'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Number of embedding batches requested concurrently.'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default='.generate_embeddings.checkpoint',
+            help='File recording the last fully processed book id, used to resume an interrupted run.'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore any existing checkpoint and start from the first book.'
+        )
+
+    # --- Checkpointing ---
 
-    def _build_embedding_text(self, book):
-        parts = [
-            f"Title: {book.title or ''}",
-            f"Author: {book.author.name if book.author else ''}",
-            f"Description: {book.description or ''}",
-        ]
+    def _load_checkpoint(self, path, mode):
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        # A checkpoint from a different mode would skip the wrong books.
+        if data.get('mode') != mode:
+            return None
+        return data.get('last_id')
 
-        if book.categories.exists():
-            parts.append("Categories: " + ", ".join(c.name for c in book.categories.all() if c.name))
+    def _save_checkpoint(self, path, mode, last_id):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as fh:
+            json.dump({'mode': mode, 'last_id': last_id}, fh)
+        os.replace(tmp_path, path)
 
-        if isinstance(book.tags, list) and book.tags:
-            parts.append("Tags: " + ", ".join(str(tag) for tag in book.tags if str(tag).strip()))
+    def _changed_ids(self, queryset, chunk_size=500):
+        """Ids of books whose stored embedding hash/model/dimension no longer match."""
+        ids = list(queryset.order_by('id').values_list('id', flat=True))
+        changed = []
+        for start in range(0, len(ids), chunk_size):
+            books = (
+                Book.objects.filter(id__in=ids[start:start + chunk_size])
+                .select_related('author')
+                .prefetch_related('categories')
+                .defer('search_vector')
+            )
+            changed.extend(book.id for book in books if embedding_is_stale(book))
+        return sorted(changed)
 
-        if book.ai_summary:
-            parts.append(f"AI Summary: {book.ai_summary}")
+    def _adopt_existing(self, chunk_size):
+        """Stamp untracked vectors as current so they are not all re-embedded once."""
+        from catalog.ai_utils import EMBEDDING_DIMENSIONS
+
+        ids = list(
+            Book.objects.filter(embedding_vector__isnull=False, embedding_hash__isnull=True)
+            .order_by('id').values_list('id', flat=True)
+        )
+        adopted = 0
+        for start in range(0, len(ids), chunk_size):
+            books = list(
+                Book.objects.filter(id__in=ids[start:start + chunk_size])
+                .select_related('author')
+                .prefetch_related('categories')
+                .defer('search_vector')
+            )
+            # A vector of the wrong size cannot be reused; leave it for --changed.
+            books = [book for book in books if len(book.embedding_vector) == EMBEDDING_DIMENSIONS]
+            for book in books:
+                fields = embedding_fields(book.embedding_vector, embedding_text_hash(build_embedding_text(book)))
+                for field, value in fields.items():
+                    setattr(book, field, value)
+            Book.objects.bulk_update(books, self.embedding_update_fields[1:], batch_size=chunk_size)
+            adopted += len(books)
+        return adopted, len(ids)
 
-        if isinstance(book.ai_tags, list) and book.ai_tags:
-            parts.append("AI Tags: " + ", ".join(str(tag) for tag in book.ai_tags if str(tag).strip()))
+    # --- Embedding ---
 
-        # Keep only non-empty segments to avoid noisy separators.
-        return "\n".join(part for part in parts if part.split(":", 1)[-1].strip())
+    def _is_retryable(self, exc):
+        code = getattr(exc, 'code', None) or getattr(exc, 'status_code', None)
+        return code == 429 or (isinstance(code, int) and 500 <= code < 600)
+
+    def _embed_batch(self, texts):
+        """Embed one batch, backing off exponentially (with jitter) on rate limits."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return get_embeddings(texts)
+            except Exception as exc:
+                if attempt == self.max_retries or not self._is_retryable(exc):
+                    raise
+                delay = min(self.backoff_base_seconds * 2 ** attempt, self.backoff_max_seconds)
+                time.sleep(delay + random.uniform(0, delay / 2))
+
+    def _batches(self, book_ids, batch_size):
+        # Load each batch by primary key rather than holding a cursor open for the
+        # whole run (server-side cursors do not survive a transaction-mode pooler).
+        for start in range(0, len(book_ids), batch_size):
+            batch = list(
+                Book.objects.filter(id__in=book_ids[start:start + batch_size])
+                .select_related('author')
+                .prefetch_related('categories')
+                .order_by('id')
+            )
+            if batch:
+                yield batch
 
     def handle(self, *args, **options):
         regenerate_all = options.get('all', False)
+        changed_only = options.get('changed', False)
+        batch_size = options['batch_size']
+        workers = options['workers']
+        checkpoint_path = options['checkpoint']
+
+        if not 1 <= batch_size <= EMBEDDING_BATCH_LIMIT:
+            raise CommandError(f'--batch-size must be between 1 and {EMBEDDING_BATCH_LIMIT}.')
+        if workers < 1:
+            raise CommandError('--workers must be at least 1.')
+        if regenerate_all and changed_only:
+            raise CommandError('--all and --changed are mutually exclusive.')
+
+        if options.get('adopt_existing', False):
+            if regenerate_all or changed_only:
+                raise CommandError('--adopt-existing cannot be combined with --all or --changed.')
+            adopted, found = self._adopt_existing(batch_size * 10)
+            self.stdout.write(self.style.SUCCESS(
+                f"Adopted {adopted}/{found} existing embeddings without a recorded text hash."
+            ))
+            return
+
+        mode = 'all' if regenerate_all else 'changed' if changed_only else 'missing'
         filters = {'is_published': True}
-        if not regenerate_all:
+        if mode == 'missing':
             filters['embedding_vector__isnull'] = True
 
-        books = Book.objects.filter(**filters).select_related('author').prefetch_related('categories')
-        total = books.count()
+        resume_after = None if options['restart'] else self._load_checkpoint(checkpoint_path, mode)
+        if resume_after is not None:
+            filters['id__gt'] = resume_after
+            self.stdout.write(self.style.WARNING(f"Resuming after book id {resume_after} (use --restart to start over)."))
+
+        if changed_only:
+            book_ids = self._changed_ids(Book.objects.filter(**filters))
+        else:
+            book_ids = list(Book.objects.filter(**filters).order_by('id').values_list('id', flat=True))
+        total = len(book_ids)
         success_count = 0
         error_count = 0
-        
+
         if total == 0:
             if regenerate_all:
                 self.stdout.write(self.style.WARNING('No published books found to process.'))
+            elif changed_only:
+                self.stdout.write(self.style.WARNING('No books with changed embedding text found.'))
             else:
                 self.stdout.write(self.style.WARNING('No books without embeddings found.'))
             return
-        
-        self.stdout.write(f"Found {total} books to process...")
-        
-        for i, book in enumerate(books, 1):
-            self.stdout.write(f"[{i}/{total}] Processing: {book.title}")
-            
-            try:
-                # Create richer text payload for stronger semantic recall.
-                text_to_embed = self._build_embedding_text(book)
-                
-                # Get embedding from Gemini
-                vector = get_embedding(text_to_embed)
-                
-                # Save as float array for pgvector VectorField
-                book.embedding_vector = vector
-                book.save(update_fields=['embedding_vector'])
-                success_count += 1
-                
-                self.stdout.write(self.style.SUCCESS(f"  ✓ Embedded ({len(vector)} dimensions)"))
-                
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f"  ✗ Error: {e}"))
-                error_count += 1
-                continue
-            
+
+        self.stdout.write(f"Found {total} books to process ({batch_size} per request, {workers} workers)...")
+
+        # Batches finish out of order; the checkpoint only advances over a contiguous
+        # prefix of finished batches so a resume never skips unprocessed books.
+        batch_last_ids = []
+        finished = set()
+        next_to_checkpoint = 0
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            in_flight = {}
+            batches = self._batches(book_ids, batch_size)
+
+            def submit_next():
+                batch = next(batches, None)
+                if batch is None:
+                    return False
+                index = len(batch_last_ids)
+                batch_last_ids.append(batch[-1].id)
+                texts = [build_embedding_text(book) for book in batch]
+                in_flight[pool.submit(self._embed_batch, texts)] = (index, batch, texts)
+                return True
+
+            # Keep at most two batches per worker in flight to bound memory.
+            while len(in_flight) < workers * 2 and submit_next():
+                pass
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, batch, texts = in_flight.pop(future)
+                    try:
+                        vectors = future.result()
+                    except Exception as e:
+                        # Not marked finished, so the checkpoint stays before this batch.
+                        error_count += len(batch)
+                        self.stdout.write(self.style.ERROR(
+                            f"  ✗ Batch of {len(batch)} (ids {batch[0].id}-{batch[-1].id}) failed: {e}"
+                        ))
+                    else:
+                        for book, text, vector in zip(batch, texts, vectors):
+                            for field, value in embedding_fields(vector, embedding_text_hash(text)).items():
+                                setattr(book, field, value)
+                        Book.objects.bulk_update(batch, self.embedding_update_fields, batch_size=batch_size)
+                        success_count += len(batch)
+                        self.stdout.write(self.style.SUCCESS(
+                            f"  ✓ [{success_count + error_count}/{total}] Embedded ids {batch[0].id}-{batch[-1].id}"
+                        ))
+                        finished.add(index)
+
+                    advanced = False
+                    while next_to_checkpoint in finished:
+                        next_to_checkpoint += 1
+                        advanced = True
+                    if advanced:
+                        self._save_checkpoint(checkpoint_path, mode, batch_last_ids[next_to_checkpoint - 1])
+
+                    submit_next()
+
+        if error_count == 0 and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
         self.stdout.write(self.style.SUCCESS(
             f"\nEmbedding run complete: {success_count}/{total} succeeded, {error_count} failed."
         ))
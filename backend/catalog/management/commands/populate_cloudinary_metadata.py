@@ -2,7 +2,10 @@
 Management command to populate cloudinary_public_id and file_url for existing books
 """
 from django.core.management.base import BaseCommand
+from catalog import signed_urls
+from catalog.caching import bump_catalog_generation
 from catalog.models import Book
+from catalog.snapshots import invalidate_snapshots
 
 
 class Command(BaseCommand):
@@ -10,7 +13,7 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         books = Book.objects.filter(file__isnull=False)
-        updated_count = 0
+        updated_ids = []
         
         self.stdout.write(self.style.WARNING(f'Found {books.count()} books with files'))
         
@@ -35,7 +38,7 @@ class Command(BaseCommand):
                         file_url=book.file_url
                     )
                     
-                    updated_count += 1
+                    updated_ids.append(book.pk)
                     self.stdout.write(
                         self.style.SUCCESS(
                             f'✓ Updated book {book.id}: {book.title} - public_id: {public_id}'
@@ -48,8 +51,14 @@ class Command(BaseCommand):
                     )
                 )
         
+        if updated_ids:
+            # update() skips the post_save signals that drop cached file info and payloads
+            signed_urls.invalidate_books(updated_ids)
+            invalidate_snapshots(updated_ids)
+            bump_catalog_generation()
+        
         self.stdout.write(
             self.style.SUCCESS(
-                f'\n✓ Successfully updated {updated_count} out of {books.count()} books'
+                f'\n✓ Successfully updated {len(updated_ids)} out of {books.count()} books'
             )
         )
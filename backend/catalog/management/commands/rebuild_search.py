@@ -1,23 +1,37 @@
 from django.core.management.base import BaseCommand
 from catalog.models import Book
 from catalog.ai_utils import analyze_cover_with_vision, get_embedding
+from catalog.search import refresh_search_index
 
 class Command(BaseCommand):
-    help = "Generates Vision descriptions and updates all book embeddings"
+    help = "Generates Vision descriptions, updates all book embeddings and rebuilds the full-text search index"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--search-only',
+            action='store_true',
+            help='Only rebuild the persisted search columns (search_vector, tags_text); no Vision or embedding calls.'
+        )
 
     def handle(self, *args, **options):
         books = Book.objects.all()
+
+        if options.get('search_only'):
+            updated = refresh_search_index(books)
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt search index for {updated} book(s)."))
+            return
+
         self.stdout.write(f"Found {books.count()} books. Starting process...")
 
         for book in books:
             self.stdout.write(f"--- Processing: {book.title} ---")
-            
+
             # 1. Vision Analysis (The 'Eyes')
             if book.file_url:
                 self.stdout.write("Analyzing cover image...")
                 vision_text = analyze_cover_with_vision(book.file_url)
                 # Store this in your visual field
-                book.ai_description = vision_text 
+                book.ai_description = vision_text
             else:
                 vision_text = ""
 
@@ -32,4 +46,8 @@ class Command(BaseCommand):
 
             self.stdout.write(self.style.SUCCESS(f"Successfully updated {book.title}"))
 
-        self.stdout.write(self.style.SUCCESS("All books have been re-indexed with Vision data!"))
\ No newline at end of file
+        # 4. Refresh the persisted full-text index in a single statement
+        updated = refresh_search_index(Book.objects.all())
+        self.stdout.write(f"Rebuilt search index for {updated} book(s).")
+
+        self.stdout.write(self.style.SUCCESS("All books have been re-indexed with Vision data!"))
@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.db.models.functions import Lower, Trim
+from django.utils import timezone
+
+from analytics.models import SearchQuery
+from catalog.embedding_cache import embedding_cache_stats, get_query_embedding, is_cached
+
+
+class Command(BaseCommand):
+    help = 'Pre-embeds the most frequent search terms so semantic/hybrid searches hit the embedding cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=200, help='Number of top search terms to warm.')
+        parser.add_argument('--days', type=int, default=30, help='Only consider searches from the last N days.')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        top_terms = (
+            SearchQuery.objects.filter(searched_at__gte=since)
+            .annotate(term=Lower(Trim('query')))
+            .values('term')
+            .annotate(total=Count('id'))
+            .order_by('-total')[:options['limit']]
+        )
+
+        warmed = skipped = failed = 0
+        for row in top_terms:
+            term = row['term']
+            if len(term) < 3:
+                continue
+            if is_cached(term):
+                skipped += 1
+                continue
+            try:
+                get_query_embedding(term)
+                warmed += 1
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"  ✗ '{term}': {e}"))
+                failed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Embedding cache warm-up complete: {warmed} embedded, {skipped} already cached, {failed} failed."
+        ))
+        self.stdout.write(f"Cache stats: {embedding_cache_stats()}")
@@ -0,0 +1,40 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Cast
+
+
+def populate_search_vector(apps, schema_editor):
+    Author = apps.get_model('catalog', 'Author')
+    Book = apps.get_model('catalog', 'Book')
+
+    author_name = Subquery(Author.objects.filter(pk=OuterRef('author_id')).values('name')[:1])
+    Book.objects.update(search_vector=(
+        SearchVector('title', weight='A', config='english')
+        + SearchVector(author_name, weight='A', config='english')
+        + SearchVector('description', weight='B', config='english')
+        + SearchVector('ai_summary', weight='B', config='english')
+        + SearchVector(Cast('tags', models.TextField()), weight='A', config='simple')
+        + SearchVector(Cast('ai_tags', models.TextField()), weight='A', config='simple')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_book_visual_description'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='search_vector',
+            field=SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=GinIndex(fields=['search_vector'], name='catalog_book_search_gin'),
+        ),
+        migrations.RunPython(populate_search_vector, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+FLATTEN_TAGS_SQL = """
+UPDATE catalog_book SET tags_text = concat_ws(
+    ' ',
+    CASE jsonb_typeof(tags) WHEN 'array'
+        THEN array_to_string(ARRAY(SELECT jsonb_array_elements_text(tags)), ' ')
+        ELSE tags #>> '{}' END,
+    CASE jsonb_typeof(ai_tags) WHEN 'array'
+        THEN array_to_string(ARRAY(SELECT jsonb_array_elements_text(ai_tags)), ' ')
+        ELSE ai_tags #>> '{}' END
+);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_book_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='book',
+            name='tags_text',
+            field=models.TextField(blank=True, default='', editable=False, help_text='tags and ai_tags flattened to plain text for trigram matching'),
+        ),
+        migrations.RunSQL(FLATTEN_TAGS_SQL, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='author',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='catalog_author_name_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('title'), name='gin_trgm_ops'), name='catalog_book_title_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('description'), name='gin_trgm_ops'), name='catalog_book_desc_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('tags_text'), name='gin_trgm_ops'), name='catalog_book_tags_trgm'),
+        ),
+    ]
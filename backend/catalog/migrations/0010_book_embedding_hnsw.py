@@ -0,0 +1,19 @@
+from django.db import migrations
+import pgvector.django
+import pgvector.django.indexes
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0009_book_tags_text_trigram_indexes'),
+    ]
+
+    operations = [
+        # No-op where the extension already exists (it backs embedding_vector since 0006).
+        pgvector.django.VectorExtension(),
+        migrations.AddIndex(
+            model_name='book',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding_vector'], m=16, name='catalog_book_embedding_hnsw', opclasses=['vector_cosine_ops']),
+        ),
+    ]
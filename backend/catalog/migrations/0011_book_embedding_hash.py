@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_book_embedding_hnsw'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='embedding_dimensions',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='embedding_hash',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-256 of the text the embedding was generated from', max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='embedding_model',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def delete_duplicate_bookmarks(apps, schema_editor):
+    """Keep the most recently updated bookmark per (user, book) and recount the affected books."""
+    Book = apps.get_model('catalog', 'Book')
+    Bookmark = apps.get_model('catalog', 'Bookmark')
+
+    duplicates = (
+        Bookmark.objects.values('user_id', 'book_id')
+        .annotate(rows=Count('id'))
+        .filter(rows__gt=1)
+    )
+    book_ids = set()
+    for row in duplicates:
+        keep = (
+            Bookmark.objects.filter(user_id=row['user_id'], book_id=row['book_id'])
+            .order_by('-updated_at', '-id')
+            .values_list('id', flat=True)
+            .first()
+        )
+        Bookmark.objects.filter(user_id=row['user_id'], book_id=row['book_id']).exclude(pk=keep).delete()
+        book_ids.add(row['book_id'])
+
+    # Racing toggles counted every duplicate in bookmark_count as well
+    for book_id in book_ids:
+        Book.objects.filter(pk=book_id).update(bookmark_count=Bookmark.objects.filter(book_id=book_id).count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_book_embedding_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_bookmarks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_delete_duplicate_bookmarks'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='bookmark',
+            constraint=models.UniqueConstraint(fields=('user', 'book'), name='catalog_bookmark_user_book_uniq'),
+        ),
+    ]
@@ -1,7 +1,10 @@
 from django.db import models
 from django.utils.text import slugify
 from django.contrib.auth import get_user_model
-from pgvector.django import VectorField
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models.functions import Upper
+from pgvector.django import HnswIndex, VectorField
 
 
 # Get the custom User model defined in the 'accounts' app
@@ -9,6 +12,7 @@ User = get_user_model()
 
 # Import custom storage
 from .storage import RawMediaCloudinaryStorage
+from .caching import changed_attnames, remember_loaded_values
 
 # --- Utility Fields ---
 class Author(models.Model):
@@ -19,6 +23,12 @@ class Author(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Trigram index backing the keyword engine's author__name__icontains clause
+            GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='catalog_author_name_trgm'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
@@ -88,16 +98,47 @@ class Book(models.Model):
     ai_tags = models.JSONField(default=list, help_text="List of AI-generated tags") or []
     trending_score = models.FloatField(default=0.0, db_index=True)
     embedding_vector = VectorField(dimensions=768, null=True, blank=True)
+    # What embedding_vector was built from, so only changed books get re-embedded
+    embedding_hash = models.CharField(max_length=64, null=True, blank=True, editable=False,
+                                      help_text="SHA-256 of the text the embedding was generated from")
+    embedding_model = models.CharField(max_length=100, null=True, blank=True, editable=False)
+    embedding_dimensions = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
     visual_description = models.TextField(blank=True, null=True)
 
+    # Persisted search columns, maintained by catalog.signals
+    search_vector = SearchVectorField(null=True, editable=False)
+    tags_text = models.TextField(blank=True, default='', editable=False,
+                                 help_text="tags and ai_tags flattened to plain text for trigram matching")
+
     class Meta:
         indexes = [
             models.Index(fields=['is_published', '-view_count']),
             models.Index(fields=['is_published', '-created_at']),
             models.Index(fields=['is_published', '-like_count']),
             models.Index(fields=['author', 'is_published']),
+            GinIndex(fields=['search_vector'], name='catalog_book_search_gin'),
+            # Trigram indexes backing the keyword engine's icontains clauses
+            GinIndex(OpClass(Upper('title'), name='gin_trgm_ops'), name='catalog_book_title_trgm'),
+            GinIndex(OpClass(Upper('description'), name='gin_trgm_ops'), name='catalog_book_desc_trgm'),
+            GinIndex(OpClass(Upper('tags_text'), name='gin_trgm_ops'), name='catalog_book_tags_trgm'),
+            # ANN index for CosineDistance ordering; recall is tuned per query via hnsw.ef_search
+            HnswIndex(
+                name='catalog_book_embedding_hnsw',
+                fields=['embedding_vector'],
+                m=16,
+                ef_construction=64,
+                opclasses=['vector_cosine_ops'],
+            ),
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets catalog.signals skip cache invalidation and search refreshes for saves that
+        # leave payload and searchable fields alone (see catalog.caching.save_touches)
+        remember_loaded_values(instance)
+        return instance
+
     def save(self, *args, **kwargs):
         """Override save to populate Cloudinary metadata with canonical values"""
         if self.file:
@@ -123,7 +164,9 @@ class Book(models.Model):
                  except:
                      pass
         
+        self._saved_changes = changed_attnames(self)
         super().save(*args, **kwargs)
+        remember_loaded_values(self)
 
     def __str__(self):
         return self.title
@@ -171,6 +214,10 @@ class Bookmark(models.Model):
     class Meta:
         verbose_name = "Bookmark"
         verbose_name_plural = "Bookmarks"
+        constraints = [
+            # One bookmark per user and book: toggle_bookmark relies on it under concurrent toggles
+            models.UniqueConstraint(fields=['user', 'book'], name='catalog_bookmark_user_book_uniq'),
+        ]
 
     def __str__(self):
         return f"Bookmark in {self.book.title} by {self.user.email} at {self.location}"
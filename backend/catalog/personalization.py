@@ -0,0 +1,51 @@
+"""
+Per-user book fields (is_liked, is_bookmarked, reading_progress).
+
+Book payloads are serialized and cached once for everyone without these
+fields filled in; the user's state for the books on the page is fetched in a
+single query and merged into the response.
+"""
+from django.db.models import Exists, OuterRef, Subquery
+
+PERSONAL_FIELDS = ('is_liked', 'is_bookmarked', 'reading_progress')
+
+
+def user_book_state(user, book_ids):
+    """{book_id: {is_liked, is_bookmarked, reading_progress}} for the given books, in one query."""
+    from reading.models import ReadingProgress
+    from .models import Book, Bookmark, BookLike
+
+    progress = ReadingProgress.objects.filter(user=user, book_id=OuterRef('pk')).order_by()
+    rows = (
+        Book.objects.filter(pk__in=list(book_ids))
+        .annotate(
+            liked=Exists(BookLike.objects.filter(user=user, book_id=OuterRef('pk'))),
+            bookmarked=Exists(Bookmark.objects.filter(user=user, book_id=OuterRef('pk'))),
+            # (user, book) is unique on ReadingProgress, so these are single rows.
+            progress_percent=Subquery(progress.values('percent')[:1]),
+            progress_location=Subquery(progress.values('last_location')[:1]),
+            progress_completed=Subquery(progress.values('completed')[:1]),
+        )
+        .values_list('pk', 'liked', 'bookmarked', 'progress_percent', 'progress_location', 'progress_completed')
+    )
+
+    state = {}
+    for book_id, liked, bookmarked, percent, location, completed in rows:
+        state[book_id] = {
+            'is_liked': liked,
+            'is_bookmarked': bookmarked,
+            'reading_progress': None if completed is None else {
+                'percent': percent,
+                'last_location': location,
+                'completed': completed,
+            },
+        }
+    return state
+
+
+def personalize(items, user):
+    """Copies of serialized books with the user's fields merged in."""
+    if not user.is_authenticated or not items:
+        return list(items)
+    state = user_book_state(user, [item['id'] for item in items])
+    return [{**item, **state.get(item['id'], {})} for item in items]
@@ -0,0 +1,276 @@
+import re
+from contextlib import contextmanager
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import connection, models, transaction
+from django.db.models import F, Func, OuterRef, Q, Subquery, Window
+from django.db.models.functions import Cast, Greatest, RowNumber
+from pgvector.django import CosineDistance
+
+from .caching import save_touches
+
+
+# Fields on Book that feed the persisted search columns (search_vector, tags_text).
+SEARCH_INDEX_FIELDS = {'title', 'author', 'description', 'ai_summary', 'tags', 'ai_tags'}
+SEARCH_INDEX_ATTNAMES = frozenset('author_id' if name == 'author' else name for name in SEARCH_INDEX_FIELDS)
+
+
+class FlattenJSONText(Func):
+    """
+    Flatten a JSON list column into space-separated text.
+
+    Tags are stored as JSON lists, but older rows may hold a plain string, so
+    non-array values are returned as their scalar text. Only use this with
+    plain column references: the argument is rendered more than once.
+    """
+    arity = 1
+    output_field = models.TextField()
+    template = (
+        "CASE jsonb_typeof(%(expressions)s) WHEN 'array' "
+        "THEN array_to_string(ARRAY(SELECT jsonb_array_elements_text(%(expressions)s)), ' ') "
+        "ELSE %(expressions)s #>> '{}' END"
+    )
+
+
+def flattened_tags():
+    """Expression producing the tags_text column from tags and ai_tags."""
+    return Func(
+        FlattenJSONText('tags'),
+        FlattenJSONText('ai_tags'),
+        template="concat_ws(' ', %(expressions)s)",
+        output_field=models.TextField(),
+    )
+
+
+def book_search_vector():
+    """
+    Weighted tsvector expression over the fields we search on.
+
+    The author name is pulled through a subquery because UPDATE statements
+    cannot reference joined columns directly.
+    """
+    from .models import Author
+
+    author_name = Subquery(Author.objects.filter(pk=OuterRef('author_id')).values('name')[:1])
+    return (
+        SearchVector('title', weight='A', config='english')
+        + SearchVector(author_name, weight='A', config='english')
+        + SearchVector('description', weight='B', config='english')
+        + SearchVector('ai_summary', weight='B', config='english')
+        + SearchVector(Cast('tags', models.TextField()), weight='A', config='simple')
+        + SearchVector(Cast('ai_tags', models.TextField()), weight='A', config='simple')
+    )
+
+
+def refresh_search_index(queryset):
+    """Recompute search_vector and tags_text for every book in the queryset with one UPDATE."""
+    return queryset.update(search_vector=book_search_vector(), tags_text=flattened_tags())
+
+
+def search_fields_changed(book, created=False, update_fields=None):
+    """Whether the Book save being signalled may have changed a searchable value."""
+    return save_touches(book, SEARCH_INDEX_ATTNAMES, created, update_fields)
+
+
+# --- Keyword engine ---
+#
+# Matching keeps the substring semantics of the old icontains chain, but only
+# over columns that carry an UPPER(...) gin_trgm_ops index (see Book.Meta and
+# Author.Meta), so Postgres can answer each clause from a trigram index and
+# combine them with a BitmapOr instead of scanning the table per clause.
+
+def split_terms(query):
+    normalized_query = " ".join(query.split())
+    return normalized_query, [term for term in re.split(r"\s+", normalized_query) if term]
+
+
+def keyword_clauses(text):
+    return (
+        Q(title__icontains=text)
+        | Q(author__name__icontains=text)
+        | Q(description__icontains=text)
+        | Q(tags_text__icontains=text)
+    )
+
+
+def keyword_match(query):
+    """Match the full phrase OR require every token to appear in a searchable field."""
+    normalized_query, terms = split_terms(query)
+    if not terms:
+        return None
+
+    all_terms_clause = Q()
+    for term in terms:
+        all_terms_clause &= keyword_clauses(term)
+    return keyword_clauses(normalized_query) | all_terms_clause
+
+
+def keyword_rank(query):
+    """Trigram word-similarity score; description counts for half so title/author hits lead."""
+    normalized_query, _ = split_terms(query)
+    return Greatest(
+        TrigramWordSimilarity(normalized_query, 'title'),
+        TrigramWordSimilarity(normalized_query, 'author__name'),
+        TrigramWordSimilarity(normalized_query, 'tags_text'),
+        TrigramWordSimilarity(normalized_query, 'description') * 0.5,
+    )
+
+
+# --- Hybrid search ---
+#
+# Keyword, full-text and vector candidates are computed as CTEs in a single
+# statement and merged with reciprocal-rank fusion (score = sum of 1 / (k + rank)
+# over the signals a book appears in). A signal with no candidates simply
+# contributes nothing, so results still rank sensibly when e.g. the embedding
+# call failed or no book matches lexically.
+
+HYBRID_CANDIDATES = 100
+HYBRID_RRF_K = 60
+HYBRID_MAX_DISTANCE = 0.62
+
+# Large columns the list serializers never read; left out of the hybrid SELECT.
+HYBRID_DEFERRED_COLUMNS = {'embedding_vector', 'search_vector'}
+
+
+def _ranked_candidates(qs, order_by):
+    """Top candidate ids of one signal with their 1-based position."""
+    ranked = (
+        qs.annotate(pos=Window(RowNumber(), order_by=order_by))
+        .order_by(order_by)
+        .values('id', 'pos')[:HYBRID_CANDIDATES]
+    )
+    return ranked.query.sql_with_params()
+
+
+def hybrid_search(scope_qs, query, query_vector=None, limit=20, offset=0):
+    """
+    Return one page of Book instances ranked by reciprocal-rank fusion.
+
+    `scope_qs` restricts the candidate universe (published books plus any
+    filterset filters). Each returned book carries `hybrid_score` and
+    `hybrid_total`, the size of the fused result set.
+    """
+    from .models import Book
+
+    scope_qs = scope_qs.order_by()
+    signals = []
+
+    match = keyword_match(query)
+    if match is not None:
+        signals.append(_ranked_candidates(
+            scope_qs.filter(match).annotate(keyword_rank=keyword_rank(query)),
+            F('keyword_rank').desc(),
+        ))
+
+    query_obj = SearchQuery(query, search_type='websearch', config='english')
+    signals.append(_ranked_candidates(
+        scope_qs.filter(search_vector=query_obj).annotate(
+            search_rank=SearchRank(F('search_vector'), query_obj)
+        ),
+        F('search_rank').desc(),
+    ))
+
+    if query_vector is not None:
+        signals.append(_ranked_candidates(
+            scope_qs.filter(embedding_vector__isnull=False)
+            .annotate(distance=CosineDistance('embedding_vector', query_vector))
+            .filter(distance__lte=HYBRID_MAX_DISTANCE),
+            F('distance').asc(),
+        ))
+
+    ctes, params = [], []
+    for i, (sql, sql_params) in enumerate(signals):
+        ctes.append(f"signal_{i} AS ({sql})")
+        params.extend(sql_params)
+
+    ranked_union = " UNION ALL ".join(f"SELECT id, pos FROM signal_{i}" for i in range(len(signals)))
+    columns = ", ".join(
+        f'b."{field.column}"' for field in Book._meta.concrete_fields
+        if field.name not in HYBRID_DEFERRED_COLUMNS
+    )
+    sql = (
+        f"WITH {', '.join(ctes)}, "
+        f"fused AS ("
+        f"SELECT id, SUM(1.0 / (%s + pos)) AS hybrid_score "
+        f"FROM ({ranked_union}) AS ranked GROUP BY id"
+        f") "
+        f"SELECT {columns}, fused.hybrid_score, COUNT(*) OVER () AS hybrid_total "
+        f"FROM {Book._meta.db_table} b JOIN fused ON fused.id = b.id "
+        f"ORDER BY fused.hybrid_score DESC, b.view_count DESC, b.id "
+        f"LIMIT %s OFFSET %s"
+    )
+    params.extend([HYBRID_RRF_K, limit, offset])
+    return list(Book.objects.raw(sql, params))
+
+
+class PrefetchedPage:
+    """
+    Pagination-compatible view of one already-fetched page of a larger result.
+
+    Lets a query that returns its own page and total (like hybrid_search) go
+    through the regular DRF paginator without a separate COUNT query.
+    """
+
+    def __init__(self, items, total, offset):
+        self.items = items
+        self.total = total
+        self.offset = offset
+
+    def count(self):
+        return self.total
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start = max((key.start or 0) - self.offset, 0)
+            stop = max((key.stop if key.stop is not None else self.total) - self.offset, 0)
+            return self.items[start:stop]
+        return self.items[key - self.offset]
+
+
+# --- ANN recall tuning ---
+#
+# embedding_vector carries an HNSW index (vector_cosine_ops). Its recall/latency
+# trade-off is controlled per query with hnsw.ef_search (ivfflat.probes if the
+# index is ever switched to IVFFlat). Values are applied with set_config(..., true),
+# i.e. SET LOCAL, so they never leak onto a pooled connection.
+
+ANN_EF_SEARCH_RANGE = (10, 1000)
+ANN_PROBES_RANGE = (1, 1000)
+
+
+def _clamped_int(value, bounds):
+    if value in (None, ''):
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    low, high = bounds
+    return min(max(value, low), high)
+
+
+def ann_params_from_query(params):
+    """Read ef_search / probes from query params, clamped to sane bounds."""
+    return {
+        'ef_search': _clamped_int(params.get('ef_search'), ANN_EF_SEARCH_RANGE),
+        'probes': _clamped_int(params.get('probes'), ANN_PROBES_RANGE),
+    }
+
+
+@contextmanager
+def ann_search_settings(ef_search=None, probes=None):
+    """Run the enclosed queries with the given ANN recall settings."""
+    if not ef_search and not probes:
+        yield
+        return
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            if ef_search:
+                cursor.execute("SELECT set_config('hnsw.ef_search', %s, true)", [str(ef_search)])
+            if probes:
+                cursor.execute("SELECT set_config('ivfflat.probes', %s, true)", [str(probes)])
+        yield
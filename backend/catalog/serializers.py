@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Category, Book, BookLike, Bookmark, Author
+from .embeddings import enqueue_reembed_if_changed
 from django.contrib.auth import get_user_model
 
 # Custom User model
@@ -40,9 +41,14 @@ class BookListSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = fields
 
+    def _personalized(self):
+        # False for shared (cached) payloads; see catalog.personalization
+        request = self.context.get('request')
+        return bool(request and request.user.is_authenticated and self.context.get('personalize', True))
+
     def get_is_liked(self, obj):
         request = self.context.get('request')
-        if request and request.user.is_authenticated:
+        if self._personalized():
             # Use prefetched data if available
             if hasattr(obj, 'likes') and hasattr(obj.likes, 'all'):
                 return obj.likes.all().exists()
@@ -51,7 +57,7 @@ class BookListSerializer(serializers.ModelSerializer):
 
     def get_is_bookmarked(self, obj):
         request = self.context.get('request')
-        if request and request.user.is_authenticated:
+        if self._personalized():
             # Use prefetched data if available
             if hasattr(obj, 'bookmarks') and hasattr(obj.bookmarks, 'all'):
                 return obj.bookmarks.all().exists()
@@ -60,7 +66,7 @@ class BookListSerializer(serializers.ModelSerializer):
 
     def get_reading_progress(self, obj):
         request = self.context.get('request')
-        if request and request.user.is_authenticated:
+        if self._personalized():
             try:
                 # Use prefetched data if available
                 if hasattr(obj, 'reading_progresses') and hasattr(obj.reading_progresses, 'all'):
@@ -137,6 +143,7 @@ class BookCreateUpdateSerializer(serializers.ModelSerializer):
                 categories.append(category_instance)
             book.categories.set(categories)
 
+        enqueue_reembed_if_changed(book)
         return book
 
     def update(self, instance, validated_data):
@@ -158,6 +165,8 @@ class BookCreateUpdateSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
 
         instance.save()
+        # Re-embed in the background only if the embedding text actually changed
+        enqueue_reembed_if_changed(instance)
         return instance
 
 
@@ -0,0 +1,102 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import signed_urls, suggestions
+from .caching import PAYLOAD_ATTNAMES, bump_catalog_generation, save_touches
+from .models import Author, Book, Category
+from .search import refresh_search_index, search_fields_changed
+from .snapshots import invalidate_snapshots
+
+
+@receiver(post_save, sender=Book)
+def update_book_search_index(sender, instance, created=False, update_fields=None, **kwargs):
+    """Keep the persisted search columns in sync when searchable fields change."""
+    # Counter, embedding and metadata saves leave the indexed text as it was loaded
+    if not search_fields_changed(instance, created, update_fields):
+        return
+    refresh_search_index(Book.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Author)
+def update_author_books_search_index(sender, instance, created=False, **kwargs):
+    """Author names are indexed, so renaming an author re-indexes their books."""
+    if created:
+        return
+    refresh_search_index(Book.objects.filter(author_id=instance.pk))
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(m2m_changed, sender=Book.categories.through)
+def invalidate_catalog_cache(sender, **kwargs):
+    """Any catalog write moves cached book responses to a new generation."""
+    if kwargs.get('action', '').startswith('pre_'):
+        return
+    bump_catalog_generation()
+
+
+@receiver(post_save, sender=Book)
+def invalidate_saved_book_cache(sender, instance, created=False, update_fields=None, **kwargs):
+    """Like invalidate_catalog_cache, but embedding or search-column saves keep cached payloads."""
+    if not save_touches(instance, PAYLOAD_ATTNAMES, created, update_fields):
+        return
+    bump_catalog_generation()
+    invalidate_snapshots([instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def invalidate_book_snapshot(sender, instance, **kwargs):
+    invalidate_snapshots([instance.pk])
+
+
+@receiver(post_save, sender=Author)
+def invalidate_author_book_snapshots(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    invalidate_snapshots(list(Book.objects.filter(author_id=instance.pk).values_list('pk', flat=True)))
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def invalidate_category_book_snapshots(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    invalidate_snapshots(list(instance.books.values_list('pk', flat=True)))
+
+
+@receiver(m2m_changed, sender=Book.categories.through)
+def invalidate_book_category_snapshots(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_snapshots([instance.pk])
+    elif action == 'pre_clear':
+        invalidate_snapshots(list(instance.books.values_list('pk', flat=True)))
+    else:
+        invalidate_snapshots(pk_set or [])
+
+
+@receiver(post_save, sender=Book)
+def update_book_suggestions(sender, instance, **kwargs):
+    suggestions.book_changed(instance)
+
+
+@receiver(post_delete, sender=Book)
+def remove_book_suggestions(sender, instance, **kwargs):
+    suggestions.book_deleted(instance.pk)
+
+
+@receiver(post_save, sender=Author)
+def update_author_suggestions(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    suggestions.author_changed(instance.pk)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book_file_info(sender, instance, **kwargs):
+    signed_urls.invalidate_book(instance.pk)
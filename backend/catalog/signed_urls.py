@@ -0,0 +1,214 @@
+"""
+Memoized signed Cloudinary URLs for the book reader.
+
+Readers reopen books constantly, and each open used to load the book and sign
+a fresh URL. Expiry times are rounded up to SIGNED_URL_BUCKET_SECONDS, so every
+request in the same bucket produces the same URL, and an issued URL is handed
+out again (from an in-process map, then the Django cache) until less than
+SIGNED_URL_TTL - SIGNED_URL_BUCKET_SECONDS of its lifetime is left. A caller
+therefore always receives a URL valid for at least that long.
+
+The book -> (public_id, file_type) lookup is cached too and dropped by
+catalog.signals whenever the book is saved or deleted; commands that change
+cloudinary_public_id with QuerySet.update() call invalidate_books. Asset content length
+and type, for batch reader prefetch, come from cached HEAD requests.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import cloudinary.utils
+import requests
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+SIGNED_URL_TTL = getattr(settings, 'SIGNED_URL_TTL', 60 * 60)
+BUCKET_SECONDS = max(getattr(settings, 'SIGNED_URL_BUCKET_SECONDS', 60 * 10), 1)
+BOOK_FILE_INFO_TTL = getattr(settings, 'BOOK_FILE_INFO_TTL', 60 * 60)
+MIN_REMAINING = max(SIGNED_URL_TTL - BUCKET_SECONDS, 0)
+
+LOCAL_CACHE_SIZE = 2048
+ASSET_METADATA_TTL = 60 * 60 * 24
+METADATA_TIMEOUT = getattr(settings, 'READER_METADATA_TIMEOUT', 2)
+METADATA_WORKERS = 8
+
+# HEADs are best effort and must not outlast METADATA_TIMEOUT: no retries, unlike
+# file_cache.cloudinary_session, whose connect retries and backoff add seconds.
+_metadata_session = requests.Session()
+
+_local = OrderedDict()   # (resource_type, public_id) -> (url, expires_at)
+_lock = threading.Lock()
+
+
+def resource_type_for(file_type):
+    # Match this to HOW you uploaded the asset.
+    # If you uploaded PDFs as image-type (image/upload), use "image".
+    # If you uploaded them as raw (raw/upload), use "raw".
+    if file_type in ("PDF", "EPUB"):
+        return "image"   # change to "raw" if you upload PDFs as raw
+    if file_type == "VIDEO":
+        return "video"
+    return "image"
+
+
+def _book_info_key(book_id):
+    return f"books:fileinfo:v1:{book_id}"
+
+
+def book_file_infos(book_ids):
+    """{book_id: (public_id, file_type)} for the published books among book_ids, in at most one query."""
+    from .models import Book
+
+    keys = {book_id: _book_info_key(book_id) for book_id in book_ids}
+    try:
+        cached = cache.get_many(list(keys.values()))
+    except Exception:
+        logger.warning("Failed to read cached book file info", exc_info=True)
+        cached = {}
+    infos = {book_id: tuple(cached[key]) for book_id, key in keys.items() if key in cached}
+
+    missing = [book_id for book_id in keys if book_id not in infos]
+    if missing:
+        rows = Book.objects.filter(pk__in=missing, is_published=True).values_list(
+            'id', 'cloudinary_public_id', 'file_type'
+        )
+        loaded = {book_id: (public_id, file_type) for book_id, public_id, file_type in rows}
+        if loaded:
+            try:
+                cache.set_many({keys[book_id]: info for book_id, info in loaded.items()}, BOOK_FILE_INFO_TTL)
+            except Exception:
+                logger.warning("Failed to cache book file info", exc_info=True)
+        infos.update(loaded)
+    return infos
+
+
+def book_file_info(book_id):
+    """(public_id, file_type) for a published book, or None if there is no such book."""
+    return book_file_infos([book_id]).get(book_id)
+
+
+def invalidate_book(book_id):
+    try:
+        cache.delete(_book_info_key(book_id))
+    except Exception:
+        logger.warning(f"Failed to invalidate file info for book {book_id}", exc_info=True)
+
+
+def invalidate_books(book_ids):
+    """invalidate_book for bulk writes that bypass save() (QuerySet.update)."""
+    try:
+        cache.delete_many([_book_info_key(book_id) for book_id in book_ids])
+    except Exception:
+        logger.warning("Failed to invalidate book file info", exc_info=True)
+
+
+def _url_key(public_id, resource_type):
+    digest = hashlib.sha1(public_id.encode('utf-8')).hexdigest()
+    return f"signedurl:{resource_type}:{digest}"
+
+
+def _usable(entry, now):
+    return entry is not None and entry[1] - now >= MIN_REMAINING
+
+
+def _remember_local(key, entry):
+    with _lock:
+        _local[key] = entry
+        _local.move_to_end(key)
+        while len(_local) > LOCAL_CACHE_SIZE:
+            _local.popitem(last=False)
+
+
+def signed_url(public_id, resource_type):
+    """A signed delivery URL for the asset, valid for at least MIN_REMAINING seconds."""
+    now = time.time()
+    local_key = (resource_type, public_id)
+    with _lock:
+        entry = _local.get(local_key)
+    if _usable(entry, now):
+        return entry[0]
+
+    key = _url_key(public_id, resource_type)
+    try:
+        entry = cache.get(key)
+    except Exception:
+        logger.warning("Failed to read cached signed URL", exc_info=True)
+        entry = None
+
+    if not _usable(entry, now):
+        expires_at = int(math.ceil((now + SIGNED_URL_TTL) / BUCKET_SECONDS) * BUCKET_SECONDS)
+        url, _ = cloudinary.utils.cloudinary_url(
+            public_id,
+            resource_type=resource_type,
+            type="upload",
+            sign_url=True,
+            secure=True,
+            expires_at=expires_at,
+        )
+        entry = (url, expires_at)
+        try:
+            cache.set(key, entry, max(int(expires_at - MIN_REMAINING - now), 1))
+        except Exception:
+            logger.warning("Failed to cache signed URL", exc_info=True)
+
+    _remember_local(local_key, entry)
+    return entry[0]
+
+
+# --- Asset metadata (batch reader prefetch) ---
+
+def _metadata_key(public_id, resource_type):
+    digest = hashlib.sha1(public_id.encode('utf-8')).hexdigest()
+    return f"assetmeta:{resource_type}:{digest}"
+
+
+def _fetch_metadata(asset):
+    public_id, resource_type = asset
+    metadata = {'content_length': None, 'content_type': None}
+    try:
+        response = _metadata_session.head(
+            signed_url(public_id, resource_type), timeout=METADATA_TIMEOUT, allow_redirects=True
+        )
+        response.raise_for_status()
+        length = response.headers.get('Content-Length', '')
+        metadata['content_length'] = int(length) if length.isdigit() else None
+        metadata['content_type'] = response.headers.get('Content-Type', '').split(';')[0].strip() or None
+    except Exception:
+        logger.warning(f"Failed to fetch metadata for asset '{public_id}'", exc_info=True)
+    return metadata
+
+
+def asset_metadata(assets):
+    """
+    {(public_id, resource_type): {'content_length', 'content_type'}} for the given assets.
+
+    Read from the cache, or from parallel HEAD requests for the rest; values
+    that could not be determined are None and are not cached.
+    """
+    assets = list(dict.fromkeys(assets))
+    keys = {asset: _metadata_key(*asset) for asset in assets}
+    try:
+        cached = cache.get_many(list(keys.values()))
+    except Exception:
+        logger.warning("Failed to read cached asset metadata", exc_info=True)
+        cached = {}
+    metadata = {asset: cached[key] for asset, key in keys.items() if key in cached}
+
+    missing = [asset for asset in assets if asset not in metadata]
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(len(missing), METADATA_WORKERS)) as pool:
+            fetched = dict(zip(missing, pool.map(_fetch_metadata, missing)))
+        complete = {keys[asset]: meta for asset, meta in fetched.items() if meta['content_length'] is not None}
+        if complete:
+            try:
+                cache.set_many(complete, ASSET_METADATA_TTL)
+            except Exception:
+                logger.warning("Failed to cache asset metadata", exc_info=True)
+        metadata.update(fetched)
+    return metadata
@@ -0,0 +1,73 @@
+"""
+Denormalized book snapshots (read model for list endpoints).
+
+A snapshot is the shared BookListSerializer output for one book (author name,
+categories, resolved Cloudinary URLs, ...), stored in the cache. List views
+only query ids and counters for the page and assemble the response from
+snapshots, so the author join, the categories prefetch and the per-book URL
+building only happen when a snapshot is (re)built. catalog.signals drops the
+snapshots of books touched by a Book, Author or Category change.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_TTL = getattr(settings, 'BOOK_SNAPSHOT_TTL', 60 * 60 * 24)
+
+# Live values from the page query override these, since counters change constantly.
+COUNTER_FIELDS = ('view_count', 'like_count', 'bookmark_count')
+
+
+def _key(book_id):
+    return f"books:snapshot:v1:{book_id}"
+
+
+def build_snapshots(book_ids):
+    """Serialize and cache snapshots for the given books; returns {book_id: snapshot}."""
+    from .models import Book
+    from .serializers import BookListSerializer
+
+    books = Book.objects.filter(pk__in=list(book_ids)).select_related('author').prefetch_related('categories')
+    snapshots = {item['id']: item for item in BookListSerializer(books, many=True, context={'personalize': False}).data}
+    try:
+        cache.set_many({_key(book_id): snapshot for book_id, snapshot in snapshots.items()}, SNAPSHOT_TTL)
+    except Exception:
+        logger.warning("Failed to cache book snapshots", exc_info=True)
+    return snapshots
+
+
+def get_snapshots(books):
+    """
+    Snapshots for loaded books (only id and counters are read), in the same order.
+    Missing snapshots are built in one batch.
+    """
+    books = list(books)
+    keys = {book.pk: _key(book.pk) for book in books}
+    try:
+        cached = cache.get_many(list(keys.values()))
+    except Exception:
+        logger.warning("Failed to read book snapshots", exc_info=True)
+        cached = {}
+
+    snapshots = {book_id: cached[key] for book_id, key in keys.items() if key in cached}
+    missing = [book_id for book_id in keys if book_id not in snapshots]
+    if missing:
+        snapshots.update(build_snapshots(missing))
+
+    result = []
+    for book in books:
+        snapshot = snapshots.get(book.pk)
+        if snapshot is None:
+            continue
+        result.append({**snapshot, **{field: getattr(book, field) for field in COUNTER_FIELDS}})
+    return result
+
+
+def invalidate_snapshots(book_ids):
+    try:
+        cache.delete_many([_key(book_id) for book_id in book_ids])
+    except Exception:
+        logger.warning("Failed to invalidate book snapshots", exc_info=True)
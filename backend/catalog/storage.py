@@ -2,11 +2,14 @@ import os
 import mimetypes
 from datetime import datetime, timedelta
 from django.conf import settings
-from django.http import HttpResponse, Http404, FileResponse
+from django.http import HttpResponse, Http404, FileResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
 from django.core.files.storage import default_storage 
 from django.core.files.base import ContentFile
 import hashlib
 import hmac
+import secrets
 import base64
 from urllib.parse import quote
 from django.shortcuts import get_object_or_404
@@ -137,6 +140,223 @@ def serve_file_from_orm(book_instance, request, inline=True):
         raise Http404("File not found")
 
 
+# --- Range engine ---
+
+STREAM_CHUNK_SIZE = getattr(settings, 'FILE_STREAM_CHUNK_SIZE', 64 * 1024)
+MAX_RANGES = getattr(settings, 'FILE_STREAM_MAX_RANGES', 16)
+
+
+def parse_range_header(header, size):
+    """
+    Parse a `Range: bytes=...` header against a file of `size` bytes (RFC 7233).
+
+    Returns a sorted list of inclusive (start, end) pairs with overlapping or
+    adjacent ranges merged, [] when no range is satisfiable (416), or None when
+    the header should be ignored and the full file served (unknown unit,
+    malformed, or more than MAX_RANGES ranges).
+    """
+    unit, _, specs = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not specs:
+        return None
+
+    ranges = []
+    for spec in specs.split(','):
+        first, sep, last = spec.strip().partition('-')
+        if not sep or (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+        if not first:
+            if not last:
+                return None
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length == 0 or size == 0:
+                continue
+            ranges.append((max(size - length, 0), size - 1))
+            continue
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(int(last), size - 1) if last else size - 1))
+
+    if len(ranges) > MAX_RANGES:
+        return None
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _if_range_matches(request, etag, last_modified):
+    """True when there is no If-Range, or it still names the current representation."""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        # If-Range needs a strong comparison; weak validators never match.
+        return etag is not None and not if_range.startswith('W/') and if_range == etag
+    if last_modified is None:
+        return False
+    return parse_http_date_safe(if_range) == int(last_modified)
+
+
+class _FileRange:
+    """
+    Read-only view of `length` bytes of a local file, positioned at `start`.
+
+    Served through FileResponse, a WSGI server's file wrapper can sendfile()
+    it: the descriptor is positioned at the range start and Content-Length
+    bounds the copy. Servers without sendfile iterate read(), which stops at
+    the end of the range.
+    """
+
+    def __init__(self, file_handle, start, length):
+        self._file = file_handle
+        self._remaining = length
+        file_handle.seek(start)
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size) if size else b''
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+
+def _is_local_file(file_handle):
+    try:
+        file_handle.fileno()
+        return True
+    except (AttributeError, OSError, ValueError):
+        return False
+
+
+def _read_chunks(file_handle, start, length):
+    file_handle.seek(start)
+    while length > 0:
+        chunk = file_handle.read(min(STREAM_CHUNK_SIZE, length))
+        if not chunk:
+            break
+        length -= len(chunk)
+        yield chunk
+
+
+def _stream_range(file_handle, start, end):
+    try:
+        yield from _read_chunks(file_handle, start, end - start + 1)
+    finally:
+        file_handle.close()
+
+
+def _stream_multipart(file_handle, parts, boundary):
+    try:
+        for header, (start, end) in parts:
+            yield header
+            yield from _read_chunks(file_handle, start, end - start + 1)
+        yield f"\r\n--{boundary}--\r\n".encode()
+    finally:
+        file_handle.close()
+
+
+def ranged_file_response(request, file_handle, file_size, content_type, etag=None, last_modified=None):
+    """
+    Serve a seekable binary file with conditional and Range request support.
+
+    Only STREAM_CHUNK_SIZE bytes are read at a time, whatever the file or
+    range size. `etag` is a quoted strong ETag and `last_modified` a POSIX
+    timestamp; either may be None. Handles If-Match/If-None-Match/
+    If-Modified-Since/If-Unmodified-Since (304/412), If-Range, single, suffix
+    and multiple ranges (multipart/byteranges), and unsatisfiable ranges (416).
+    The caller sets Content-Disposition and caching headers.
+    """
+    validators = HttpResponse()
+    if etag:
+        validators['ETag'] = etag
+    if last_modified is not None:
+        validators['Last-Modified'] = http_date(last_modified)
+    conditional = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified) if last_modified is not None else None,
+        response=validators,
+    )
+    if conditional is not validators:
+        file_handle.close()
+        for header in ('ETag', 'Last-Modified'):
+            if header in validators:
+                conditional[header] = validators[header]
+        return conditional
+
+    ranges = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and request.method in ('GET', 'HEAD') and _if_range_matches(request, etag, last_modified):
+        ranges = parse_range_header(range_header, file_size)
+
+    if ranges is None:
+        # Full file response (FileResponse streams it in blocks)
+        response = FileResponse(file_handle, content_type=content_type)
+        response['Content-Length'] = str(file_size)
+    elif not ranges:
+        file_handle.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{file_size}'
+    elif len(ranges) == 1:
+        start, end = ranges[0]
+        if _is_local_file(file_handle):
+            response = FileResponse(
+                _FileRange(file_handle, start, end - start + 1), status=206, content_type=content_type
+            )
+        else:
+            response = StreamingHttpResponse(
+                _stream_range(file_handle, start, end), status=206, content_type=content_type
+            )
+        response['Content-Range'] = f'bytes {start}-{end}/{file_size}'
+        response['Content-Length'] = str(end - start + 1)
+    else:
+        boundary = secrets.token_hex(16)
+        parts = [
+            (
+                (
+                    f"\r\n--{boundary}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n"
+                ).encode(),
+                (start, end),
+            )
+            for start, end in ranges
+        ]
+        content_length = sum(len(header) + end - start + 1 for header, (start, end) in parts)
+        content_length += len(f"\r\n--{boundary}--\r\n")
+        response = StreamingHttpResponse(
+            _stream_multipart(file_handle, parts, boundary),
+            status=206,
+            content_type=f'multipart/byteranges; boundary={boundary}',
+        )
+        response['Content-Length'] = str(content_length)
+
+    response['Accept-Ranges'] = 'bytes'
+    for header in ('ETag', 'Last-Modified'):
+        if header in validators:
+            response[header] = validators[header]
+    return response
+
+
+def file_validators(book_instance, file_field, file_size):
+    """(ETag, Last-Modified timestamp) for a book's file, without reading it."""
+    modified = book_instance.updated_at
+    fingerprint = f"{file_field.name}:{file_size}:{modified.isoformat() if modified else ''}"
+    etag = f'"{hashlib.sha256(fingerprint.encode()).hexdigest()[:32]}"'
+    return etag, modified.timestamp() if modified else None
+
+
 def serve_file_stream(book_instance, request):
     """
     Serve file with range support for streaming, based on Django's FileField.
@@ -153,37 +373,13 @@ def serve_file_stream(book_instance, request):
         
         filename = os.path.basename(file_field.name)
         content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        etag, last_modified = file_validators(book_instance, file_field, file_size)
         
-        # Handle range requests
-        range_header = request.META.get('HTTP_RANGE')
-        if range_header:
-            range_match = range_header.replace('bytes=', '').split('-')
-            start = int(range_match[0]) if range_match[0] else 0
-            end = int(range_match[1]) if range_match[1] else file_size - 1
-            
-            if start >= file_size or end >= file_size:
-                return HttpResponse(status=416)
-            
-            content_length = end - start + 1
-            file_handle.seek(start)
-            content = file_handle.read(content_length)
-            
-            response = HttpResponse(
-                content,
-                status=206,
-                content_type=content_type
-            )
-            response['Content-Range'] = f'bytes {start}-{end}/{file_size}'
-            response['Content-Length'] = str(content_length)
-        else:
-            # Full file response
-            response = FileResponse(
-                file_handle,
-                content_type=content_type
-            )
-            response['Content-Length'] = str(file_size)
+        response = ranged_file_response(
+            request, file_handle, file_size, content_type,
+            etag=etag, last_modified=last_modified,
+        )
         
-        response['Accept-Ranges'] = 'bytes'
         response['Content-Disposition'] = f'inline; filename="{quote(filename)}"'
         response['Cache-Control'] = 'private, max-age=3600'
         response['X-Accel-Buffering'] = 'no'
@@ -192,4 +388,4 @@ def serve_file_stream(book_instance, request):
     except Exception as e:
         # Log the error (optional)
         print(f"Error streaming file: {e}")
-        raise Http404("File not found")
\ No newline at end of file
+        raise Http404("File not found")
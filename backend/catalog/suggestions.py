@@ -0,0 +1,377 @@
+"""
+In-memory prefix index for search suggestions.
+
+Every published book contributes a title entry, and its author and tags feed
+aggregated author/tag entries weighted by view_count. Each entry is indexed
+under every word-start suffix of its normalized text ("the great gatsby",
+"great gatsby", "gatsby") in one sorted array, so a suggestion lookup is a
+bisect plus a range scan, without touching Postgres. Short prefixes match a
+large share of the keys, so their ranked results are computed when the index
+is built and recomputed only after a change touches them.
+
+The index is built from a row snapshot shared through the cache (or from one
+query), patched in place by catalog.signals in the writing process, and
+synced by other processes when the catalog generation changes (see
+catalog.caching): books updated since the last sync, plus a short log of
+deleted ids kept in the cache. A periodic full rebuild refreshes view_count
+weights, which counter flushes change without a catalog write. Builds and
+syncs run on a background thread; requests keep answering from the current
+index meanwhile (and get no suggestions until the first build finishes).
+"""
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .caching import catalog_generation
+
+logger = logging.getLogger(__name__)
+
+CHECK_INTERVAL = getattr(settings, 'SUGGESTION_CHECK_INTERVAL', 5)
+REBUILD_INTERVAL = getattr(settings, 'SUGGESTION_REBUILD_INTERVAL', 60 * 15)
+
+MAX_BOOK_SUGGESTIONS = 10
+MAX_TAG_SUGGESTIONS = 5
+MAX_KEY_WORDS = 12  # longer titles are only indexed from their first words
+RANKED_PREFIX_LENGTHS = (2, 3)  # shorter queries are not served; longer ones scan few keys
+MAX_DELETED_LOG = 1000  # more deletions than this between syncs trigger a rebuild
+RECENT_QUERIES = 2048  # memoized rankings for longer prefixes, dropped on any change
+
+_ROW_FIELDS = ('id', 'title', 'author_id', 'author__name', 'tags', 'view_count')
+
+_DELETED_SEQ_KEY = 'suggest:deleted:seq'
+
+
+def normalize(text):
+    return ' '.join(str(text).casefold().split())
+
+
+def _tags(value):
+    # tags are stored as JSON lists; handle string fallback defensively.
+    if isinstance(value, list):
+        candidates = [str(t).strip() for t in value]
+    elif value:
+        candidates = [t.strip() for t in str(value).split(',')]
+    else:
+        candidates = []
+    return tuple(dict.fromkeys(t for t in candidates if t))
+
+
+def _keys(text):
+    words = normalize(text).split(' ')[:MAX_KEY_WORDS]
+    return {' '.join(words[i:]) for i in range(len(words)) if words[i]}
+
+
+class SuggestionIndex:
+    def __init__(self, generation=None):
+        self.generation = generation
+        self._lock = threading.RLock()
+        self._keys = []       # sorted [(key, entry_id)]
+        self._entries = {}    # entry_id -> {'text': str, 'books': {book_id: view_count}, 'weight': int}
+        self._books = {}      # book_id -> (title, author_id, author, tags, view_count)
+        self._authors = {}    # author_id -> name
+        self._ranked = {}     # short prefix -> ranked entry ids
+        self._recent = OrderedDict()  # longer prefix -> ranked entry ids
+        self._loading = None  # keys collected by load(), sorted once at the end
+
+    def __len__(self):
+        return len(self._books)
+
+    def book_ids(self):
+        return set(self._books)
+
+    def author_name(self, author_id):
+        return self._authors.get(author_id)
+
+    # --- Maintenance ---
+
+    def _invalidate_ranked(self, text):
+        if self._loading is not None:
+            return
+        self._recent.clear()
+        for key in _keys(text):
+            for length in RANKED_PREFIX_LENGTHS:
+                self._ranked.pop(key[:length], None)
+
+    def _link(self, entry_id, text, book_id, view_count):
+        entry = self._entries.get(entry_id)
+        if entry is None:
+            entry = self._entries[entry_id] = {'text': text, 'books': {}, 'weight': 0}
+            for key in _keys(text):
+                if self._loading is not None:
+                    self._loading.append((key, entry_id))
+                else:
+                    insort(self._keys, (key, entry_id))
+        entry['weight'] += view_count - entry['books'].get(book_id, 0)
+        entry['books'][book_id] = view_count
+        self._invalidate_ranked(entry['text'])
+
+    def _unlink(self, entry_id, book_id):
+        entry = self._entries.get(entry_id)
+        if entry is None:
+            return
+        entry['weight'] -= entry['books'].pop(book_id, 0)
+        self._invalidate_ranked(entry['text'])
+        if entry['books']:
+            return
+        for key in _keys(entry['text']):
+            i = bisect_left(self._keys, (key, entry_id))
+            if i < len(self._keys) and self._keys[i] == (key, entry_id):
+                del self._keys[i]
+        del self._entries[entry_id]
+
+    def remove_book(self, book_id):
+        with self._lock:
+            book = self._books.pop(book_id, None)
+            if book is None:
+                return
+            title, _, author, tags, _ = book
+            self._unlink(('title', book_id), book_id)
+            if author:
+                self._unlink(('author', normalize(author)), book_id)
+            for tag in tags:
+                self._unlink(('tag', normalize(tag)), book_id)
+
+    def upsert_book(self, book_id, title, author_id, author, tags, view_count, is_published=True):
+        with self._lock:
+            self.remove_book(book_id)
+            if author:
+                self._authors[author_id] = author
+            if not is_published:
+                return
+            tags = _tags(tags)
+            view_count = view_count or 0
+            self._books[book_id] = (title, author_id, author, tags, view_count)
+            if title:
+                self._link(('title', book_id), title, book_id, view_count)
+            if author:
+                self._link(('author', normalize(author)), author, book_id, view_count)
+            for tag in tags:
+                self._link(('tag', normalize(tag)), tag, book_id, view_count)
+
+    def load(self, rows):
+        """Fill an empty index from _ROW_FIELDS rows, sorting keys and ranking short prefixes once."""
+        with self._lock:
+            self._loading = []
+            try:
+                for row in rows:
+                    self.upsert_book(*row)
+                self._keys = sorted(self._loading)
+            finally:
+                self._loading = None
+            self._rank_short_prefixes()
+
+    def _rank_short_prefixes(self):
+        # Keys are sorted, so each prefix's keys form one contiguous run.
+        weights = {entry_id: entry['weight'] for entry_id, entry in self._entries.items()}
+        ranked = {}
+        for length in RANKED_PREFIX_LENGTHS:
+            runs = groupby((item for item in self._keys if len(item[0]) >= length), key=lambda item: item[0][:length])
+            for prefix, run in runs:
+                ranked[prefix] = self._rank({entry_id for _, entry_id in run}, weights.__getitem__)
+        self._ranked = ranked
+
+    # --- Lookup ---
+
+    def _scan(self, prefix):
+        matched = set()
+        i = bisect_left(self._keys, (prefix,))
+        while i < len(self._keys) and self._keys[i][0].startswith(prefix):
+            matched.add(self._keys[i][1])
+            i += 1
+        return matched
+
+    def _rank(self, matched, weight=None):
+        if weight is None:
+            def weight(entry_id):
+                return self._entries[entry_id]['weight']
+
+        book_entries = heapq.nlargest(MAX_BOOK_SUGGESTIONS, (e for e in matched if e[0] != 'tag'), key=weight)
+        tag_entries = heapq.nlargest(MAX_TAG_SUGGESTIONS, (e for e in matched if e[0] == 'tag'), key=weight)
+        return book_entries + tag_entries
+
+    def suggest(self, query):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        with self._lock:
+            if len(prefix) in RANKED_PREFIX_LENGTHS:
+                ranked = self._ranked.get(prefix)
+                if ranked is None:
+                    ranked = self._ranked[prefix] = self._rank(self._scan(prefix))
+            else:
+                ranked = self._recent.get(prefix)
+                if ranked is None:
+                    ranked = self._recent[prefix] = self._rank(self._scan(prefix))
+                    if len(self._recent) > RECENT_QUERIES:
+                        self._recent.popitem(last=False)
+                else:
+                    self._recent.move_to_end(prefix)
+
+            suggestions = []
+            for entry_id in ranked:
+                entry = self._entries[entry_id]
+                if entry_id[0] == 'tag':
+                    suggestions.append({'type': 'tag', 'text': entry['text']})
+                    continue
+                # Authors point at their most viewed book.
+                book_id = max(entry['books'], key=entry['books'].get)
+                suggestions.append({'type': entry_id[0], 'text': entry['text'], 'book_id': str(book_id)})
+            return suggestions[:MAX_BOOK_SUGGESTIONS]
+
+
+# --- Process-wide index ---
+
+_index = None
+_refresh_lock = threading.Lock()
+_state = {'synced_at': None, 'checked': None, 'built': 0.0, 'deleted_seq': 0}
+
+
+def _rows_cache_key(generation):
+    return f"suggest:rows:v2:g{generation}"
+
+
+def _deleted_key(seq):
+    return f"suggest:deleted:{seq}"
+
+
+def _deleted_seq():
+    return cache.get(_DELETED_SEQ_KEY) or 0
+
+
+def _load_rows(generation):
+    """(built_at, rows) for the given generation, from the cache when another process built it."""
+    from .models import Book
+
+    key = _rows_cache_key(generation) if generation is not None else None
+    if key:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    built_at = timezone.now()
+    rows = list(Book.objects.filter(is_published=True).values_list(*_ROW_FIELDS))
+    if key:
+        try:
+            cache.set(key, (built_at, rows), REBUILD_INTERVAL)
+        except Exception:
+            logger.warning("Failed to cache suggestion rows", exc_info=True)
+    return built_at, rows
+
+
+def _build(generation):
+    deleted_seq = _deleted_seq()
+    built_at, rows = _load_rows(generation)
+    index = SuggestionIndex(generation)
+    index.load(rows)
+    _state.update(synced_at=built_at, built=time.monotonic(), deleted_seq=deleted_seq)
+    return index
+
+
+def _sync(index, generation):
+    """Apply catalog changes since the last sync. Returns False when a full rebuild is needed instead."""
+    from .models import Book
+
+    deleted_seq = _deleted_seq()
+    if deleted_seq - _state['deleted_seq'] > MAX_DELETED_LOG:
+        return False
+    started_at = timezone.now()
+    since = _state['synced_at'] - timedelta(seconds=2)  # tolerate clock skew between workers
+    changed = Book.objects.filter(Q(updated_at__gte=since) | Q(author__updated_at__gte=since))
+    for row in changed.values_list(*_ROW_FIELDS, 'is_published'):
+        index.upsert_book(*row)
+
+    deleted = cache.get_many([_deleted_key(seq) for seq in range(_state['deleted_seq'] + 1, deleted_seq + 1)])
+    for book_id in deleted.values():
+        index.remove_book(book_id)
+
+    index.generation = generation
+    _state.update(synced_at=started_at, deleted_seq=deleted_seq)
+    return True
+
+
+def _refresh():
+    global _index
+    try:
+        generation = catalog_generation()
+        if _index is None or time.monotonic() - _state['built'] > REBUILD_INTERVAL:
+            _index = _build(generation)
+        elif generation != _index.generation and not _sync(_index, generation):
+            _index = _build(generation)
+    except Exception:
+        logger.warning("Suggestion index refresh failed; serving the previous index", exc_info=True)
+    finally:
+        connection.close()
+        _refresh_lock.release()
+
+
+def get_index():
+    """The current index, or None before the first build; builds and syncs run in the background."""
+    now = time.monotonic()
+    checked = _state['checked']
+    if checked is None or now - checked >= CHECK_INTERVAL:
+        # Only one refresh at a time; requests never wait for it.
+        if _refresh_lock.acquire(blocking=False):
+            _state['checked'] = now
+            try:
+                threading.Thread(target=_refresh, name='suggestion-index-refresh', daemon=True).start()
+            except Exception:
+                _refresh_lock.release()
+                raise
+    return _index
+
+
+def suggest(query):
+    index = get_index()
+    return index.suggest(query) if index is not None else []
+
+
+# --- Local incremental updates (catalog.signals) ---
+
+def book_changed(book):
+    from .models import Author, Book
+
+    if _index is None:
+        return
+    # The index remembers author names, so saving a book does not load its author.
+    author = _index.author_name(book.author_id)
+    if author is None:
+        if Book.author.is_cached(book):
+            author = book.author.name
+        else:
+            author = Author.objects.filter(pk=book.author_id).values_list('name', flat=True).first()
+    _index.upsert_book(book.pk, book.title, book.author_id, author, book.tags, book.view_count, book.is_published)
+
+
+def book_deleted(book_id):
+    if _index is not None:
+        _index.remove_book(book_id)
+    # Other processes learn about deletions from this log (see _sync).
+    try:
+        try:
+            seq = cache.incr(_DELETED_SEQ_KEY)
+        except ValueError:
+            cache.add(_DELETED_SEQ_KEY, 0, None)
+            seq = cache.incr(_DELETED_SEQ_KEY)
+        cache.set(_deleted_key(seq), book_id, REBUILD_INTERVAL * 2)
+    except Exception:
+        logger.warning(f"Failed to log deleted book {book_id} for suggestions", exc_info=True)
+
+
+def author_changed(author_id):
+    from .models import Book
+
+    if _index is None:
+        return
+    rows = Book.objects.filter(author_id=author_id).values_list(*_ROW_FIELDS, 'is_published')
+    for row in rows:
+        _index.upsert_book(*row)
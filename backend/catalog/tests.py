@@ -0,0 +1,438 @@
+import io
+import os
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import models
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from accounts.models import User
+
+from . import counters, file_cache, signals, signed_urls, views
+from .caching import PAYLOAD_ATTNAMES, save_touches
+from .models import Book
+from .storage import parse_range_header, ranged_file_response
+from .suggestions import SuggestionIndex
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'catalog-tests'}}
+
+
+class FakeCursor:
+    """Stands in for the counter UPDATE: applies deltas to `rows` and returns them."""
+
+    def __init__(self, rows, fail=False):
+        self.rows = rows
+        self.fail = fail
+        self.statements = []
+        self._result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, sql, params):
+        if self.fail:
+            raise RuntimeError("database unavailable")
+        self.statements.append(sql)
+        self._result = []
+        for i in range(0, len(params), 4):
+            book_id, *deltas = params[i:i + 4]
+            values = self.rows.setdefault(book_id, [0, 0, 0])
+            for n, delta in enumerate(deltas):
+                values[n] = max(values[n] + delta, 0)
+            self._result.append((book_id, *values))
+
+    def fetchall(self):
+        return self._result
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CounterBufferTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.store = counters.LocalCounterStore()
+        for target, value in (('get_store', lambda: self.store), ('_ensure_flusher', lambda: None)):
+            patcher = mock.patch.object(counters, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.db = {1: [10, 2, 1]}
+
+    def flush(self, fail=False):
+        cursor = FakeCursor(self.db, fail=fail)
+        with mock.patch.object(counters, 'connection') as connection:
+            connection.cursor.return_value = cursor
+            return counters.flush(), cursor
+
+    def payload(self):
+        # Serialized book as cached by the list/detail views before any flush
+        return {'id': 1, 'title': 'Dune', 'view_count': 10, 'like_count': 2, 'bookmark_count': 1}
+
+    def test_incr_buffers_without_touching_the_database(self):
+        with mock.patch.object(counters, 'connection') as connection:
+            counters.incr(1, 'view_count')
+            counters.incr(1, 'view_count')
+            counters.incr(1, 'like_count', -1)
+        connection.cursor.assert_not_called()
+        self.assertEqual(counters.pending([1, 2]), {1: {'view_count': 2, 'like_count': -1}})
+
+    def test_incr_rejects_unknown_fields(self):
+        with self.assertRaises(ValueError):
+            counters.incr(1, 'read_count')
+
+    def test_reads_add_pending_deltas(self):
+        counters.incr(1, 'view_count', 3)
+        counters.incr(1, 'like_count', -5)
+        self.assertEqual(counters.current(1, 'view_count', 10), 13)
+        self.assertEqual(counters.current(1, 'like_count', 2), 0)
+
+        item = counters.apply_pending_data([self.payload()])[0]
+        self.assertEqual((item['view_count'], item['like_count'], item['bookmark_count']), (13, 0, 1))
+
+    def test_flush_applies_all_books_in_one_statement(self):
+        counters.incr(1, 'view_count', 3)
+        counters.incr(2, 'bookmark_count')
+
+        flushed, cursor = self.flush()
+
+        self.assertEqual(flushed, 2)
+        self.assertEqual(len(cursor.statements), 1)
+        self.assertEqual(self.db, {1: [13, 2, 1], 2: [0, 0, 1]})
+        self.assertEqual(counters.pending([1, 2]), {})
+
+    def test_failed_flush_keeps_deltas(self):
+        counters.incr(1, 'view_count', 3)
+
+        with self.assertRaises(RuntimeError):
+            self.flush(fail=True)
+
+        self.assertEqual(counters.pending([1]), {1: {'view_count': 3}})
+
+    def test_cached_payload_stays_current_after_flush(self):
+        counters.incr(1, 'view_count', 3)
+        counters.incr(1, 'like_count')
+        before = counters.apply_pending_data([self.payload()])[0]
+
+        self.flush()
+        after = counters.apply_pending_data([self.payload()])[0]
+
+        self.assertEqual(after, before)
+        self.assertEqual((after['view_count'], after['like_count']), (13, 3))
+
+        counters.incr(1, 'view_count')
+        self.assertEqual(counters.apply_pending_data([self.payload()])[0]['view_count'], 14)
+
+
+class SuggestionIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = SuggestionIndex()
+        self.index.load([
+            (1, 'The Great Gatsby', 10, 'F. Scott Fitzgerald', ['classic', 'jazz age'], 500),
+            (2, 'The Grapes of Wrath', 11, 'John Steinbeck', ['classic'], 900),
+            (3, 'Tender Is the Night', 10, 'F. Scott Fitzgerald', [], 50),
+        ])
+
+    def texts(self, query):
+        return [(s['type'], s['text']) for s in self.index.suggest(query)]
+
+    def test_matches_word_starts_ranked_by_views(self):
+        self.assertEqual(self.texts('gr'), [('title', 'The Grapes of Wrath'), ('title', 'The Great Gatsby')])
+        self.assertEqual(self.texts('the g'), [('title', 'The Grapes of Wrath'), ('title', 'The Great Gatsby')])
+        self.assertEqual(self.texts('  NIGHT'), [('title', 'Tender Is the Night')])
+        self.assertEqual(self.texts('xyz'), [])
+
+    def test_authors_aggregate_views_and_point_at_top_book(self):
+        suggestions = self.index.suggest('scott')
+        self.assertEqual(suggestions, [{'type': 'author', 'text': 'F. Scott Fitzgerald', 'book_id': '1'}])
+        self.assertEqual(self.index.suggest('f.')[0]['type'], 'author')
+
+    def test_tags_follow_books(self):
+        self.assertEqual(self.texts('cl'), [('tag', 'classic')])
+        self.assertEqual(self.texts('jazz'), [('tag', 'jazz age')])
+
+    def test_upsert_updates_precomputed_short_prefixes(self):
+        self.assertEqual(self.texts('gr')[0], ('title', 'The Grapes of Wrath'))
+        self.index.upsert_book(1, 'The Great Gatsby', 10, 'F. Scott Fitzgerald', ['classic'], 2000)
+        self.assertEqual(self.texts('gr')[0], ('title', 'The Great Gatsby'))
+        self.assertEqual(self.texts('jazz'), [])
+
+        self.index.upsert_book(4, 'Great Expectations', 12, 'Charles Dickens', [], 0)
+        self.assertIn(('title', 'Great Expectations'), self.texts('gre'))
+        self.assertEqual(self.index.author_name(12), 'Charles Dickens')
+
+    def test_upsert_refreshes_memoized_long_prefixes(self):
+        self.assertEqual(self.texts('the gra'), [('title', 'The Grapes of Wrath')])
+        self.index.upsert_book(4, 'The Grand Design', 12, 'Stephen Hawking', [], 0)
+        self.assertEqual(self.texts('the gra'), [('title', 'The Grapes of Wrath'), ('title', 'The Grand Design')])
+
+    def test_unpublished_and_removed_books_drop_out(self):
+        self.index.upsert_book(2, 'The Grapes of Wrath', 11, 'John Steinbeck', ['classic'], 900, is_published=False)
+        self.assertEqual(self.texts('grapes'), [])
+        self.assertEqual(self.texts('steinbeck'), [])
+
+        self.index.remove_book(1)
+        self.assertEqual(self.texts('cl'), [])
+        self.assertEqual(self.index.suggest('scott')[0]['book_id'], '3')
+        self.assertEqual(self.index.book_ids(), {3})
+
+
+class RangeHeaderTests(SimpleTestCase):
+    def test_single_and_suffix_ranges(self):
+        self.assertEqual(parse_range_header('bytes=0-99', 1000), [(0, 99)])
+        self.assertEqual(parse_range_header('bytes=900-', 1000), [(900, 999)])
+        self.assertEqual(parse_range_header('bytes=-100', 1000), [(900, 999)])
+        self.assertEqual(parse_range_header('bytes=-5000', 1000), [(0, 999)])
+        self.assertEqual(parse_range_header('bytes=990-2000', 1000), [(990, 999)])
+
+    def test_multiple_ranges_are_sorted_and_merged(self):
+        self.assertEqual(parse_range_header('bytes=500-599, 0-99, 100-199, 550-650', 1000), [(0, 199), (500, 650)])
+
+    def test_unsatisfiable_ranges(self):
+        self.assertEqual(parse_range_header('bytes=1000-', 1000), [])
+        self.assertEqual(parse_range_header('bytes=-0', 1000), [])
+        self.assertEqual(parse_range_header('bytes=0-', 0), [])
+        self.assertEqual(parse_range_header('bytes=2000-3000, 5000-', 1000), [])
+
+    def test_ignored_headers_serve_the_full_file(self):
+        for header in ('items=0-9', 'bytes=', 'bytes=abc', 'bytes=5-1', 'bytes=-', 'bytes=0-9,x-1'):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range_header(header, 1000))
+        self.assertIsNone(parse_range_header(','.join(['bytes=0-0'] + ['%d-%d' % (i * 10, i * 10) for i in range(1, 20)]), 1000))
+
+
+class RangedFileResponseTests(SimpleTestCase):
+    data = bytes(range(256)) * 4
+    etag = '"abc"'
+
+    def respond(self, file_handle=None, **headers):
+        request = RequestFactory().get('/books/1/stream/', **headers)
+        return ranged_file_response(
+            request, file_handle or io.BytesIO(self.data), len(self.data), 'application/pdf',
+            etag=self.etag, last_modified=1700000000,
+        )
+
+    def content(self, response):
+        body = b''.join(response.streaming_content)
+        response.close()
+        return body
+
+    def test_full_file_without_range(self):
+        response = self.respond()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(self.content(response), self.data)
+
+    def test_single_range(self):
+        response = self.respond(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(self.content(response), self.data[10:20])
+
+    def test_single_range_from_local_file(self):
+        with tempfile.TemporaryFile() as fh:
+            fh.write(self.data)
+            response = self.respond(fh, HTTP_RANGE='bytes=-24')
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(self.content(response), self.data[-24:])
+
+    def test_multiple_ranges(self):
+        response = self.respond(HTTP_RANGE='bytes=0-1, 100-101')
+        body = self.content(response)
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response['Content-Type'].startswith('multipart/byteranges; boundary='))
+        self.assertEqual(int(response['Content-Length']), len(body))
+        self.assertIn(b'Content-Range: bytes 100-101/1024\r\n\r\n' + self.data[100:102], body)
+
+    def test_unsatisfiable_range(self):
+        response = self.respond(HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_stale_if_range_serves_full_file(self):
+        response = self.respond(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.content(response), self.data)
+
+    def test_matching_if_none_match_is_not_modified(self):
+        response = self.respond(HTTP_IF_NONE_MATCH=self.etag, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], self.etag)
+
+
+class FileCacheEvictionTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        for target, value in (('CACHE_DIR', self.dir.name), ('MAX_BYTES', 250)):
+            patcher = mock.patch.object(file_cache, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write(self, name, size, age):
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'wb') as fh:
+            fh.write(b'x' * size)
+        os.utime(path, (1700000000 - age, 1700000000 - age))
+        return path
+
+    def test_evicts_least_recently_used_but_keeps_lock_files(self):
+        oldest = self.write('a.pdf', 100, age=300)
+        self.write('a.pdf.lock', 0, age=300)
+        self.write('b.pdf', 100, age=200)
+        newest = self.write('c.pdf', 100, age=100)
+
+        file_cache._evict(keep=newest)
+
+        self.assertEqual(sorted(os.listdir(self.dir.name)), ['a.pdf.lock', 'b.pdf', 'c.pdf'])
+        self.assertFalse(os.path.exists(oldest))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class SignedURLTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        signed_urls._local.clear()
+        patcher = mock.patch.object(
+            signed_urls.cloudinary.utils, 'cloudinary_url',
+            side_effect=lambda public_id, expires_at, **options: (f'https://cdn/{public_id}?e={expires_at}', {}),
+        )
+        self.cloudinary_url = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_url_is_reused_while_enough_lifetime_remains(self):
+        with mock.patch.object(signed_urls.time, 'time', return_value=1_700_000_000):
+            first = signed_urls.signed_url('books/a.pdf', 'image')
+        expires_at = int(first.rsplit('=', 1)[1])
+        self.assertEqual(expires_at % signed_urls.BUCKET_SECONDS, 0)
+        self.assertGreaterEqual(expires_at - 1_700_000_000, signed_urls.SIGNED_URL_TTL)
+
+        signed_urls._local.clear()  # another process, same cache
+        with mock.patch.object(signed_urls.time, 'time', return_value=expires_at - signed_urls.MIN_REMAINING - 1):
+            self.assertEqual(signed_urls.signed_url('books/a.pdf', 'image'), first)
+        self.cloudinary_url.assert_called_once()
+
+        with mock.patch.object(signed_urls.time, 'time', return_value=expires_at - signed_urls.MIN_REMAINING + 1):
+            self.assertNotEqual(signed_urls.signed_url('books/a.pdf', 'image'), first)
+
+    def test_book_file_info_is_cached_until_invalidated(self):
+        with mock.patch.object(Book, 'objects') as objects:
+            rows = objects.filter.return_value.values_list
+            rows.return_value = [(1, 'books/a.pdf', 'PDF')]
+            self.assertEqual(signed_urls.book_file_info(1), ('books/a.pdf', 'PDF'))
+            self.assertEqual(signed_urls.book_file_infos([1]), {1: ('books/a.pdf', 'PDF')})
+            self.assertEqual(rows.call_count, 1)
+
+            # A command rewrote the public_id with QuerySet.update()
+            rows.return_value = [(1, 'books/b.pdf', 'PDF')]
+            signed_urls.invalidate_books([1])
+            self.assertEqual(signed_urls.book_file_info(1), ('books/b.pdf', 'PDF'))
+            self.assertEqual(rows.call_count, 2)
+
+
+class ReadBatchTests(SimpleTestCase):
+    def post(self, book_ids):
+        request = APIRequestFactory().post('/catalog/books/read/batch/', {'book_ids': book_ids}, format='json')
+        force_authenticate(request, user=User(email='reader@example.com', name='Reader'))
+        return views.book_read_batch(request)
+
+    def test_rejects_non_integer_ids(self):
+        for book_ids in ([True], [1.0], [1.5], ['1'], [None], [], 'abc'):
+            with self.subTest(book_ids=book_ids):
+                self.assertEqual(self.post(book_ids).status_code, 400)
+
+    def test_returns_urls_and_unavailable_ids(self):
+        infos = {1: ('books/a.pdf', 'PDF'), 2: (None, 'PDF')}
+        metadata = {('books/a.pdf', 'image'): {'content_length': 10, 'content_type': None}}
+        with mock.patch.object(signed_urls, 'book_file_infos', return_value=infos), \
+                mock.patch.object(signed_urls, 'asset_metadata', return_value=metadata), \
+                mock.patch.object(signed_urls, 'signed_url', return_value='https://cdn/a.pdf'):
+            response = self.post([1, 2, 1, 3])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [{
+            'book_id': 1, 'url': 'https://cdn/a.pdf', 'content_length': 10, 'content_type': 'application/pdf',
+        }])
+        self.assertEqual(response.data['unavailable'], [2, 3])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class AssetMetadataTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(signed_urls, 'signed_url', return_value='https://res.cloudinary.com/a.pdf')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_head_requests_are_not_retried(self):
+        adapter = signed_urls._metadata_session.get_adapter('https://res.cloudinary.com/')
+        self.assertEqual(adapter.max_retries.total, 0)
+
+    def test_failed_head_is_reported_as_unknown_and_not_cached(self):
+        asset = ('books/a.pdf', 'image')
+        with mock.patch.object(signed_urls._metadata_session, 'head', side_effect=ConnectionError) as head:
+            self.assertEqual(signed_urls.asset_metadata([asset]), {asset: {'content_length': None, 'content_type': None}})
+        self.assertEqual(head.call_args.kwargs['timeout'], signed_urls.METADATA_TIMEOUT)
+
+        response = mock.Mock(headers={'Content-Length': '42', 'Content-Type': 'application/pdf; charset=binary'})
+        with mock.patch.object(signed_urls._metadata_session, 'head', return_value=response) as head:
+            signed_urls.asset_metadata([asset])
+            self.assertEqual(signed_urls.asset_metadata([asset]), {asset: {'content_length': 42, 'content_type': 'application/pdf'}})
+        head.assert_called_once()
+
+
+class BookChangeTrackingTests(SimpleTestCase):
+    def setUp(self):
+        for target in ('bump_catalog_generation', 'invalidate_snapshots', 'refresh_search_index'):
+            patcher = mock.patch.object(signals, target)
+            setattr(self, target, patcher.start())
+            self.addCleanup(patcher.stop)
+        self.book = Book.from_db(
+            'default', ['id', 'title', 'tags', 'view_count', 'embedding_hash', 'file', 'file_url'],
+            [1, 'Dune', ['sf'], 3, None, '', None],
+        )
+
+    def save(self, **kwargs):
+        # Model.save stands in for the database write; post_save is sent by hand.
+        with mock.patch.object(models.Model, 'save'):
+            self.book.save(**kwargs)
+        for receiver in (signals.update_book_search_index, signals.invalidate_saved_book_cache):
+            receiver(sender=Book, instance=self.book, created=False, update_fields=kwargs.get('update_fields'))
+
+    def test_embedding_only_save_keeps_cached_payloads(self):
+        self.book.embedding_hash = 'abc'
+        self.save()
+        self.bump_catalog_generation.assert_not_called()
+        self.invalidate_snapshots.assert_not_called()
+        self.refresh_search_index.assert_not_called()
+
+    def test_payload_change_invalidates_without_reindexing(self):
+        self.book.view_count = 4
+        self.save()
+        self.bump_catalog_generation.assert_called_once()
+        self.invalidate_snapshots.assert_called_once_with([1])
+        self.refresh_search_index.assert_not_called()
+
+    def test_searchable_change_invalidates_and_reindexes(self):
+        self.book.tags.append('classic')  # mutated in place
+        self.save()
+        self.bump_catalog_generation.assert_called_once()
+        self.refresh_search_index.assert_called_once()
+
+    def test_snapshot_is_retaken_after_save(self):
+        self.book.title = 'Dune Messiah'
+        self.save()
+        self.bump_catalog_generation.reset_mock()
+        self.save()
+        self.bump_catalog_generation.assert_not_called()
+
+    def test_update_fields_and_unknown_state(self):
+        self.assertFalse(save_touches(Book(id=2), PAYLOAD_ATTNAMES, update_fields=['embedding_vector', 'embedding_hash']))
+        self.assertTrue(save_touches(Book(id=2), PAYLOAD_ATTNAMES, update_fields=['author']))
+        self.assertTrue(save_touches(Book(id=2), PAYLOAD_ATTNAMES))
+        self.assertTrue(save_touches(self.book, PAYLOAD_ATTNAMES, created=True))
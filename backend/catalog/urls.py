@@ -16,6 +16,7 @@ urlpatterns = [
     path('books/<int:book_id>/cover/', views.book_cover, name='book-cover'),
     path('books/<int:book_id>/read/stream/', views.book_read_stream, name='book-read-stream'),
     path('books/<int:book_id>/read/token/', views.book_read_token, name='book-read-token'),
+    path('books/read/batch/', views.book_read_batch, name='book-read-batch'),
     path('books/<int:book_id>/like/', views.toggle_like, name='book-like'),
     path('books/<int:book_id>/bookmark/', views.toggle_bookmark, name='book-bookmark'),
     path('search/suggestions/', views.search_suggestions, name='search-suggestions'),
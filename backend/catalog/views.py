@@ -1,12 +1,6 @@
 import os
 import logging 
-import re
-import cloudinary 
-import requests
-from requests.adapters import HTTPAdapter, Retry
-import time
 from urllib.parse import urlparse
-from django.utils import timezone
 from django.shortcuts import get_object_or_404, render   
 from rest_framework import generics, status, filters, viewsets
 from rest_framework.decorators import api_view, permission_classes
@@ -14,10 +8,9 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.http import Http404, HttpResponse
-from django.db.models import Q, Max, F, Prefetch
-from django.db import models 
-from django.db.models.functions import Cast
-from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank
+from django.db.models import Q, Max, F, Subquery
+from django.db import IntegrityError, models, transaction
+from django.contrib.postgres.search import SearchQuery, SearchRank
 from django.views.decorators.cache import cache_page
 from django.utils.decorators import method_decorator
 from django.core.cache import cache
@@ -32,26 +25,22 @@ from .serializers import (
 )
 from accounts.permissions import IsAdminRole
 from rest_framework.parsers import MultiPartParser, FormParser
-from analytics.models import BookView
-
-from .ai_utils import get_embedding
+from analytics.events import record_book_view
+
+from . import counters, signed_urls, suggestions
+from .caching import BOOK_LIST_CACHE_TTL, book_detail_cache_key, book_list_cache_key
+from .personalization import personalize
+from .snapshots import COUNTER_FIELDS as SNAPSHOT_COUNTER_FIELDS, get_snapshots
+from .embedding_cache import get_query_embedding
+from .search import (
+    PrefetchedPage, ann_params_from_query, ann_search_settings,
+    hybrid_search, keyword_match, keyword_rank,
+)
 from pgvector.django import CosineDistance
-from .models import Book
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
-# Shared HTTP session for Cloudinary downloads with retry on transient failures
-cloudinary_session = requests.Session()
-retry_config = Retry(
-    total=3,
-    backoff_factor=1,
-    allowed_methods=frozenset(['GET']),
-    status_forcelist=[500, 502, 503, 504],
-    raise_on_status=False,
-)
-cloudinary_session.mount('https://', HTTPAdapter(max_retries=retry_config))
-
 # --- CATEGORY VIEWS ---
 @method_decorator(cache_page(60 * 15), name='dispatch')  # Cache for 15 minutes
 class CategoryListView(generics.ListAPIView):
@@ -77,6 +66,9 @@ class BookViewSet(viewsets.ModelViewSet):
     ordering_fields = ['created_at', 'view_count', 'like_count', 'title']
     ordering = ['-created_at']
 
+    # Set by get_queryset when an empty lexical result should retry semantically.
+    _semantic_fallback_query = None
+
     def _is_semantic_mode(self, request):
         mode = (
             request.query_params.get('mode')
@@ -85,37 +77,27 @@ class BookViewSet(viewsets.ModelViewSet):
         ).strip().lower()
         return mode in {'semantic', 'vector', 'ai'}
 
-    def _searchable_clauses(self, text):
-        return (
-            Q(title__icontains=text)
-            | Q(author__name__icontains=text)
-            | Q(description__icontains=text)
-            | Q(tags__icontains=text)
-            | Q(ai_summary__icontains=text)
-            | Q(ai_tags__icontains=text)
-        )
+    def _is_hybrid_mode(self, request):
+        mode = (
+            request.query_params.get('mode')
+            or request.query_params.get('search_mode')
+            or ''
+        ).strip().lower()
+        return mode == 'hybrid'
 
     def _keyword_filter(self, qs, query):
-        normalized_query = " ".join(query.split())
-        terms = [term for term in re.split(r"\s+", normalized_query) if term]
-        if not terms:
+        # Trigram-indexed substring match (see catalog.search); the author join is
+        # many-to-one, so no .distinct() is needed.
+        match = keyword_match(query)
+        if match is None:
             return qs.none()
-
-        # Match the full phrase OR require every token to appear in searchable fields.
-        all_terms_clause = Q()
-        for term in terms:
-            all_terms_clause &= self._searchable_clauses(term)
-
-        return qs.filter(
-            self._searchable_clauses(normalized_query) | all_terms_clause
-        ).distinct()
+        return qs.filter(match).annotate(keyword_rank=keyword_rank(query))
 
     def _semantic_filter(self, qs, query, strict=False):
-        query_vector = get_embedding(query)
+        query_vector = get_query_embedding(query)
         scored_qs = (
             qs.filter(embedding_vector__isnull=False)
             .annotate(distance=CosineDistance('embedding_vector', query_vector))
-            .order_by('distance')
         )
 
         # Relevance controls:
@@ -124,44 +106,54 @@ class BookViewSet(viewsets.ModelViewSet):
         max_distance = 0.48 if strict else 0.62
         top_k = 12
 
-        filtered_qs = scored_qs.filter(distance__lte=max_distance)
-        candidate_ids = list(filtered_qs.values_list('id', flat=True)[:top_k])
+        # Top-k candidates come from an ORDER BY distance LIMIT k subquery, which the
+        # HNSW index answers directly; the outer query stays filterable/paginatable,
+        # so the whole search is a single statement.
+        nearest = scored_qs.order_by('distance')
 
-        # In strict fallback mode, never return weak matches.
-        if strict and not candidate_ids:
-            return scored_qs.filter(pk__in=[])
+        if strict:
+            # In strict fallback mode, never return weak matches.
+            candidates = nearest.filter(distance__lte=max_distance)
+            return scored_qs.filter(pk__in=Subquery(candidates.values('id')[:top_k])).order_by('distance')
 
         # In explicit semantic mode, keep behavior broad if no strong matches.
-        if not strict and not candidate_ids:
-            candidate_ids = list(scored_qs.values_list('id', flat=True)[:top_k])
-
-        if not candidate_ids:
-            return scored_qs.filter(pk__in=[])
+        closest_distance = Subquery(nearest.values('distance')[:1])
+        return (
+            scored_qs.filter(pk__in=Subquery(nearest.values('id')[:top_k]))
+            .annotate(closest_distance=closest_distance)
+            .filter(Q(distance__lte=max_distance) | Q(closest_distance__gt=max_distance))
+            .order_by('distance')
+        )
 
-        return scored_qs.filter(pk__in=candidate_ids).order_by('distance')
+    def _lexical_filter(self, qs, query):
+        """
+        Keyword OR full-text match in a single query.
 
-    def _fulltext_filter(self, qs, query):
-        # Build a weighted full-text index on the fly from the fields we persist.
-        qs = qs.annotate(
-            tags_text=Cast('tags', models.TextField()),
-            ai_tags_text=Cast('ai_tags', models.TextField()),
-        ).annotate(
-            search_vector=(
-                SearchVector('title', weight='A', config='english')
-                + SearchVector('author__name', weight='A', config='english')
-                + SearchVector('description', weight='B', config='english')
-                + SearchVector('ai_summary', weight='B', config='english')
-                + SearchVector('tags_text', weight='A', config='simple')
-                + SearchVector('ai_tags_text', weight='A', config='simple')
-            )
-        )
+        Both predicates are index-backed (trigram GIN and the persisted, GIN-indexed
+        search_vector), so there is no need to probe the keyword set with .exists()
+        before falling through to full-text search.
+        """
+        match = keyword_match(query)
+        if match is None:
+            return qs.none()
 
         query_obj = SearchQuery(query, search_type='websearch', config='english')
-        return (
-            qs.annotate(search_rank=SearchRank(F('search_vector'), query_obj))
-            .filter(search_rank__gte=0.01)
-            .order_by('-search_rank', '-view_count')
+        return qs.filter(match | Q(search_vector=query_obj)).annotate(
+            keyword_rank=keyword_rank(query),
+            search_rank=SearchRank(F('search_vector'), query_obj),
         )
+
+    def _base_queryset(self):
+        if self.action == 'list':
+            # Pages are assembled from cached snapshots (catalog.snapshots): the
+            # page query only needs ids and the live counters.
+            return Book.objects.filter(is_published=True).only('id', *SNAPSHOT_COUNTER_FIELDS)
+
+        qs = Book.objects.filter(is_published=True) if self.action == 'retrieve' else Book.objects.all()
+        
+        # Optimize queries with select_related and prefetch_related. Per-user fields
+        # are not serialized here; see catalog.personalization.
+        return qs.select_related('author').prefetch_related('categories')
 
     def get_queryset(self):
         """
@@ -169,10 +161,7 @@ class BookViewSet(viewsets.ModelViewSet):
         Frontend sends `query` while DRF's SearchFilter defaults to `search`,
         so we support both for convenience.
         """
-        qs = Book.objects.filter(is_published=True) if self.action in ['list', 'retrieve'] else Book.objects.all()
-        
-        # Optimize queries with select_related and prefetch_related
-        qs = qs.select_related('author').prefetch_related('categories')
+        qs = self._base_queryset()
 
         request = self.request
         query = (request.query_params.get('query') or request.query_params.get('search') or '').strip()
@@ -186,56 +175,76 @@ class BookViewSet(viewsets.ModelViewSet):
                 except Exception:
                     logger.warning("Semantic search failed; falling back to keyword search.", exc_info=True)
                     qs = self._keyword_filter(qs, query)
-                    self.ordering = ['-view_count', '-created_at']
+                    self.ordering = ['-keyword_rank', '-view_count']
             else:
-                keyword_qs = self._keyword_filter(qs, query)
-                if keyword_qs.exists():
-                    qs = keyword_qs
-                    self.ordering = ['-view_count', '-created_at']
-                else:
-                    # Fallback 1: weighted full-text search (better token handling).
-                    try:
-                        fulltext_qs = self._fulltext_filter(qs, query)
-                        if fulltext_qs.exists():
-                            qs = fulltext_qs
-                            self.ordering = ['-search_rank', '-view_count']
-                        else:
-                            # Fallback 2: semantic similarity (strict).
-                            query_has_signal = len(query) >= 3
-                            if query_has_signal:
-                                qs = self._semantic_filter(qs, query, strict=True)
-                                self.ordering = ['distance']
-                            else:
-                                qs = keyword_qs
-                                self.ordering = ['-view_count', '-created_at']
-                    except Exception:
-                        logger.warning("Fallback search failed; returning keyword result set.", exc_info=True)
-                        try:
-                            query_has_signal = len(query) >= 3
-                            if query_has_signal:
-                                qs = self._semantic_filter(qs, query, strict=True)
-                                self.ordering = ['distance']
-                            else:
-                                qs = keyword_qs
-                                self.ordering = ['-view_count', '-created_at']
-                        except Exception:
-                            logger.warning("Semantic fallback failed; returning keyword result set.", exc_info=True)
-                            qs = keyword_qs
-                            self.ordering = ['-view_count', '-created_at']
+                qs = self._lexical_filter(qs, query)
+                self.ordering = ['-keyword_rank', '-search_rank', '-view_count']
+
+                # Strict semantic similarity only runs if the lexical page comes back empty
+                # (see paginate_queryset), so a hit costs no extra round trips.
+                if len(query) >= 3:
+                    self._semantic_fallback_query = query
         else:
             self.ordering = ['-created_at']
         
-        # Prefetch user-specific data if authenticated
-        if request.user.is_authenticated:
-            from reading.models import ReadingProgress
-            qs = qs.prefetch_related(
-                Prefetch('likes', queryset=BookLike.objects.filter(user=request.user)),
-                Prefetch('bookmarks', queryset=Bookmark.objects.filter(user=request.user)),
-                Prefetch('reading_progresses', queryset=ReadingProgress.objects.filter(user=request.user))
-            )
-        
         return qs
 
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        fallback_query = self._semantic_fallback_query
+        if page or not fallback_query:
+            return page
+
+        # Nothing matched lexically: retry once with strict semantic similarity.
+        self._semantic_fallback_query = None
+        try:
+            semantic_qs = self._semantic_filter(self._base_queryset(), fallback_query, strict=True)
+        except Exception:
+            logger.warning("Semantic fallback failed; returning keyword result set.", exc_info=True)
+            return page
+
+        self.ordering = ['distance']
+        return super().paginate_queryset(self.filter_queryset(semantic_qs))
+
+    def _hybrid_list(self, request, query):
+        """
+        ?mode=hybrid: keyword, full-text and vector candidates fused in one statement.
+
+        The page and its total come back from the same query, so apart from
+        snapshot misses a page costs a single round trip.
+        """
+        # Only filterset filters narrow the candidates; SearchFilter would AND a
+        # substring match onto the semantic signal.
+        scope_qs = DjangoFilterBackend().filter_queryset(
+            request, Book.objects.filter(is_published=True), self
+        )
+
+        query_vector = None
+        if len(query) >= 3:
+            try:
+                query_vector = get_query_embedding(query)
+            except Exception:
+                logger.warning("Query embedding failed; hybrid search continues without vectors.", exc_info=True)
+
+        page_size = self.paginator.get_page_size(request)
+        try:
+            page_number = max(int(request.query_params.get(self.paginator.page_query_param, 1)), 1)
+        except (TypeError, ValueError):
+            page_number = 1
+        offset = (page_number - 1) * page_size
+
+        books = hybrid_search(scope_qs, query, query_vector, limit=page_size, offset=offset)
+        total = books[0].hybrid_total if books else 0
+
+        page = self.paginate_queryset(PrefetchedPage(books, total, offset))
+        return self.get_paginated_response(get_snapshots(page))
+
+    def _snapshot_list(self, request):
+        """ListModelMixin.list, rendering the page from book snapshots."""
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(get_snapshots(page))
+
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return BookCreateUpdateSerializer
@@ -243,6 +252,13 @@ class BookViewSet(viewsets.ModelViewSet):
             return BookDetailSerializer
         return BookListSerializer
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ('list', 'retrieve'):
+            # Shared payloads; list()/retrieve() merge the user's fields afterwards.
+            context['personalize'] = False
+        return context
+
     def get_permissions(self):
         # Apply permissions based on action
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -252,20 +268,28 @@ class BookViewSet(viewsets.ModelViewSet):
     def list(self, request, *args, **kwargs):
         """Override list to add error handling and caching"""
         try:
-            # Build cache key based on query parameters
-            cache_key = f"books_list_v2_{hash(str(request.query_params))}"
-            cached_response = cache.get(cache_key)
-            
-            if cached_response is not None:
-                return Response(cached_response)
-            
-            response = super().list(request, *args, **kwargs)
+            # Shared across users: the payload carries no per-user fields, and the
+            # key changes whenever the catalog does (see catalog.caching).
+            cache_key = book_list_cache_key(request.query_params)
+            data = cache.get(cache_key) if cache_key else None
             
-            # Cache successful responses for 5 minutes
-            if response.status_code == 200:
-                cache.set(cache_key, response.data, 60 * 5)
+            if data is None:
+                query = (request.query_params.get('query') or request.query_params.get('search') or '').strip()
+                # Optional ?ef_search= / ?probes= trade vector-search latency for recall.
+                with ann_search_settings(**ann_params_from_query(request.query_params)):
+                    if query and self._is_hybrid_mode(request):
+                        response = self._hybrid_list(request, query)
+                    else:
+                        response = self._snapshot_list(request)
+                
+                if response.status_code != 200:
+                    return response
+                data = response.data
+                if cache_key:
+                    cache.set(cache_key, data, BOOK_LIST_CACHE_TTL)
             
-            return response
+            results = counters.apply_pending_data(data['results'])
+            return Response({**data, 'results': personalize(results, request.user)})
         except Exception as e:
             logger.error(f"Error listing books: {str(e)}", exc_info=True)
             return Response(
@@ -276,29 +300,28 @@ class BookViewSet(viewsets.ModelViewSet):
     def retrieve(self, request, *args, **kwargs):
         """Re-implement the view count logic from the old BookDetailView"""
         try:
-            instance = self.get_object()
+            # The shared detail payload is cached per catalog generation, so a hit
+            # needs no ORM work; per-user fields and pending counters are merged below.
+            cache_key = book_detail_cache_key(kwargs[self.lookup_url_kwarg or self.lookup_field])
+            data = cache.get(cache_key) if cache_key else None
             
-            # Increment view count asynchronously (non-blocking)
-            Book.objects.filter(pk=instance.pk).update(view_count=F('view_count') + 1)
+            if data is None:
+                data = self.get_serializer(self.get_object()).data
+                if cache_key:
+                    cache.set(cache_key, data, BOOK_LIST_CACHE_TTL)
+            book_id = data['id']
             
-            # Create BookView record for analytics asynchronously (only for authenticated users)
-            # Use get_or_create to avoid blocking on duplicate key errors
+            # Buffered increment; catalog.counters flushes view counts in batches
+            counters.incr(book_id, 'view_count')
+            
+            # Queue the BookView for analytics (first view per user only, as before)
             if request.user.is_authenticated:
-                try:
-                    BookView.objects.get_or_create(
-                        user=request.user,
-                        book=instance,
-                        defaults={'viewed_at': timezone.now()}
-                    )
-                except Exception as e:
-                    # Log but don't fail the request
-                    logger.warning(f"Failed to create BookView: {str(e)}")
+                record_book_view(request.user, book_id, first_only=True)
             
-            # Don't refresh from DB - use the instance we already have
-            # This saves a database query
-
-            serializer = self.get_serializer(instance)
-            return Response(serializer.data)
+            data = counters.apply_pending_data([data])[0]
+            return Response(personalize([data], request.user)[0])
+        except Http404:
+            raise
         except Exception as e:
             logger.error(f"Error retrieving book: {str(e)}", exc_info=True)
             return Response(
@@ -329,37 +352,24 @@ def book_cover(request, book_id):
 @permission_classes([IsAuthenticated])
 def book_read_stream(request, book_id):
     try:
-        book = get_object_or_404(Book, id=book_id, is_published=True)
+        # Cached book lookup and memoized signed URL (catalog.signed_urls)
+        info = signed_urls.book_file_info(book_id)
+        if info is None:
+            return Response({'error': 'Book not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        public_id = book.cloudinary_public_id
+        public_id, file_type = info
         if not public_id:
             return Response(
                 {'error': 'Missing Cloudinary public_id'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-        # Match this to HOW you uploaded the asset.
-        # If you uploaded PDFs as image-type (image/upload), use "image".
-        # If you uploaded them as raw (raw/upload), use "raw".
-        if book.file_type in ("PDF", "EPUB"):
-            resource_type = "image"   # change to "raw" if you upload PDFs as raw
-        elif book.file_type == "VIDEO":
-            resource_type = "video"
-        else:
-            resource_type = "image"
-
-        signed_url, _ = cloudinary.utils.cloudinary_url(
-            public_id,
-            resource_type=resource_type,
-            type="upload",          
-            sign_url=True,
-            secure=True,
-            expires_at=int(time.time()) + 3600,
-        )
+        resource_type = signed_urls.resource_type_for(file_type)
+        signed_url = signed_urls.signed_url(public_id, resource_type)
 
-        logger.info(
+        logger.debug(
             f"Returning Cloudinary URL for book {book_id}: "
-            f"public_id='{public_id}', resource_type='{resource_type}', url='{signed_url}'"
+            f"public_id='{public_id}', resource_type='{resource_type}'"
         )
 
         return Response({'url': signed_url})
@@ -373,6 +383,72 @@ def book_read_stream(request, book_id):
 
 
 
+READER_BATCH_MAX_BOOKS = getattr(settings, 'READER_BATCH_MAX_BOOKS', 20)
+
+# Fallback when Cloudinary does not report a content type
+FILE_TYPE_CONTENT_TYPES = {
+    'PDF': 'application/pdf',
+    'EPUB': 'application/epub+zip',
+}
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def book_read_batch(request):
+    """
+    Signed reader URLs, content length and content type for several books at once.
+    Expects: { "book_ids": [1, 2, 3] } (up to READER_BATCH_MAX_BOOKS ids)
+    """
+    raw_ids = request.data.get('book_ids')
+    if not isinstance(raw_ids, list) or not raw_ids:
+        return Response({'error': 'book_ids must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(raw_ids) > READER_BATCH_MAX_BOOKS:
+        return Response(
+            {'error': f'At most {READER_BATCH_MAX_BOOKS} book_ids per request'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    # JSON integers only: bools, floats and numeric strings are rejected
+    if not all(type(book_id) is int for book_id in raw_ids):
+        return Response({'error': 'book_ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+    book_ids = list(dict.fromkeys(raw_ids))
+
+    try:
+        # Published books in one query (or straight from the cached lookups)
+        infos = signed_urls.book_file_infos(book_ids)
+        assets = {
+            book_id: (public_id, signed_urls.resource_type_for(file_type))
+            for book_id, (public_id, file_type) in infos.items()
+            if public_id
+        }
+        metadata = signed_urls.asset_metadata(assets.values())
+
+        results = []
+        for book_id in book_ids:
+            if book_id not in assets:
+                continue
+            public_id, resource_type = assets[book_id]
+            meta = metadata[assets[book_id]]
+            results.append({
+                'book_id': book_id,
+                'url': signed_urls.signed_url(public_id, resource_type),
+                'content_length': meta['content_length'],
+                'content_type': meta['content_type'] or FILE_TYPE_CONTENT_TYPES.get(infos[book_id][1]),
+            })
+
+        return Response({
+            'results': results,
+            # Unknown, unpublished, or without a Cloudinary file
+            'unavailable': [book_id for book_id in book_ids if book_id not in assets],
+        })
+
+    except Exception:
+        logger.exception(f"Error preparing batch book URLs for {book_ids}")
+        return Response(
+            {'error': 'An internal error occurred.'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def book_read_token(request, book_id):
@@ -393,29 +469,26 @@ def book_read_token(request, book_id):
 def toggle_like(request, book_id):
     """Toggle book like"""
     try:
-        book = Book.objects.get(id=book_id, is_published=True)
-        user = request.user
-        
-        like = BookLike.objects.filter(user=user, book=book).first()
-        
-        if like:
-            like.delete()
-            
-            # Re-fetch book to ensure we have latest data
-            book.refresh_from_db()
-            if book.like_count > 0:
-                book.like_count -= 1
-                book.save(update_fields=['like_count'])
-            
-            book.refresh_from_db()
-            return Response({'liked': False, 'like_count': book.like_count})
+        book = Book.objects.only('id', 'like_count').get(id=book_id, is_published=True)
+
+        # A single DELETE tells us whether the like existed; counters are buffered.
+        _, deleted = BookLike.objects.filter(user=request.user, book_id=book.id).delete()
+        unliked = deleted.get(BookLike._meta.label, 0)
+        if unliked:
+            liked = False
+            counters.incr(book.id, 'like_count', -unliked)
         else:
-            BookLike.objects.create(user=user, book=book)
-            Book.objects.filter(pk=book.pk).update(like_count=F('like_count') + 1)
-            
-            book.refresh_from_db()
-            return Response({'liked': True, 'like_count': book.like_count})
-    
+            liked = True
+            try:
+                with transaction.atomic():
+                    BookLike.objects.create(user=request.user, book_id=book.id)
+                counters.incr(book.id, 'like_count', 1)
+            except IntegrityError:
+                # A concurrent request already liked it and counted it.
+                pass
+
+        return Response({'liked': liked, 'like_count': counters.current(book.id, 'like_count', book.like_count)})
+
     except Book.DoesNotExist:
         return Response({'error': 'Book not found'}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
@@ -431,29 +504,29 @@ def toggle_like(request, book_id):
 def toggle_bookmark(request, book_id):
     """Toggle book bookmark"""
     try:
-        book = Book.objects.get(id=book_id, is_published=True)
-        user = request.user
+        book = Book.objects.only('id', 'bookmark_count').get(id=book_id, is_published=True)
         location = request.data.get('location', '')
-        
-        bookmark = Bookmark.objects.filter(user=user, book=book).first()
-        
-        if bookmark:
-            bookmark.delete()
-            # Re-fetch book
-            book.refresh_from_db()
-            if book.bookmark_count > 0:
-                book.bookmark_count -= 1
-                book.save(update_fields=['bookmark_count'])
-            
-            book.refresh_from_db()
-            return Response({'bookmarked': False, 'bookmark_count': book.bookmark_count})
+
+        _, deleted = Bookmark.objects.filter(user=request.user, book_id=book.id).delete()
+        unbookmarked = deleted.get(Bookmark._meta.label, 0)
+        if unbookmarked:
+            bookmarked = False
+            counters.incr(book.id, 'bookmark_count', -unbookmarked)
         else:
-            Bookmark.objects.create(user=user, book=book, location=location)
-            Book.objects.filter(pk=book.pk).update(bookmark_count=F('bookmark_count') + 1)
-            
-            book.refresh_from_db()
-            return Response({'bookmarked': True, 'bookmark_count': book.bookmark_count})
-    
+            bookmarked = True
+            try:
+                with transaction.atomic():
+                    Bookmark.objects.create(user=request.user, book_id=book.id, location=location)
+                counters.incr(book.id, 'bookmark_count', 1)
+            except IntegrityError:
+                # A concurrent toggle created it first (unique user/book) and counted it.
+                pass
+
+        return Response({
+            'bookmarked': bookmarked,
+            'bookmark_count': counters.current(book.id, 'bookmark_count', book.bookmark_count),
+        })
+
     except Book.DoesNotExist:
         return Response({'error': 'Book not found'}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
@@ -468,59 +541,12 @@ def toggle_bookmark(request, book_id):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def search_suggestions(request):
-    """Get search suggestions"""
+    """Get search suggestions (word-prefix matches from the in-memory index)"""
     query = request.GET.get('query', '').strip()
     if len(query) < 2:
         return Response({'suggestions': []})
-    
-    books = Book.objects.filter(
-        Q(title__icontains=query) | Q(author__name__icontains=query),
-        is_published=True
-    ).order_by('-view_count')[:10]
-    
-    suggestions = []
-    
-    for book in books:
-        if query.lower() in book.title.lower():
-            suggestions.append({
-                'type': 'title',
-                'text': book.title,
-                'book_id': str(book.id)
-            })
-        elif query.lower() in book.author.name.lower():
-            suggestions.append({
-                'type': 'author',
-                'text': book.author.name,
-                'book_id': str(book.id)
-            })
-    
-    tag_suggestions = Book.objects.filter(
-        tags__icontains=query,
-        is_published=True
-    ).values_list('tags', flat=True).distinct()
-
-    unique_tags = set()
-    for tag_value in tag_suggestions:
-        if not tag_value:
-            continue
-
-        # tags are stored as JSON lists; handle string fallback defensively.
-        if isinstance(tag_value, list):
-            candidates = [str(t).strip() for t in tag_value if str(t).strip()]
-        else:
-            candidates = [t.strip() for t in str(tag_value).split(',') if t.strip()]
-
-        for tag in candidates:
-            if query.lower() in tag.lower():
-                unique_tags.add(tag)
-    
-    for tag in list(unique_tags)[:5]:
-        suggestions.append({
-            'type': 'tag',
-            'text': tag
-        })
-    
-    return Response({'suggestions': suggestions[:10]})
+
+    return Response({'suggestions': suggestions.suggest(query)})
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -539,16 +565,19 @@ def semantic_search(request):
     
     if query:
         # 1. Turn the user's search words into a vector
-        query_vector = get_embedding(query)
+        query_vector = get_query_embedding(query)
         
         # 2. Find the top 5 most similar books using Cosine Similarity
-        # Lower distance = higher similarity
-        results = Book.objects.annotate(
-            distance=CosineDistance('embedding_vector', query_vector)
-        ).order_by('distance')[:5]
+        # Lower distance = higher similarity. ORDER BY distance LIMIT 5 is served by
+        # the HNSW index; ?ef_search= raises recall at some latency cost.
+        with ann_search_settings(**ann_params_from_query(request.GET)):
+            results = list(
+                Book.objects.filter(embedding_vector__isnull=False).annotate(
+                    distance=CosineDistance('embedding_vector', query_vector)
+                ).order_by('distance')[:5]
+            )
         
     return render(request, 'catalog/search.html', {
         'results': results, 
         'query': query
-    })
-
+    })
\ No newline at end of file
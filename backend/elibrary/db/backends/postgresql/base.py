@@ -0,0 +1,94 @@
+"""
+PostgreSQL backend used for every DB_POOL_MODE (see settings).
+
+Adds per-process connect/reuse accounting and, when DATABASES[alias]['POOL']
+is set, hands out connections from a psycopg_pool.ConnectionPool shared by all
+threads of the process (Django 4.2 has no built-in pooling). Closing a Django
+connection then returns it to the pool instead of disconnecting.
+"""
+import threading
+
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.postgresql import base
+
+_lock = threading.Lock()
+_pools = {}
+_stats = {}
+
+
+def _bump(alias, key):
+    with _lock:
+        counts = _stats.setdefault(alias, {'connects': 0, 'reuses': 0})
+        counts[key] += 1
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def pool_options(self):
+        return self.settings_dict.get('POOL')
+
+    def _get_pool(self, conn_params):
+        with _lock:
+            pool = _pools.get(self.alias)
+            if pool is None:
+                from psycopg_pool import ConnectionPool
+
+                options = self.pool_options
+                pool = ConnectionPool(
+                    kwargs=conn_params,
+                    min_size=options.get('min_size', 1),
+                    max_size=options.get('max_size', 10),
+                    timeout=options.get('timeout', 30),
+                    # Validate connections on checkout (the pooler may drop idle ones).
+                    check=ConnectionPool.check_connection,
+                    name=f"django-{self.alias}",
+                    open=True,
+                )
+                _pools[self.alias] = pool
+            return pool
+
+    def get_new_connection(self, conn_params):
+        if not self.pool_options:
+            connection = super().get_new_connection(conn_params)
+            _bump(self.alias, 'connects')
+            return connection
+        # OPTIONS['isolation_level'] is not supported with the pool.
+        self.isolation_level = base.IsolationLevel.READ_COMMITTED
+        return self._get_pool(conn_params).getconn()
+
+    def _close(self):
+        if self.connection is not None and self.pool_options:
+            with self.wrap_database_errors:
+                return _pools[self.alias].putconn(self.connection)
+        return super()._close()
+
+
+def _count_reused_connections(**kwargs):
+    # Registered after close_old_connections, so a connection that is still open
+    # here survived from an earlier request and will be reused.
+    for conn in connections.all(initialized_only=True):
+        if isinstance(conn, DatabaseWrapper) and conn.connection is not None:
+            _bump(conn.alias, 'reuses')
+
+
+request_started.connect(_count_reused_connections)
+
+
+def connection_stats():
+    """Per-alias connect/reuse counts for this process (pool counters in pool mode)."""
+    with _lock:
+        result = {alias: dict(counts) for alias, counts in _stats.items()}
+        pools = dict(_pools)
+    for alias, pool in pools.items():
+        pool_stats = pool.get_stats()
+        connects = pool_stats.get('connections_num', 0)
+        result[alias] = {
+            'connects': connects,
+            'reuses': max(pool_stats.get('requests_num', 0) - connects, 0),
+            'pool_size': pool_stats.get('pool_size', 0),
+            'pool_available': pool_stats.get('pool_available', 0),
+            'requests_waiting': pool_stats.get('requests_waiting', 0),
+        }
+    return result
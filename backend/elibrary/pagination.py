@@ -0,0 +1,196 @@
+"""
+Default DRF pagination: page numbers as before, keyset (cursor) pages on request.
+
+- `?page=N` keeps the existing PageNumberPagination responses.
+- `?cursor=` (empty for the first page) switches to keyset pagination: the
+  next page is `WHERE (ordering columns) < (last row's values)` on the same
+  ORDER BY, so page 500 costs the same as page 1 and no COUNT(*) runs. It
+  applies when the queryset is ordered by non-null model fields (e.g.
+  -created_at or -view_count, backed by the (is_published, ...) indexes); the
+  primary key is appended as a tie-breaker. Other orderings (search rank,
+  vector distance) fall back to page numbers.
+- `?count=estimate` reports the planner's row estimate instead of an exact
+  COUNT(*); `?count=exact` requests an exact count in cursor mode.
+"""
+import base64
+import datetime
+import decimal
+import json
+import uuid
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def estimate_count(queryset):
+    """Row estimate from the query planner (EXPLAIN), without running the query."""
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        if isinstance(self.object_list, QuerySet):
+            return estimate_count(self.object_list)
+        return super().count
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()  # full precision, unlike DjangoJSONEncoder
+    if isinstance(value, (uuid.UUID, decimal.Decimal)):
+        return str(value)
+    return value
+
+
+class KeysetPagination(PageNumberPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    # When True, requests without ?cursor are not paginated at all (plain array).
+    unpaginated_without_cursor = False
+
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.keyset = None
+        count_mode = request.query_params.get(self.count_query_param)
+
+        if self.cursor_query_param in request.query_params and isinstance(queryset, QuerySet):
+            terms = self._keyset_terms(queryset)
+            if terms:
+                return self._paginate_keyset(queryset, request, terms, count_mode)
+
+        if self.unpaginated_without_cursor:
+            return None
+        if count_mode == 'estimate':
+            self.django_paginator_class = EstimatedCountPaginator
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is None:
+            return super().get_paginated_response(data)
+        payload = {}
+        if self.keyset['count'] is not None:
+            payload['count'] = self.keyset['count']
+        payload.update(next=self.keyset['next'], previous=self.keyset['previous'], results=data)
+        return Response(payload)
+
+    # --- Keyset pagination ---
+
+    def _keyset_terms(self, queryset):
+        """[(field, descending), ...] for the queryset's ordering, or None if unsupported."""
+        opts = queryset.model._meta
+        ordering = list(queryset.query.order_by) or list(opts.ordering)
+        terms = []
+        for item in ordering:
+            if not isinstance(item, str):
+                return None
+            name = item.lstrip('-')
+            try:
+                field = opts.pk if name == 'pk' else opts.get_field(name)
+            except FieldDoesNotExist:
+                return None  # annotation, e.g. keyword_rank or distance
+            if not field.concrete or field.is_relation or field.null:
+                return None
+            terms.append((field, item.startswith('-')))
+        if not terms:
+            return None
+        if not any(field.primary_key for field, _ in terms):
+            terms.append((opts.pk, terms[0][1]))
+        return terms
+
+    def _decode_cursor(self, raw, terms):
+        if not raw:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(raw.encode('ascii')))
+            values = data['p']
+            if len(values) != len(terms):
+                raise ValueError
+            return [field.to_python(value) for (field, _), value in zip(terms, values)], bool(data.get('r'))
+        except (ValueError, TypeError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _encode_cursor(self, obj, terms, reverse):
+        data = {'p': [_encode_value(getattr(obj, field.attname)) for field, _ in terms]}
+        if reverse:
+            data['r'] = 1
+        raw = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode('ascii')
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, raw)
+
+    def _keyset_filter(self, terms, position, reverse):
+        """
+        Rows after `position`: a < x OR (a = x AND b < y) ..., and'ed with the
+        redundant a <= x, which gives the planner an index range on the leading
+        column; without it the OR chain is a filter over every newer row.
+        """
+        clauses = []
+        equal = {}
+        for (field, desc), value in zip(terms, position):
+            lookup = 'lt' if desc != reverse else 'gt'
+            clauses.append(Q(**equal, **{f"{field.name}__{lookup}": value}))
+            equal[field.name] = value
+        first, desc = terms[0]
+        bound = Q(**{f"{first.name}__{'lte' if desc != reverse else 'gte'}": position[0]})
+        return bound & reduce(or_, clauses)
+
+    def _paginate_keyset(self, queryset, request, terms, count_mode):
+        position, reverse = self._decode_cursor(request.query_params.get(self.cursor_query_param), terms)
+        page_size = self.get_page_size(request)
+
+        # Walking backwards (previous page) flips every direction, then the rows are reversed.
+        order_by = [f"{'-' if desc != reverse else ''}{field.name}" for field, desc in terms]
+        qs = queryset.order_by(*order_by)
+        loaded, deferred = qs.query.deferred_loading
+        if not deferred:
+            # .only() querysets must load the cursor columns, or encoding one would query per row.
+            qs = qs.only(*loaded, *[field.name for field, _ in terms])
+        if position is not None:
+            qs = qs.filter(self._keyset_filter(terms, position, reverse))
+
+        rows = list(qs[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        if reverse:
+            previous_url = self._encode_cursor(rows[0], terms, True) if rows and has_more else None
+            next_url = self._encode_cursor(rows[-1], terms, False) if rows else None
+        else:
+            next_url = self._encode_cursor(rows[-1], terms, False) if rows and has_more else None
+            previous_url = self._encode_cursor(rows[0], terms, True) if rows and position is not None else None
+
+        count = None
+        if count_mode == 'estimate':
+            count = estimate_count(queryset)
+        elif count_mode == 'exact':
+            count = queryset.count()
+
+        self.keyset = {'next': next_url, 'previous': previous_url, 'count': count}
+        return rows
+
+
+class OptionalKeysetPagination(KeysetPagination):
+    """For endpoints that historically returned a plain array: paginate only with ?cursor."""
+    unpaginated_without_cursor = True
@@ -0,0 +1,30 @@
+"""
+Shared raw Redis client for features that need more than the Django cache API
+(hashes, sets, atomic pops). Returns None when Redis is not configured or not
+reachable, in which case callers fall back to an in-process implementation.
+"""
+import logging
+import threading
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_lock = threading.Lock()
+
+
+def get_redis():
+    global _client
+    if not getattr(settings, 'REDIS_AVAILABLE', False):
+        return None
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import redis
+
+                options = {'socket_connect_timeout': 5, 'socket_timeout': 5}
+                if settings.REDIS_URL.startswith('rediss://'):
+                    options['ssl_cert_reqs'] = None  # Allow self-signed certificates for cloud Redis
+                _client = redis.from_url(settings.REDIS_URL, **options)
+    return _client
@@ -0,0 +1,65 @@
+"""
+orjson-based JSON renderer, the DRF default (see REST_FRAMEWORK in settings).
+
+Output matches rest_framework.renderers.JSONRenderer for the types views
+return: UTC datetimes end in 'Z', Decimals become numbers, UUIDs strings, and
+lazy strings, querysets, sets and timedeltas are handled in `default`.
+"""
+import datetime
+import decimal
+
+import orjson
+from django.db.models.query import QuerySet
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+from rest_framework.renderers import BaseRenderer
+
+OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def default(obj):
+    """Types orjson does not serialize natively, converted like DRF's JSONEncoder."""
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, Promise):
+        return force_str(obj)
+    if isinstance(obj, datetime.timedelta):
+        return str(obj.total_seconds())
+    if isinstance(obj, QuerySet):
+        return tuple(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if hasattr(obj, '__getitem__'):
+        try:
+            return dict(obj)
+        except (TypeError, ValueError):
+            pass
+    if hasattr(obj, '__iter__'):
+        return tuple(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(data, indent=False):
+    return orjson.dumps(data, default=default, option=OPTIONS | (orjson.OPT_INDENT_2 if indent else 0))
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # orjson only supports 2-space indentation; any ?indent / Accept indent turns it on.
+        indent = False
+        if accepted_media_type:
+            params = dict(
+                param.strip().split('=', 1)
+                for param in accepted_media_type.split(';')[1:]
+                if '=' in param
+            )
+            indent = bool(params.get('indent'))
+        return dumps(data, indent=indent)
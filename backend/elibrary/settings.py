@@ -127,8 +127,28 @@ DATABASES = {
     )
 }
 
-# Override connection lifetime: close after every request (good for serverless/local dev)
-DATABASES["default"]["CONN_MAX_AGE"] = 0
+# Connection handling (elibrary.db.backends.postgresql), selected with DB_POOL_MODE:
+#   none       - close after every request (default; good for serverless/local dev)
+#   persistent - keep each worker's connection for DB_CONN_MAX_AGE seconds, health-checked
+#                before reuse (gunicorn sync workers)
+#   pool       - share a psycopg_pool pool between the threads of a process (threaded workers)
+DB_POOL_MODE = os.getenv('DB_POOL_MODE', 'none').lower()
+DATABASES["default"]["ENGINE"] = 'elibrary.db.backends.postgresql'
+if DB_POOL_MODE == 'persistent':
+    DATABASES["default"]["CONN_MAX_AGE"] = int(os.getenv('DB_CONN_MAX_AGE', 600))
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+elif DB_POOL_MODE == 'pool':
+    # Django "closes" after every request, which returns the connection to the pool
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["POOL"] = {
+        'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 1)),
+        'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', 30)),
+    }
+else:
+    if DB_POOL_MODE != 'none':
+        logger.warning(f"Unknown DB_POOL_MODE '{DB_POOL_MODE}', falling back to 'none'")
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
 
 
 
@@ -173,12 +193,18 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # Page numbers by default; ?cursor= switches to keyset pages, ?count=estimate skips COUNT(*)
+    'DEFAULT_PAGINATION_CLASS': 'elibrary.pagination.KeysetPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     
+    # orjson-backed JSON (elibrary/renderers.py, elibrary/parsers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'elibrary.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'elibrary.parsers.ORJSONParser',
         'rest_framework.parsers.FormParser',
         'rest_framework.parsers.MultiPartParser',
     ],
@@ -251,6 +277,55 @@ if not REDIS_AVAILABLE:
     RATELIMIT_ENABLE = False
     SILENCED_SYSTEM_CHECKS = ['django_ratelimit.E003', 'django_ratelimit.W001']
 
+# Query embedding cache (catalog.embedding_cache): per-process LRU in front of CACHES['default']
+EMBEDDING_CACHE_TTL = int(os.getenv('EMBEDDING_CACHE_TTL', 60 * 60 * 24 * 7))
+EMBEDDING_CACHE_LOCAL_SIZE = int(os.getenv('EMBEDDING_CACHE_LOCAL_SIZE', 512))
+
+# Book list responses are cached per catalog generation (catalog.caching)
+BOOK_LIST_CACHE_TTL = int(os.getenv('BOOK_LIST_CACHE_TTL', 60 * 5))
+
+# Per-book serialized snapshots used to assemble list pages (catalog.snapshots)
+BOOK_SNAPSHOT_TTL = int(os.getenv('BOOK_SNAPSHOT_TTL', 60 * 60 * 24))
+
+# In-memory search suggestion index (catalog.suggestions): generation check / full rebuild intervals
+SUGGESTION_CHECK_INTERVAL = int(os.getenv('SUGGESTION_CHECK_INTERVAL', 5))
+SUGGESTION_REBUILD_INTERVAL = int(os.getenv('SUGGESTION_REBUILD_INTERVAL', 60 * 15))
+
+# Book file streaming (catalog.storage): bytes read per chunk, max ranges honoured per request
+FILE_STREAM_CHUNK_SIZE = int(os.getenv('FILE_STREAM_CHUNK_SIZE', 64 * 1024))
+FILE_STREAM_MAX_RANGES = int(os.getenv('FILE_STREAM_MAX_RANGES', 16))
+
+# On-disk LRU cache of Cloudinary book assets such as covers (catalog.file_cache); 0 bytes disables it
+BOOK_FILE_CACHE_DIR = os.getenv('BOOK_FILE_CACHE_DIR', os.path.join(BASE_DIR, 'cache', 'book_files'))
+BOOK_FILE_CACHE_MAX_BYTES = int(os.getenv('BOOK_FILE_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+BOOK_FILE_CACHE_DOWNLOAD_TIMEOUT = int(os.getenv('BOOK_FILE_CACHE_DOWNLOAD_TIMEOUT', 60))
+
+# Signed reader URLs (catalog.signed_urls): lifetime, expiry rounding, cached book file lookups
+SIGNED_URL_TTL = int(os.getenv('SIGNED_URL_TTL', 60 * 60))
+SIGNED_URL_BUCKET_SECONDS = int(os.getenv('SIGNED_URL_BUCKET_SECONDS', 60 * 10))
+BOOK_FILE_INFO_TTL = int(os.getenv('BOOK_FILE_INFO_TTL', 60 * 60))
+READER_BATCH_MAX_BOOKS = int(os.getenv('READER_BATCH_MAX_BOOKS', 20))
+# Per-asset HEAD timeout for batch metadata; the request waits on the slowest one
+READER_METADATA_TIMEOUT = float(os.getenv('READER_METADATA_TIMEOUT', 2))
+
+# Book view/like/bookmark counters (catalog.counters) are buffered and flushed to Postgres every N seconds
+COUNTER_FLUSH_INTERVAL = int(os.getenv('COUNTER_FLUSH_INTERVAL', 10))
+
+# Analytics events (analytics.events) are queued in-process and bulk-inserted by a background thread
+ANALYTICS_FLUSH_INTERVAL = int(os.getenv('ANALYTICS_FLUSH_INTERVAL', 5))
+ANALYTICS_BATCH_SIZE = int(os.getenv('ANALYTICS_BATCH_SIZE', 200))
+ANALYTICS_MAX_PENDING = int(os.getenv('ANALYTICS_MAX_PENDING', 10000))
+
+# last_seen (accounts.presence): record each user at most once per window, persist in batches
+LAST_SEEN_COALESCE_SECONDS = int(os.getenv('LAST_SEEN_COALESCE_SECONDS', 60))
+LAST_SEEN_FLUSH_INTERVAL = int(os.getenv('LAST_SEEN_FLUSH_INTERVAL', 30))
+
+# Reading heartbeats (reading.heartbeats) are folded in-process and persisted every N seconds
+HEARTBEAT_FLUSH_INTERVAL = int(os.getenv('HEARTBEAT_FLUSH_INTERVAL', 60))
+
+# Authenticated user fields cached by SingleSessionJWTAuthentication (accounts.auth_cache)
+AUTH_PRINCIPAL_CACHE_TTL = int(os.getenv('AUTH_PRINCIPAL_CACHE_TTL', 60))
+
 # JWT Configuration
 from datetime import timedelta
 # Determine if we can use JWT blacklist (requires Redis)
@@ -0,0 +1,132 @@
+import base64
+import datetime
+import decimal
+import io
+import json
+import uuid
+from urllib.parse import parse_qs, urlparse
+
+from django.db.models import F
+from django.test import SimpleTestCase
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from catalog.models import Book
+
+from .pagination import KeysetPagination
+from .parsers import ORJSONParser
+from .renderers import ORJSONRenderer
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    def assertRendersLikeDRF(self, data):
+        expected = JSONRenderer().render(data)
+        actual = ORJSONRenderer().render(data)
+        self.assertEqual(json.loads(actual), json.loads(expected))
+        return actual, expected
+
+    def test_matches_drf_for_api_payloads(self):
+        actual, expected = self.assertRendersLikeDRF({
+            'count': 2,
+            'next': None,
+            'results': [
+                {'id': 1, 'title': 'Ünïcode ✓', 'tags': ['classic'], 'percent': 12.5, 'is_liked': False},
+                {'id': 2, 'title': 'Second', 'tags': [], 'percent': 0.0, 'is_liked': True},
+            ],
+        })
+        self.assertEqual(actual, expected)
+
+    def test_matches_drf_for_non_native_types(self):
+        self.assertRendersLikeDRF({
+            'created_at': datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+            'local': datetime.datetime(2024, 5, 1, 12, 30, 15),
+            'day': datetime.date(2024, 5, 1),
+            'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'price': decimal.Decimal('9.99'),
+            'label': gettext_lazy('Books'),
+            'elapsed': datetime.timedelta(minutes=1, seconds=30),
+            'ids': {3},
+            'raw': b'bytes',
+        })
+
+    def test_utc_datetimes_end_in_z(self):
+        rendered = ORJSONRenderer().render({'at': timezone.make_aware(datetime.datetime(2024, 1, 1), datetime.timezone.utc)})
+        self.assertEqual(rendered, b'{"at":"2024-01-01T00:00:00Z"}')
+
+    def test_none_renders_empty_body(self):
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_indent_from_accepted_media_type(self):
+        rendered = ORJSONRenderer().render({'a': 1}, accepted_media_type='application/json; indent=4')
+        self.assertEqual(rendered, b'{\n  "a": 1\n}')
+
+
+class ORJSONParserTests(SimpleTestCase):
+    def test_parses_utf8(self):
+        self.assertEqual(ORJSONParser().parse(io.BytesIO('{"q": "café"}'.encode())), {'q': 'café'})
+
+    def test_parses_other_encodings(self):
+        body = io.BytesIO('{"q": "café"}'.encode('latin-1'))
+        self.assertEqual(ORJSONParser().parse(body, parser_context={'encoding': 'latin-1'}), {'q': 'café'})
+
+    def test_invalid_json_raises_parse_error(self):
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"q": '))
+
+
+class KeysetCursorTests(SimpleTestCase):
+    def setUp(self):
+        self.paginator = KeysetPagination()
+        request = APIRequestFactory(SERVER_NAME='localhost').get('/books/', {'cursor': '', 'page': '3'})
+        self.paginator.request = Request(request)
+        self.terms = self.paginator._keyset_terms(Book.objects.order_by('-created_at'))
+
+    def cursor_from(self, url):
+        return parse_qs(urlparse(url).query)['cursor'][0]
+
+    def test_terms_append_primary_key_tie_breaker(self):
+        self.assertEqual([(field.name, desc) for field, desc in self.terms], [('created_at', True), ('id', True)])
+
+    def test_unsupported_orderings_have_no_terms(self):
+        ranked = Book.objects.annotate(rank=F('view_count')).order_by('-rank')
+        self.assertIsNone(self.paginator._keyset_terms(ranked))
+        self.assertIsNone(self.paginator._keyset_terms(Book.objects.order_by('year')))  # nullable
+        self.assertIsNone(self.paginator._keyset_terms(Book.objects.order_by('author')))  # relation
+
+    def test_cursor_round_trip_keeps_full_precision(self):
+        created_at = datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc)
+        url = self.paginator._encode_cursor(Book(id=42, created_at=created_at), self.terms, False)
+
+        self.assertNotIn('page=', url)
+        position, reverse = self.paginator._decode_cursor(self.cursor_from(url), self.terms)
+        self.assertEqual(position, [created_at, 42])
+        self.assertFalse(reverse)
+
+    def test_previous_cursor_is_marked_reverse(self):
+        url = self.paginator._encode_cursor(Book(id=7, created_at=timezone.now()), self.terms, True)
+        _, reverse = self.paginator._decode_cursor(self.cursor_from(url), self.terms)
+        self.assertTrue(reverse)
+
+    def test_empty_cursor_is_first_page(self):
+        self.assertEqual(self.paginator._decode_cursor('', self.terms), (None, False))
+
+    def test_invalid_cursors_are_not_found(self):
+        wrong_length = base64.urlsafe_b64encode(b'{"p":[1]}').decode()
+        wrong_type = base64.urlsafe_b64encode(b'{"p":["not a date","x"]}').decode()
+        for raw in ('%%%', 'bm90IGpzb24=', wrong_length, wrong_type):
+            with self.subTest(raw=raw), self.assertRaises(NotFound):
+                self.paginator._decode_cursor(raw, self.terms)
+
+    def test_filter_has_a_leading_range_bound(self):
+        created_at = datetime.datetime(2024, 5, 1, tzinfo=datetime.timezone.utc)
+        for reverse, bound, strict in ((False, '<=', '<'), (True, '>=', '>')):
+            with self.subTest(reverse=reverse):
+                query = Book.objects.filter(self.paginator._keyset_filter(self.terms, [created_at, 42], reverse)).query
+                sql = str(query).split(' WHERE ')[1]
+                self.assertTrue(sql.startswith(f'("catalog_book"."created_at" {bound} 2024-05-01'), sql)
+                self.assertIn(f'"created_at" {strict} 2024-05-01', sql)
+                self.assertIn(f'"id" {strict} 42', sql)
@@ -0,0 +1,455 @@
+"""
+Coalesced reading-session heartbeats.
+
+The reader PATCHes its position every few seconds. Instead of loading and
+saving the session and its ReadingProgress on every call, a heartbeat reads a
+small per-session state from the shared cache (loaded from the database once
+per session) and folds into a pending entry per session, kept in a Redis hash
+(or an in-process dict when Redis is unavailable), as catalog.counters does.
+A background flusher drains the pending entries every HEARTBEAT_FLUSH_INTERVAL
+seconds and persists them in one transaction: a bulk update of the sessions,
+of the progress rows (missing rows are inserted), and of the daily rollup.
+Ending a session, or closing it from start_reading_session, flushes its entry
+first, whichever process accepted the heartbeats.
+
+Time is pending as the session's absolute duration and applied with a
+greater-of comparison against the locked row, so a retried flush can never
+count the same seconds twice. Pages are counted against the last page in the
+shared state, as forward progress, and added to the state's running
+pages_read so each response reflects them before they are flushed. A
+heartbeat that races the end of its session still moves the position, the
+pages and any reading time the stored duration does not cover; only the ended
+session's duration is final.
+"""
+import atexit
+import logging
+import threading
+import time
+import uuid
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from elibrary.redis_client import get_redis
+
+from .models import ReadingProgress, ReadingSession
+from . import rollup
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = getattr(settings, 'HEARTBEAT_FLUSH_INTERVAL', 60)
+FLUSH_BATCH_SIZE = 500
+STATE_TTL = 60 * 60 * 12
+
+COMPLETED_PERCENT = 95.0
+
+_REDIS_KEY = 'elibrary:heartbeats:session:{}'
+_REDIS_DIRTY = 'elibrary:heartbeats:dirty'
+
+
+def _state_key(session_id):
+    return f"heartbeat:session:v2:{session_id}"
+
+
+def _load_state(user, session_id):
+    from .serializers import ReadingSessionSerializer
+
+    try:
+        session = ReadingSession.objects.select_related('book__author').get(
+            pk=session_id, user=user, ended_at__isnull=True
+        )
+    except ReadingSession.DoesNotExist:
+        return None
+    current_page = (
+        ReadingProgress.objects
+        .filter(user=user, book_id=session.book_id)
+        .values_list('current_page', flat=True)
+        .first()
+    )
+    return {
+        'user_id': str(session.user_id),
+        'book_id': session.book_id,
+        'book_pages': session.book.pages,
+        'started_at': session.started_at,
+        'day': rollup.session_day(session),
+        # Without a progress row the first heartbeat creates it at its own page: no pages read yet.
+        'current_page': current_page,
+        'pages_read': session.pages_read,
+        'session': dict(ReadingSessionSerializer(session).data),
+    }
+
+
+def _save_state(session_id, state):
+    try:
+        cache.set(_state_key(session_id), state, STATE_TTL)
+    except Exception:
+        logger.warning(f"Failed to cache heartbeat state for session {session_id}", exc_info=True)
+
+
+def _fold(entry, update):
+    """Merge a newer pending update into an older one."""
+    entry['duration'] = max(entry['duration'], update['duration'])
+    entry['pages'] += update['pages']
+    for field in ('current_page', 'percent', 'location'):
+        if update[field] is not None:
+            entry[field] = update[field]
+    entry['seen_at'] = max(entry['seen_at'], update['seen_at'])
+
+
+class LocalHeartbeatStore:
+    """In-process store used in development (LocMemCache)."""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def add(self, session_id, update):
+        with self._lock:
+            entry = self._pending.get(session_id)
+            if entry is None:
+                self._pending[session_id] = dict(update)
+            else:
+                _fold(entry, update)
+
+    def take(self, session_ids):
+        with self._lock:
+            return {
+                session_id: self._pending.pop(session_id)
+                for session_id in session_ids if session_id in self._pending
+            }
+
+    def drain(self, limit):
+        with self._lock:
+            session_ids = list(self._pending)[:limit]
+            return {session_id: self._pending.pop(session_id) for session_id in session_ids}
+
+    def restore(self, pending):
+        with self._lock:
+            for session_id, entry in pending.items():
+                newer = self._pending.get(session_id)
+                if newer is not None:
+                    _fold(entry, newer)
+                self._pending[session_id] = entry
+
+
+# Same merge as _fold, done inside Redis so heartbeats accepted by different
+# processes fold atomically. '' stands for a field the heartbeat did not report.
+_FOLD_SCRIPT = """
+local key = KEYS[1]
+local newer = tonumber(ARGV[2]) >= tonumber(redis.call('HGET', key, 'seen_at') or '0')
+if newer then
+    redis.call('HSET', key, 'seen_at', ARGV[2])
+end
+if tonumber(ARGV[3]) > tonumber(redis.call('HGET', key, 'duration') or '-1') then
+    redis.call('HSET', key, 'duration', ARGV[3])
+end
+redis.call('HINCRBY', key, 'pages', ARGV[4])
+redis.call('HMSET', key, 'user_id', ARGV[5], 'book_id', ARGV[6], 'day', ARGV[7])
+for i, field in ipairs({'current_page', 'percent', 'location'}) do
+    local value = ARGV[7 + i]
+    if value ~= '' and (newer or redis.call('HEXISTS', key, field) == 0) then
+        redis.call('HSET', key, field, value)
+    end
+end
+redis.call('EXPIRE', key, ARGV[11])
+redis.call('SADD', KEYS[2], ARGV[1])
+"""
+
+
+class RedisHeartbeatStore:
+    """A Redis hash per session plus a set of sessions with unflushed heartbeats."""
+
+    def __init__(self, client):
+        self.client = client
+        self.fold = client.register_script(_FOLD_SCRIPT)
+
+    def add(self, session_id, update):
+        def encode(value):
+            return '' if value is None else str(value)
+
+        self.fold(keys=[_REDIS_KEY.format(session_id), _REDIS_DIRTY], args=[
+            session_id, update['seen_at'].timestamp(), update['duration'], update['pages'],
+            update['user_id'], update['book_id'], update['day'].isoformat(),
+            encode(update['current_page']), encode(update['percent']), encode(update['location']),
+            STATE_TTL,
+        ])
+
+    def _decode(self, values):
+        values = {k.decode(): v.decode() for k, v in values.items()}
+        return {
+            'user_id': values['user_id'],
+            'book_id': int(values['book_id']),
+            'day': date.fromisoformat(values['day']),
+            'duration': int(values['duration']),
+            'pages': int(values['pages']),
+            'current_page': int(values['current_page']) if 'current_page' in values else None,
+            'percent': float(values['percent']) if 'percent' in values else None,
+            'location': values.get('location'),
+            'seen_at': datetime.fromtimestamp(float(values['seen_at']), tz=dt_timezone.utc),
+        }
+
+    def take(self, session_ids):
+        if not session_ids:
+            return {}
+        # HGETALL + DEL in one MULTI per key: a heartbeat either lands before the
+        # DEL (and is taken now) or recreates the key and re-marks it dirty.
+        pipe = self.client.pipeline(transaction=True)
+        pipe.srem(_REDIS_DIRTY, *session_ids)
+        for session_id in session_ids:
+            pipe.hgetall(_REDIS_KEY.format(session_id))
+            pipe.delete(_REDIS_KEY.format(session_id))
+        results = pipe.execute()[1:]
+        return {
+            session_id: self._decode(values)
+            for session_id, values in zip(session_ids, results[::2])
+            if values
+        }
+
+    def drain(self, limit):
+        return self.take([member.decode() for member in self.client.spop(_REDIS_DIRTY, limit) or []])
+
+    def restore(self, pending):
+        for session_id, entry in pending.items():
+            self.add(session_id, entry)
+
+
+_store = None
+_store_lock = threading.Lock()
+_flusher = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                client = get_redis()
+                _store = RedisHeartbeatStore(client) if client is not None else LocalHeartbeatStore()
+    return _store
+
+
+def record(user, session_id, current_page=None, percent=None, location=None):
+    """
+    Accept a heartbeat for the user's active session.
+
+    Returns the serialized session with its current duration and pages read
+    (including heartbeats not flushed yet), or None when the session does not
+    exist, belongs to someone else or has ended.
+    """
+    session_id = str(session_id)
+    try:
+        state = cache.get(_state_key(session_id))
+    except Exception:
+        logger.warning("Failed to read heartbeat state", exc_info=True)
+        state = None
+    if state is None:
+        state = _load_state(user, session_id)
+        if state is None:
+            return None
+        _save_state(session_id, state)
+    if state['user_id'] != str(user.pk):
+        return None
+
+    now = timezone.now()
+    duration = int((now - state['started_at']).total_seconds())
+
+    pages = 0
+    if current_page is not None:
+        current_page = int(current_page)
+        if state['current_page'] is not None:
+            pages = max(0, current_page - state['current_page'])
+        if state['current_page'] != current_page:
+            state['current_page'] = current_page
+            state['pages_read'] += pages
+            _save_state(session_id, state)
+        # A page report sets percent from the book's length, or leaves it alone
+        if state['book_pages'] and state['book_pages'] > 0:
+            percent = (float(current_page) / float(state['book_pages'])) * 100
+        else:
+            percent = None
+    elif percent is not None:
+        percent = float(percent)
+
+    update = {
+        'user_id': state['user_id'],
+        'book_id': state['book_id'],
+        'day': state['day'],
+        'duration': duration,
+        'pages': pages,
+        'current_page': current_page,
+        'percent': percent,
+        'location': location or None,
+        'seen_at': now,
+    }
+    _ensure_flusher()
+    try:
+        get_store().add(session_id, update)
+    except Exception:
+        # Like the view counters, a broken buffer must not fail the reader.
+        logger.warning(f"Failed to buffer heartbeat for session {session_id}", exc_info=True)
+    return {**state['session'], 'duration_seconds': duration, 'pages_read': state['pages_read']}
+
+
+def forget(session_ids):
+    """Drop cached state for ended sessions so their next heartbeat is rejected."""
+    try:
+        cache.delete_many([_state_key(session_id) for session_id in session_ids])
+    except Exception:
+        logger.warning("Failed to drop heartbeat state", exc_info=True)
+
+
+def _persist(pending):
+    with transaction.atomic():
+        # Lock in a fixed order so concurrent flushes and session ends cannot deadlock.
+        sessions = (
+            ReadingSession.objects
+            .select_for_update()
+            .filter(pk__in=list(pending))
+            .order_by('pk')
+            .values_list('pk', 'duration_seconds', 'ended_at')
+        )
+        session_rows = []
+        progress = {}
+        activities = []
+        for session_id, stored_duration, ended_at in sessions:
+            entry = pending[str(session_id)]
+            seconds = max(0, entry['duration'] - stored_duration)
+            # A heartbeat that raced the end of its session still counts its pages,
+            # position and reading time, but the ended session's duration is final.
+            session_seconds = seconds if ended_at is None else 0
+            if session_seconds or entry['pages']:
+                session_rows.append((str(session_id), stored_duration + session_seconds, entry['pages']))
+                activities.append(
+                    (entry['user_id'], entry['book_id'], entry['day'], session_seconds, entry['pages'], 0)
+                )
+
+            key = (entry['user_id'], entry['book_id'])
+            item = progress.get(key)
+            if item is None:
+                progress[key] = dict(entry, seconds=seconds)
+            else:
+                # Two sessions of one book in the same flush: keep the newest position.
+                seconds += item['seconds']
+                older, newer = (item, entry) if item['seen_at'] <= entry['seen_at'] else (entry, item)
+                merged = dict(older)
+                _fold(merged, newer)
+                progress[key] = dict(merged, seconds=seconds)
+
+        with connection.cursor() as cursor:
+            if session_rows:
+                values_sql = ", ".join(["(%s::uuid, %s::int, %s::int)"] * len(session_rows))
+                cursor.execute(
+                    f"UPDATE {ReadingSession._meta.db_table} AS s "
+                    "SET duration_seconds = v.duration, pages_read = s.pages_read + v.pages "
+                    f"FROM (VALUES {values_sql}) AS v(id, duration, pages) "
+                    "WHERE s.id = v.id",
+                    [value for row in session_rows for value in row],
+                )
+            if progress:
+                _persist_progress(cursor, list(progress.values()))
+        rollup.record_activities(activities)
+
+
+def _persist_progress(cursor, items):
+    table = ReadingProgress._meta.db_table
+    values_sql = ", ".join(
+        ["(%s::uuid, %s::bigint, %s::varchar, %s::int, %s::float8, %s::int, %s::timestamptz)"] * len(items)
+    )
+    params = []
+    for item in items:
+        params.extend([
+            item['user_id'], item['book_id'], item['location'], item['current_page'],
+            item['percent'], item['seconds'], item['seen_at'],
+        ])
+    cursor.execute(
+        f"UPDATE {table} AS p SET "
+        "last_location = COALESCE(v.location, p.last_location), "
+        "current_page = COALESCE(v.page, p.current_page), "
+        "percent = COALESCE(v.percent, p.percent), "
+        "completed = COALESCE(v.percent, p.percent) >= %s, "
+        "total_time_seconds = p.total_time_seconds + v.seconds, "
+        "last_opened_at = v.seen, updated_at = v.seen "
+        f"FROM (VALUES {values_sql}) AS v(user_id, book_id, location, page, percent, seconds, seen) "
+        "WHERE p.user_id = v.user_id AND p.book_id = v.book_id "
+        "RETURNING p.user_id, p.book_id",
+        [COMPLETED_PERCENT] + params,
+    )
+    updated = {(str(user_id), book_id) for user_id, book_id in cursor.fetchall()}
+
+    missing = [item for item in items if (item['user_id'], item['book_id']) not in updated]
+    if not missing:
+        return
+    values_sql = ", ".join(
+        ["(%s::uuid, %s::uuid, %s::bigint, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(missing)
+    )
+    params = []
+    for item in missing:
+        percent = item['percent'] or 0.0
+        params.extend([
+            uuid.uuid4(), item['user_id'], item['book_id'], item['location'] or '0',
+            item['current_page'] or 0, percent, item['seconds'], item['seen_at'],
+            percent >= COMPLETED_PERCENT, item['seen_at'], item['seen_at'],
+        ])
+    cursor.execute(
+        f"INSERT INTO {table} (id, user_id, book_id, last_location, current_page, percent, "
+        "total_time_seconds, last_opened_at, completed, created_at, updated_at) "
+        f"VALUES {values_sql} "
+        "ON CONFLICT (user_id, book_id) DO NOTHING",
+        params,
+    )
+
+
+def flush(session_ids=None):
+    """Persist pending heartbeats (all, or only the given sessions). Returns the number of sessions."""
+    store = get_store()
+    flushed = 0
+    while True:
+        if session_ids is None:
+            pending = store.drain(FLUSH_BATCH_SIZE)
+        else:
+            pending = store.take([str(session_id) for session_id in session_ids])
+        if not pending:
+            return flushed
+        try:
+            _persist(pending)
+        except Exception:
+            # Put the heartbeats back so the next flush retries them.
+            store.restore(pending)
+            raise
+        flushed += len(pending)
+        if session_ids is not None:
+            return flushed
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception:
+            logger.warning("Heartbeat flush failed; will retry", exc_info=True)
+        finally:
+            connection.close()
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is not None:
+        return
+    with _store_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name='heartbeat-flusher', daemon=True)
+            _flusher.start()
+
+
+@atexit.register
+def _flush_on_exit():
+    # Only the in-process store loses heartbeats on shutdown; Redis keeps them for the next flush.
+    if isinstance(_store, LocalHeartbeatStore):
+        try:
+            flush()
+        except Exception:
+            logger.warning("Final heartbeat flush failed", exc_info=True)
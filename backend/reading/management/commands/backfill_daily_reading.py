@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from reading import rollup
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the per-user daily reading rollup from reading session history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild rows for this user id')
+
+    def handle(self, *args, **options):
+        written = rollup.backfill(user_id=options['user'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} daily reading rows."))
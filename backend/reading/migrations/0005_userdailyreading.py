@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:40
+
+from django.conf import settings
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('reading', '0004_readingsession_pages_read'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserDailyReading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='Local calendar day the sessions started on.')),
+                ('seconds', models.IntegerField(default=0, help_text='Reading time recorded on this day (in seconds).')),
+                ('pages', models.IntegerField(default=0, help_text='Pages read on this day.')),
+                ('sessions', models.IntegerField(default=0, help_text='Reading sessions completed on this day.')),
+                ('book_ids', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, help_text='Distinct books read on this day.', size=None)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_reading', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'User Daily Reading',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='userdailyreading',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='reading_daily_user_date_uniq'),
+        ),
+    ]
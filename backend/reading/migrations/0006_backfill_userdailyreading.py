@@ -0,0 +1,30 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+def backfill_daily_reading(apps, schema_editor):
+    # Same rules as reading.rollup.backfill, frozen here so later changes to that module cannot break this migration.
+    table = apps.get_model('reading', 'UserDailyReading')._meta.db_table
+    sessions = apps.get_model('reading', 'ReadingSession')._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(
+            f"INSERT INTO {table} (user_id, date, seconds, pages, sessions, book_ids) "
+            "SELECT user_id, (started_at AT TIME ZONE %s)::date AS day, "
+            "SUM(GREATEST(duration_seconds, 0)), SUM(GREATEST(pages_read, 0)), "
+            "COUNT(*) FILTER (WHERE ended_at IS NOT NULL), ARRAY_AGG(DISTINCT book_id) "
+            f"FROM {sessions} "
+            "GROUP BY user_id, day",
+            [timezone.get_current_timezone_name()],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reading', '0005_userdailyreading'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_reading, migrations.RunPython.noop),
+    ]
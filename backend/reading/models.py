@@ -1,4 +1,5 @@
 from django.db import models
+from django.contrib.postgres.fields import ArrayField
 from django.contrib.auth import get_user_model
 import uuid
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -140,6 +141,59 @@ class ReadingSession(models.Model):
         return f"Session: {self.user} -> {book_title} ({self.duration_seconds}s)"
 
 
+class UserDailyReading(models.Model):
+    """
+    Per-user, per-day reading rollup.
+    Maintained incrementally from session updates (see reading.rollup) so statistics
+    read one row per active day instead of every ReadingSession.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='daily_reading'
+    )
+    
+    date = models.DateField(
+        help_text="Local calendar day the sessions started on."
+    )
+    
+    seconds = models.IntegerField(
+        default=0,
+        help_text="Reading time recorded on this day (in seconds)."
+    )
+    
+    pages = models.IntegerField(
+        default=0,
+        help_text="Pages read on this day."
+    )
+    
+    sessions = models.IntegerField(
+        default=0,
+        help_text="Reading sessions completed on this day."
+    )
+    
+    book_ids = ArrayField(
+        models.BigIntegerField(),
+        default=list,
+        blank=True,
+        help_text="Distinct books read on this day."
+    )
+    
+    class Meta:
+        verbose_name_plural = "User Daily Reading"
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='reading_daily_user_date_uniq'),
+        ]
+
+    @property
+    def books_touched(self):
+        return len(self.book_ids)
+
+    def __str__(self):
+        return f"Daily reading: {self.user} on {self.date} ({self.seconds}s)"
+
+
 class Highlight(models.Model):
     """
     Highlight and annotation tracking model.
@@ -0,0 +1,108 @@
+"""
+Incremental maintenance of the UserDailyReading rollup.
+
+Session updates add their deltas to the row for (user, local day the session
+started on) with a single upsert, so the row stays consistent under concurrent
+writers without a read-modify-write; reading.heartbeats batches many sessions
+into one statement. `backfill` rebuilds rows from
+ReadingSession history (see the backfill_daily_reading command); live updates
+follow the same rules, so a backfill does not change the numbers: every
+session marks its day as a reading day when it starts, and counts once when it
+ends, whether ended on its own or closed by a newer session.
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ReadingSession, UserDailyReading
+
+
+def session_day(session):
+    """Day a session's activity is attributed to, as with `started_at__date`."""
+    return timezone.localdate(session.started_at)
+
+
+def record_activity(user_id, book_id, day, seconds=0, pages=0, sessions=0):
+    """Add reading activity to the user's row for `day`, creating it if needed."""
+    record_activities([(user_id, book_id, day, seconds, pages, sessions)])
+
+
+def record_activities(activities):
+    """
+    Bulk `record_activity`: one upsert for an iterable of
+    (user_id, book_id, day, seconds, pages, sessions) tuples.
+    """
+    rows = {}
+    for user_id, book_id, day, seconds, pages, sessions in activities:
+        row = rows.setdefault((user_id, day), [0, 0, 0, []])
+        row[0] += max(seconds, 0)
+        row[1] += max(pages, 0)
+        row[2] += sessions
+        if book_id not in row[3]:
+            row[3].append(book_id)
+    if not rows:
+        return
+
+    table = UserDailyReading._meta.db_table
+    values_sql = ", ".join(["(%s::uuid, %s::date, %s::int, %s::int, %s::int, %s::bigint[])"] * len(rows))
+    params = []
+    for (user_id, day), (seconds, pages, sessions, book_ids) in rows.items():
+        params.extend([user_id, day, seconds, pages, sessions, book_ids])
+    with connection.cursor() as cursor:
+        # Rows are grouped by (user, day) above: ON CONFLICT may touch each target row only once.
+        cursor.execute(
+            f"INSERT INTO {table} AS d (user_id, date, seconds, pages, sessions, book_ids) "
+            f"VALUES {values_sql} "
+            "ON CONFLICT (user_id, date) DO UPDATE SET "
+            "seconds = d.seconds + EXCLUDED.seconds, "
+            "pages = d.pages + EXCLUDED.pages, "
+            "sessions = d.sessions + EXCLUDED.sessions, "
+            "book_ids = d.book_ids || ARRAY("
+            "SELECT unnest(EXCLUDED.book_ids) EXCEPT SELECT unnest(d.book_ids))",
+            params,
+        )
+
+
+def record_session_activity(session, seconds=0, pages=0, ended=False):
+    record_activity(
+        session.user_id, session.book_id, session_day(session),
+        seconds=seconds, pages=pages, sessions=1 if ended else 0,
+    )
+
+
+def record_session_started(session):
+    """Mark the session's day as read, even if no heartbeat follows."""
+    record_session_activity(session)
+
+
+def record_sessions_closed(sessions):
+    """Count sessions closed in bulk, given as (user_id, book_id, started_at) tuples."""
+    record_activities(
+        (user_id, book_id, timezone.localdate(started_at), 0, 0, 1)
+        for user_id, book_id, started_at in sessions
+    )
+
+
+def backfill(user_id=None):
+    """Recompute rollup rows from ReadingSession. Returns the number of rows written."""
+    table = UserDailyReading._meta.db_table
+    sessions = ReadingSession._meta.db_table
+    where = "WHERE user_id = %s" if user_id is not None else ""
+    params = [timezone.get_current_timezone_name()]
+    if user_id is not None:
+        params.append(user_id)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if user_id is not None:
+            cursor.execute(f"DELETE FROM {table} WHERE user_id = %s", [user_id])
+        else:
+            cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(
+            f"INSERT INTO {table} (user_id, date, seconds, pages, sessions, book_ids) "
+            "SELECT user_id, (started_at AT TIME ZONE %s)::date AS day, "
+            "SUM(GREATEST(duration_seconds, 0)), SUM(GREATEST(pages_read, 0)), "
+            "COUNT(*) FILTER (WHERE ended_at IS NOT NULL), ARRAY_AGG(DISTINCT book_id) "
+            f"FROM {sessions} {where} "
+            "GROUP BY user_id, day",
+            params,
+        )
+        return cursor.rowcount
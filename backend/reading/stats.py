@@ -0,0 +1,101 @@
+"""
+Set-based reading statistics for the dashboard and analytics endpoints.
+
+Daily figures come from the UserDailyReading rollup (see reading.rollup), one
+row per active day, so the cost depends on the requested window rather than
+the length of a user's history. Days are calendar days in the active time
+zone, as with `started_at__date` lookups.
+"""
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Avg, Count, F, Sum
+
+from .models import ReadingSession, UserDailyReading
+
+
+def daily_totals(user, first_day):
+    """{date: {'seconds', 'pages', 'sessions'}} for active days on or after first_day."""
+    rows = (
+        UserDailyReading.objects
+        .filter(user=user, date__gte=first_day)
+        .values('date', 'seconds', 'pages', 'sessions')
+        .order_by()
+    )
+    return {row.pop('date'): row for row in rows}
+
+
+def period_totals(user, first_day=None):
+    """Summed seconds, pages and completed sessions since first_day (all time if None)."""
+    rows = UserDailyReading.objects.filter(user=user)
+    if first_day is not None:
+        rows = rows.filter(date__gte=first_day)
+    totals = rows.aggregate(seconds=Sum('seconds'), pages=Sum('pages'), sessions=Sum('sessions'))
+    return {key: value or 0 for key, value in totals.items()}
+
+
+def average_session_seconds(user, since=None):
+    """
+    Average length of the user's ended sessions started since `since`.
+
+    The rollup's seconds also count sessions still in progress, so dividing
+    them by its ended-session count would inflate the average.
+    """
+    sessions = ReadingSession.objects.filter(user=user, ended_at__isnull=False)
+    if since is not None:
+        sessions = sessions.filter(started_at__gte=since)
+    return sessions.aggregate(average=Avg('duration_seconds'))['average'] or 0
+
+
+def reading_streaks(user, today):
+    """
+    (current, longest) streak of consecutive reading days.
+
+    Gaps-and-islands: subtracting a row number from each reading day gives the
+    same value across a run of consecutive days. The current streak is the run
+    that reaches today or yesterday.
+    """
+    table = UserDailyReading._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH islands AS (
+                SELECT MAX(date) AS last_day, COUNT(*) AS length
+                FROM (
+                    SELECT date, date - (ROW_NUMBER() OVER (ORDER BY date))::int AS grp
+                    FROM {table}
+                    WHERE user_id = %s
+                ) AS numbered
+                GROUP BY grp
+            )
+            SELECT
+                COALESCE(MAX(length) FILTER (WHERE last_day >= %s), 0),
+                COALESCE(MAX(length), 0)
+            FROM islands
+            """,
+            [user.pk, today - timedelta(days=1)],
+        )
+        current, longest = cursor.fetchone()
+    return current, longest
+
+
+def category_counts(progress_qs, limit=None):
+    """[(category name, books)] among the books of the given progress rows, most frequent first."""
+    rows = (
+        progress_qs
+        .annotate(category=F('book__categories__name'))
+        .filter(category__gt='')
+        .values('category')
+        .annotate(books=Count('id'))
+        .order_by('-books', 'category')
+        .values_list('category', 'books')
+    )
+    if limit is not None:
+        rows = rows[:limit]
+    return list(rows)
+
+
+def favorite_category(progress_qs):
+    """Most frequent category name among the books of the given progress rows."""
+    counts = category_counts(progress_qs, limit=1)
+    return counts[0][0] if counts else None
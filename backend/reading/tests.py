@@ -0,0 +1,179 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import User
+
+from . import heartbeats, rollup, stats
+from .models import ReadingSession, UserDailyReading
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'reading-tests'}}
+
+
+class RecordActivitiesTests(SimpleTestCase):
+    def record(self, activities):
+        with mock.patch.object(rollup, 'connection') as connection:
+            cursor = connection.cursor.return_value.__enter__.return_value
+            rollup.record_activities(activities)
+        return cursor
+
+    def test_groups_rows_by_user_and_day(self):
+        day = date(2024, 5, 1)
+        cursor = self.record([
+            ('u1', 1, day, 60, 2, 0),
+            ('u1', 2, day, 30, -1, 1),
+            ('u1', 1, day, -5, 3, 0),
+            ('u2', 1, day + timedelta(days=1), 10, 0, 1),
+        ])
+
+        cursor.execute.assert_called_once()
+        sql, params = cursor.execute.call_args.args
+        self.assertIn('ON CONFLICT (user_id, date)', sql)
+        self.assertEqual(params, [
+            'u1', day, 90, 5, 1, [1, 2],
+            'u2', day + timedelta(days=1), 10, 0, 1, [1],
+        ])
+
+    def test_nothing_to_record_skips_the_database(self):
+        cursor = self.record([])
+        cursor.execute.assert_not_called()
+
+    def test_started_session_marks_its_day(self):
+        session = ReadingSession(user_id='u1', book_id=3, started_at=timezone.now())
+        with mock.patch.object(rollup, 'connection') as connection:
+            rollup.record_session_started(session)
+        _, params = connection.cursor.return_value.__enter__.return_value.execute.call_args.args
+        self.assertEqual(params, ['u1', timezone.localdate(session.started_at), 0, 0, 0, [3]])
+
+    def test_bulk_closed_sessions_count_once_each(self):
+        started_at = timezone.now()
+        with mock.patch.object(rollup, 'connection') as connection:
+            rollup.record_sessions_closed([('u1', 3, started_at), ('u1', 4, started_at)])
+        _, params = connection.cursor.return_value.__enter__.return_value.execute.call_args.args
+        self.assertEqual(params, ['u1', timezone.localdate(started_at), 0, 0, 2, [3, 4]])
+
+
+class ReadingStreakTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='reader@example.com', password='x', name='Reader')
+        cls.today = date(2024, 5, 10)
+
+    def read_on(self, *days_ago, seconds=60, sessions=1):
+        UserDailyReading.objects.bulk_create(
+            UserDailyReading(user=self.user, date=self.today - timedelta(days=n), seconds=seconds, sessions=sessions)
+            for n in days_ago
+        )
+
+    def test_no_activity(self):
+        self.assertEqual(stats.reading_streaks(self.user, self.today), (0, 0))
+
+    def test_current_streak_reaching_today(self):
+        self.read_on(0, 1, 2, 5, 6)
+        self.assertEqual(stats.reading_streaks(self.user, self.today), (3, 3))
+
+    def test_current_streak_may_end_yesterday(self):
+        self.read_on(1, 2)
+        self.assertEqual(stats.reading_streaks(self.user, self.today), (2, 2))
+
+    def test_broken_streak_keeps_longest(self):
+        self.read_on(2, 10, 11, 12, 13)
+        self.assertEqual(stats.reading_streaks(self.user, self.today), (0, 4))
+
+    def test_period_totals_sum_rows_in_window(self):
+        self.read_on(0, 1, 30, seconds=100)
+        totals = stats.period_totals(self.user, self.today - timedelta(days=7))
+        self.assertEqual(totals, {'seconds': 200, 'pages': 0, 'sessions': 2})
+        self.assertEqual(stats.period_totals(self.user)['seconds'], 300)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class HeartbeatTests(SimpleTestCase):
+    session_id = '6f1c3a52-8d0e-4a57-9a8f-0c2b6d1e4f70'
+
+    def setUp(self):
+        cache.clear()
+        self.store = heartbeats.LocalHeartbeatStore()
+        for target, value in (('get_store', lambda: self.store), ('_ensure_flusher', lambda: None)):
+            patcher = mock.patch.object(heartbeats, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = User(email='reader@example.com', name='Reader')
+        self.started_at = timezone.now() - timedelta(minutes=5)
+        cache.set(heartbeats._state_key(self.session_id), {
+            'user_id': str(self.user.pk),
+            'book_id': 7,
+            'book_pages': 200,
+            'started_at': self.started_at,
+            'day': self.started_at.date(),
+            'current_page': 10,
+            'pages_read': 4,
+            'session': {'id': self.session_id, 'duration_seconds': 0},
+        })
+
+    def test_response_includes_pending_pages_and_duration(self):
+        first = heartbeats.record(self.user, self.session_id, current_page=15)
+        second = heartbeats.record(self.user, self.session_id, current_page=12)
+        third = heartbeats.record(self.user, self.session_id, current_page=20)
+
+        self.assertEqual([data['pages_read'] for data in (first, second, third)], [9, 9, 17])
+        self.assertGreaterEqual(third['duration_seconds'], 300)
+        entry = self.store.take([self.session_id])[self.session_id]
+        self.assertEqual((entry['pages'], entry['current_page'], entry['percent']), (13, 20, 10.0))
+
+    def test_other_users_are_rejected(self):
+        other = User(email='other@example.com', name='Other')
+        self.assertIsNone(heartbeats.record(other, self.session_id, current_page=15))
+        self.assertEqual(self.store.drain(10), {})
+
+    def flush(self, ended_at=None, **kwargs):
+        sessions = mock.MagicMock()
+        sessions.select_for_update.return_value.filter.return_value.order_by.return_value.values_list.return_value = [
+            (self.session_id, 120, ended_at),
+        ]
+        with mock.patch.object(ReadingSession, 'objects', sessions), \
+                mock.patch.object(heartbeats, 'connection') as connection, \
+                mock.patch.object(heartbeats.rollup, 'record_activities') as record_activities, \
+                mock.patch.object(heartbeats.transaction, 'atomic'):
+            cursor = connection.cursor.return_value.__enter__.return_value
+            cursor.fetchall.return_value = [(self.user.pk, 7)]
+            return heartbeats.flush(**kwargs), cursor, record_activities
+
+    def test_flush_keeps_duration_of_sessions_ended_meanwhile(self):
+        heartbeats.record(self.user, self.session_id, current_page=15)
+
+        flushed, cursor, record_activities = self.flush(ended_at=timezone.now())
+
+        self.assertEqual(flushed, 1)
+        sessions_sql, sessions_params = cursor.execute.call_args_list[0].args
+        self.assertIn('UPDATE', sessions_sql)
+        # Pages still count; the duration stays as the end of the session left it.
+        self.assertEqual(sessions_params, [self.session_id, 120, 5])
+        progress_params = cursor.execute.call_args_list[1].args[1]
+        self.assertEqual(progress_params[4:6], [15, 7.5])
+        record_activities.assert_called_once_with([(str(self.user.pk), 7, self.started_at.date(), 0, 5, 0)])
+        self.assertEqual(self.store.drain(10), {})
+
+    def test_flush_of_one_session_leaves_the_others_pending(self):
+        other_id = '0b7e2c41-5f3a-4d19-8c6e-2a9d4f1b3e58'
+        heartbeats.record(self.user, self.session_id, current_page=15)
+        self.store.add(other_id, dict(self.store._pending[self.session_id]))
+
+        flushed, cursor, record_activities = self.flush(session_ids=[self.session_id])
+
+        self.assertEqual(flushed, 1)
+        self.assertEqual(list(self.store.drain(10)), [other_id])
+
+    def test_failed_flush_restores_pending_heartbeats(self):
+        heartbeats.record(self.user, self.session_id, current_page=15)
+
+        with mock.patch.object(heartbeats, '_persist', side_effect=RuntimeError('db down')):
+            with self.assertRaises(RuntimeError):
+                heartbeats.flush()
+        heartbeats.record(self.user, self.session_id, current_page=18)
+
+        entry = self.store.drain(10)[self.session_id]
+        self.assertEqual((entry['pages'], entry['current_page']), (8, 18))